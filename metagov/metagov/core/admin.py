@@ -1,4 +1,28 @@
 from django.contrib import admin
-from .models import GovernanceProcess
+from .models import DriverEvent, GovernanceProcess, InboundWebhook
 
 admin.site.register(GovernanceProcess)
+
+
+@admin.register(DriverEvent)
+class DriverEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "community", "source", "event_type", "status", "attempts", "next_attempt_at")
+    list_filter = ("status", "source")
+    actions = ["replay"]
+
+    @admin.action(description="Replay selected events")
+    def replay(self, request, queryset):
+        for event in queryset:
+            event.replay()
+
+
+@admin.register(InboundWebhook)
+class InboundWebhookAdmin(admin.ModelAdmin):
+    list_display = ("id", "plugin_name", "community_slug", "status", "created_at")
+    list_filter = ("status", "plugin_name")
+    actions = ["retry"]
+
+    @admin.action(description="Retry selected webhooks")
+    def retry(self, request, queryset):
+        for webhook in queryset:
+            webhook.retry()
@@ -1,3 +1,4 @@
+from metagov.core import lookups
 from metagov.core.models import Community
 
 
@@ -10,7 +11,7 @@ class MetagovApp:
         return Community.objects.all()
 
     def get_community(self, slug) -> Community:
-        return Community.objects.get(slug=slug)
+        return lookups.get_community(slug)
 
     def create_community(self, readable_name="", slug=None) -> Community:
         if slug:
@@ -0,0 +1,48 @@
+"""Codec for values kept in a DataStore.
+
+JSON values (dicts with string keys, lists, strings, numbers, booleans and None) are stored as they are. Anything else,
+such as sets, tuples or objects, is flattened with jsonpickle and stored in a ``{"py/jsonpickle": ...}`` wrapper, so
+that decoding only needs jsonpickle for values that were encoded with it."""
+
+import jsonpickle
+
+PICKLED_KEY = "py/jsonpickle"
+# prefix of the keys that jsonpickle uses to tag types
+JSONPICKLE_TAG_PREFIX = "py/"
+
+PLAIN_SCALARS = (str, int, float, bool, type(None))
+
+
+def encode(value):
+    """Encode a value as JSON-compatible data"""
+    if is_plain(value):
+        return value
+    return {PICKLED_KEY: jsonpickle.pickler.Pickler().flatten(value, reset=True)}
+
+
+def decode(data):
+    """Decode data returned by ``encode``"""
+    if type(data) is dict and len(data) == 1 and PICKLED_KEY in data:
+        return jsonpickle.unpickler.Unpickler().restore(data[PICKLED_KEY], reset=True)
+    return data
+
+
+def is_plain(value) -> bool:
+    """Whether a value is made only of JSON types, and so can be stored without jsonpickle. Subclasses of JSON types,
+    and dicts with keys that look like jsonpickle tags, aren't plain."""
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        item_type = type(item)
+        if item_type in PLAIN_SCALARS:
+            continue
+        if item_type is list:
+            stack.extend(item)
+        elif item_type is dict:
+            for key in item:
+                if type(key) is not str or key.startswith(JSONPICKLE_TAG_PREFIX):
+                    return False
+            stack.extend(item.values())
+        else:
+            return False
+    return True
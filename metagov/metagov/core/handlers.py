@@ -5,19 +5,26 @@ import json
 import logging
 from typing import Optional
 
-from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotFound, HttpResponseRedirect
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotFound, HttpResponseRedirect
 from django.http.response import HttpResponse, HttpResponseBadRequest, HttpResponseNotFound
 from metagov.core import utils
 from metagov.core.app import MetagovApp
-from metagov.core.errors import PluginAuthError
-from metagov.core.models import Community, ProcessStatus
+from metagov.core.errors import PluginAuthError, PluginErrorInternal
+from metagov.core.models import Community, InboundWebhook
 from metagov.core.plugin_manager import AuthorizationType, plugin_registry
+from metagov.core.webhooks import WebhookEnvelope
 from requests.models import PreparedRequest
 
 logger = logging.getLogger(__name__)
 
 import importlib
 
+# Headers that platforms use to identify a webhook delivery. Retries of the same delivery have the same value.
+WEBHOOK_DELIVERY_ID_HEADERS = ["X-GitHub-Delivery", "X-Discourse-Event-Id"]
+
 
 class PluginRequestHandler:
     def construct_oauth_authorize_url(self, type: str, community=None) -> str:
@@ -29,8 +36,25 @@ class PluginRequestHandler:
         raise NotImplementedError
 
     def handle_incoming_webhook(self, request) -> Optional[HttpResponse]:
+        """Handle an incoming webhook request. The request is a ``WebhookEnvelope``, so its parsed
+        ``payload`` can be passed on to plugins and processes without decoding it again."""
         raise NotImplementedError
 
+    def get_delivery_id(self, request) -> Optional[str]:
+        """Return the platform's unique ID for this webhook delivery, if it has one that isn't in a standard
+        header. Retried deliveries of the same event must have the same ID. Used to drop duplicate deliveries."""
+        return None
+
+    def verify_webhook(self, request):
+        """Check that an incoming webhook request really came from the platform, and raise ``PluginErrorInternal`` if
+        it didn't. Called before the request is queued, if webhooks are processed asynchronously."""
+        pass
+
+    def requires_inline_response(self, request) -> bool:
+        """Return True if the platform expects a response body for this request, so it can't be queued
+        and must be handled right away. Only used if webhooks are processed asynchronously."""
+        return False
+
 
 class MetagovRequestHandler:
 
@@ -40,8 +64,8 @@ class MetagovRequestHandler:
     ### Incoming Webhook Logic ###
 
     def pass_to_plugin_instance(self, request, plugin_name, community_slug, community_platform_id):
-        """Passes incoming request to a specific pluin instance as well as all pending GovernanceProcesses
-        associated with that plugin."""
+        """Passes incoming request to a specific pluin instance as well as the pending GovernanceProcesses
+        associated with that plugin that the request pertains to."""
 
         # Pass request a specific plugin instance
         community = self.app.get_community(community_slug)
@@ -55,11 +79,11 @@ class MetagovRequestHandler:
             except Exception as e:
                 logger.error(f"Plugin '{plugin}' failed to process webhook: {e}")
 
-        # Pass request to all pending GovernanceProcesses for this plugin, too
+        # Pass request to the pending GovernanceProcesses for this plugin that it pertains to, too
         for cls in plugin._process_registry.values():
-            processes = cls.objects.filter(plugin=plugin, status=ProcessStatus.PENDING.value)
-            if processes.count():
-                logger.debug(f"{processes.count()} pending processes for plugin instance '{plugin}'")
+            processes = cls.get_webhook_receivers(request, plugin=plugin)
+            if processes:
+                logger.debug(f"{len(processes)} pending processes for plugin instance '{plugin}' receiving webhook")
             for process in processes:
                 try:
                     process.receive_webhook(request)
@@ -85,6 +109,74 @@ class MetagovRequestHandler:
     ) -> HttpResponse:
         logger.debug(f"Received webhook request: {plugin_name} ({community_platform_id or 'no community_platform_id'}) ({community_slug or 'no community'})")
 
+        # Parse the request once, and share it with every plugin and process that receives it
+        request = WebhookEnvelope.wrap(request)
+
+        # Drop deliveries that we've already seen, for example when the platform retries a request
+        delivery_id = request.delivery_id = self.get_delivery_id(request, plugin_name, community_slug)
+        delivery_key = f"metagov:webhook-delivery:{plugin_name}:{community_slug}:{delivery_id}" if delivery_id else None
+        ttl = getattr(settings, "WEBHOOK_DEDUPLICATION_TTL", 60 * 60 * 24)
+        if delivery_key and not cache.add(delivery_key, True, timeout=ttl):
+            logger.info(f"Ignoring duplicate {plugin_name} webhook delivery {delivery_id}")
+            return HttpResponse()
+
+        try:
+            if getattr(settings, "WEBHOOK_ASYNC_PROCESSING", False):
+                response = self.enqueue_webhook(request, plugin_name, community_slug, community_platform_id)
+                if response:
+                    if response.status_code >= 400 and delivery_key:
+                        # a rejected request mustn't block the real delivery with the same ID
+                        cache.delete(delivery_key)
+                    return response
+
+            return self.process_webhook(request, plugin_name, community_slug, community_platform_id)
+        except Exception:
+            # forget the delivery, so that it's processed if the platform retries it
+            if delivery_key:
+                cache.delete(delivery_key)
+            raise
+
+    def get_delivery_id(self, request, plugin_name, community_slug=None) -> Optional[str]:
+        """Get the platform's unique ID for a webhook delivery, from a standard header or the plugin's request handler"""
+        for header in WEBHOOK_DELIVERY_ID_HEADERS:
+            if request.headers.get(header):
+                return request.headers[header]
+        if not community_slug:
+            plugin_handler = self._get_plugin_request_handler(plugin_name)
+            if plugin_handler:
+                return plugin_handler.get_delivery_id(request)
+        return None
+
+    def enqueue_webhook(self, request, plugin_name, community_slug=None, community_platform_id=None):
+        """Verify the webhook request and queue it to be processed by a worker. Returns None if the request
+        has to be processed right away instead."""
+        if community_slug:
+            # make sure that the plugin is enabled, and that the request is signed with its secret
+            plugin = self.app.get_community(community_slug).get_plugin(plugin_name, community_platform_id)
+            verify_webhook = plugin.verify_webhook
+        else:
+            plugin_handler = self._get_plugin_request_handler(plugin_name)
+            if not plugin_handler:
+                return None
+            verify_webhook = plugin_handler.verify_webhook
+
+        try:
+            verify_webhook(request)
+        except PluginErrorInternal as e:
+            logger.warning(f"Rejecting unverified {plugin_name} webhook: {e}")
+            return HttpResponseForbidden()
+        request.signature_verified = True
+        if not community_slug and plugin_handler.requires_inline_response(request):
+            return None
+
+        from metagov.core.tasks import process_inbound_webhook
+
+        webhook = InboundWebhook.from_request(request, plugin_name, community_slug, community_platform_id)
+        transaction.on_commit(lambda: process_inbound_webhook.delay(webhook.pk))
+        return HttpResponse()
+
+    def process_webhook(self, request, plugin_name, community_slug=None, community_platform_id=None) -> HttpResponse:
+        request = WebhookEnvelope.wrap(request)
         if community_slug:
             response = self.pass_to_plugin_instance(request, plugin_name, community_slug, community_platform_id)
             return response or HttpResponse()
@@ -0,0 +1,231 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from metagov.core.errors import PluginErrorInternal
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(PluginErrorInternal):
+    status_code = 429
+    default_code = "rate_limited"
+    default_detail = "Rate limit exceeded, try again later."
+
+    def __init__(self, retry_after, detail=None, code=None):
+        super().__init__(detail, code)
+        self.retry_after = retry_after
+        # sent back to the Driver in the Retry-After header
+        self.wait = math.ceil(retry_after)
+
+
+class RateLimiter:
+    """Rate limiter for outbound requests, keyed by provider (such as "slack") and credential.
+
+    Each key has a token bucket that refills at ``HTTP_RATE_LIMITS[provider]`` requests per second, if set, and callers
+    queue for tokens. On top of that, the limits that the provider reports in ``Retry-After`` and ``X-RateLimit-*``
+    response headers are shared between workers through the cache, so that every worker backs off once the budget
+    is used up. Callers wait for up to ``HTTP_RATE_LIMIT_MAX_WAIT`` seconds; if they'd have to wait longer,
+    ``RateLimitExceeded`` is raised."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, provider, credential=None):
+        """Wait until a request can be made with this credential"""
+        key = self._key(provider, credential)
+        wait = max(self._reported_wait(key), self._reserve_token(provider, key))
+        if wait > getattr(settings, "HTTP_RATE_LIMIT_MAX_WAIT", 10):
+            self._return_token(provider, key)
+            raise RateLimitExceeded(retry_after=wait)
+        if wait > 0:
+            logger.debug(f"Waiting {wait:.2f}s for {provider} rate limit")
+            time.sleep(wait)
+
+    def update(self, provider, credential, response):
+        """Record the rate limit that the provider reported in a response. Returns the number of seconds to wait
+        before retrying, if the request was rejected because of the rate limit."""
+        key = self._key(provider, credential)
+        headers = response.headers
+        now = time.time()
+        state = {}
+        try:
+            if response.status_code in (403, 429) and headers.get("Retry-After"):
+                state["retry_at"] = now + float(headers["Retry-After"])
+            if headers.get("X-RateLimit-Remaining") is not None:
+                state["remaining"] = int(float(headers["X-RateLimit-Remaining"]))
+                if headers.get("X-RateLimit-Reset-After"):
+                    state["reset_at"] = now + float(headers["X-RateLimit-Reset-After"])
+                elif headers.get("X-RateLimit-Reset"):
+                    # time in seconds since the epoch
+                    state["reset_at"] = float(headers["X-RateLimit-Reset"])
+        except ValueError:
+            logger.warning(f"Unexpected rate limit headers from {provider}: {dict(headers)}")
+            return None
+        if state:
+            expires_at = max(state.get("retry_at", now), state.get("reset_at", now))
+            cache.set(self._cache_key(key), state, timeout=max(math.ceil(expires_at - now), 1))
+        # GitHub rejects requests over its primary and secondary rate limits with 403 instead of 429
+        rejected = response.status_code == 429 or (
+            response.status_code == 403 and ("retry_at" in state or state.get("remaining") == 0)
+        )
+        if rejected:
+            return self._reported_wait(key) or None
+        return None
+
+    def budget(self, provider, credential=None) -> dict:
+        """Current budget for a key: the provider's reported limits, and the tokens left in the local bucket.
+        For inspecting the rate limiter from a shell; it isn't exposed through the API."""
+        key = self._key(provider, credential)
+        budget = dict(cache.get(self._cache_key(key)) or {})
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket:
+                budget["tokens"] = self._refill(provider, bucket)
+        return budget
+
+    def _reported_wait(self, key):
+        state = cache.get(self._cache_key(key))
+        if not state:
+            return 0
+        now = time.time()
+        wait = state.get("retry_at", now) - now
+        if state.get("remaining") == 0:
+            wait = max(wait, state.get("reset_at", now) - now)
+        return max(wait, 0)
+
+    def _reserve_token(self, provider, key):
+        """Take a token from the bucket, and return how long to wait until it's available"""
+        rate = getattr(settings, "HTTP_RATE_LIMITS", {}).get(provider)
+        if not rate:
+            return 0
+        with self._lock:
+            bucket = self._buckets.setdefault(key, {"tokens": max(rate, 1), "updated_at": time.monotonic()})
+            tokens = self._refill(provider, bucket)
+            # tokens can go negative, which queues the callers behind the ones already waiting
+            bucket["tokens"] = tokens - 1
+            return max(0, (1 - tokens) / rate)
+
+    def _return_token(self, provider, key):
+        with self._lock:
+            if key in self._buckets:
+                self._buckets[key]["tokens"] += 1
+
+    def _refill(self, provider, bucket):
+        rate = getattr(settings, "HTTP_RATE_LIMITS", {}).get(provider) or 0
+        now = time.monotonic()
+        bucket["tokens"] = min(max(rate, 1), bucket["tokens"] + (now - bucket["updated_at"]) * rate)
+        bucket["updated_at"] = now
+        return bucket["tokens"]
+
+    @staticmethod
+    def _key(provider, credential):
+        # don't keep credentials in memory or in the cache
+        digest = hashlib.sha256(str(credential).encode("utf-8")).hexdigest()[:16] if credential else "default"
+        return f"{provider}:{digest}"
+
+    @staticmethod
+    def _cache_key(key):
+        return f"metagov:rate-limit:{key}"
+
+
+rate_limiter = RateLimiter()
+
+
+class HttpClient:
+    """HTTP client for outbound requests to external platforms.
+
+    Keeps a pooled ``requests.Session`` for each host, so that connections are kept alive and reused between
+    requests, applies a default timeout, and optionally respects rate limits (see ``RateLimiter``). Use it like the
+    ``requests`` module: ``http.get(url)``, ``http.post(url, json=data)``, ``http.request(method, url, **kwargs)``.
+    Plugins can get it from ``Plugin.http``."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: {"requests": 0, "errors": 0, "seconds": 0.0})
+
+    def request(self, method, url, rate_limit=None, **kwargs) -> requests.Response:
+        """Make a request. Pass ``rate_limit=(provider, credential)`` to respect the provider's rate limits for the
+        credential: the request waits for its turn, and is retried if the provider rejects it for exceeding the limit.
+        Raises ``RateLimitExceeded`` if the wait would be longer than ``HTTP_RATE_LIMIT_MAX_WAIT`` seconds."""
+        kwargs.setdefault("timeout", getattr(settings, "HTTP_CLIENT_TIMEOUT", 30))
+        if not rate_limit:
+            return self._send(method, url, **kwargs)
+
+        provider, credential = rate_limit
+        for attempt in range(getattr(settings, "HTTP_RATE_LIMIT_RETRIES", 2) + 1):
+            rate_limiter.acquire(provider, credential)
+            response = self._send(method, url, **kwargs)
+            retry_after = rate_limiter.update(provider, credential, response)
+            if retry_after is None:
+                return response
+            logger.warning(f"Rate limited by {provider}, retrying after {retry_after:.2f}s")
+        raise RateLimitExceeded(retry_after=retry_after)
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs) -> requests.Response:
+        return self.request("POST", url, data=data, json=json, **kwargs)
+
+    def _send(self, method, url, **kwargs) -> requests.Response:
+        host = urlsplit(url).netloc
+        session = self._get_session(host)
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record(host, start, error=True)
+            raise
+        self._record(host, start, error=response.status_code >= 500)
+        return response
+
+    def metrics(self) -> dict:
+        """Number of requests, failed requests, and total time spent in requests, for each host in this process.
+        For inspecting the client from a shell; it isn't exposed through the API."""
+        with self._lock:
+            return {host: dict(values) for (host, values) in self._metrics.items()}
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+    def _get_session(self, host) -> requests.Session:
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._sessions[host] = self._create_session()
+            return session
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        # sessions are shared by every plugin instance, so don't let cookies leak from one request to the next
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        pool_size = getattr(settings, "HTTP_CLIENT_POOL_SIZE", 10)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _record(self, host, start, error):
+        with self._lock:
+            metrics = self._metrics[host]
+            metrics["requests"] += 1
+            metrics["errors"] += int(error)
+            metrics["seconds"] += time.monotonic() - start
+
+
+http_client = HttpClient()
@@ -0,0 +1,137 @@
+"""Read-through cache for looking up communities and plugin instances.
+
+Lookups are cached in an in-process LRU, backed by the shared Django cache. Cached entries are versioned: saving or
+deleting a community or plugin replaces the version of the cached lookups that it affects, so that every worker reloads
+them from the database. Cached entries store field values rather than model instances, and every lookup returns new
+instances, so changes made to one instance are never seen by another request. Fields that the scheduler updates with
+its own queries aren't cached, since those updates don't invalidate the lookups; they're loaded when accessed.
+
+Lookups are only cached when LOOKUP_CACHE_ENABLED is set, which it is when the Django cache is shared between
+processes. With a per-process cache, a change made by one process would never invalidate the lookups of another."""
+
+import copy
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class LookupCache:
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version_key, key, load):
+        """Get the value of ``key``, calling ``load`` if it isn't cached. ``version_key`` is the key of the version
+        that the value is cached under."""
+        if not getattr(settings, "LOOKUP_CACHE_ENABLED", False):
+            return load()
+        version = self._get_version(version_key)
+        shared_key = f"metagov:lookup:{version_key}:{version}:{key}"
+        with self._lock:
+            entry = self._entries.get(shared_key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(shared_key)
+                return entry[1]
+
+        value = cache.get(shared_key)
+        if value is None:
+            value = load()
+            cache.set(shared_key, value, timeout=self._timeout())
+        self._store(shared_key, value)
+        return value
+
+    def invalidate(self, version_key):
+        """Replace the version of the lookups cached under ``version_key``. It's replaced again once the current
+        transaction commits, so that lookups made before the change is visible aren't kept."""
+        self._set_version(version_key)
+        transaction.on_commit(lambda: self._set_version(version_key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_version(self, version_key):
+        key = f"metagov:lookup-version:{version_key}"
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(key)
+        return version
+
+    def _set_version(self, version_key):
+        cache.set(f"metagov:lookup-version:{version_key}", uuid.uuid4().hex, timeout=None)
+
+    def _store(self, shared_key, value):
+        with self._lock:
+            self._entries[shared_key] = (time.monotonic() + self._timeout(), value)
+            self._entries.move_to_end(shared_key)
+            while len(self._entries) > getattr(settings, "LOOKUP_CACHE_SIZE", 1000):
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _timeout():
+        return getattr(settings, "LOOKUP_CACHE_TIMEOUT", 60 * 5)
+
+
+lookup_cache = LookupCache()
+
+
+def get_community(slug):
+    """Get a community by slug. Raises ``Community.DoesNotExist`` if there isn't one."""
+    from metagov.core.models import Community
+
+    def load():
+        return _field_values(Community.objects.get(slug=slug))
+
+    values = lookup_cache.get(community_version_key(slug), "community", load)
+    return _from_values(Community, values)
+
+
+def get_plugin(community, cls, **filters):
+    """Get the plugin instance of the proxy class ``cls`` in ``community`` that matches ``filters``. Raises
+    ``DoesNotExist`` or ``MultipleObjectsReturned`` like ``QuerySet.get``. The plugin's ``community`` and ``state``
+    are set without querying the database."""
+    from metagov.core.models import DataStore
+
+    def load():
+        return _field_values(cls.objects.get(community=community, **filters))
+
+    key = ":".join([cls.name] + [f"{name}={value}" for (name, value) in sorted(filters.items())])
+    values = lookup_cache.get(plugins_version_key(community.pk), key, load)
+    plugin = _from_values(cls, values)
+    plugin.community = community
+    if plugin.state_id is not None:
+        plugin.state = DataStore.from_db(DataStore.objects.db, ["id"], [plugin.state_id])
+    return plugin
+
+
+def community_version_key(slug):
+    return f"community:{slug}"
+
+
+def plugins_version_key(community_id):
+    return f"plugins:{community_id}"
+
+
+def _field_values(instance):
+    excluded = getattr(instance, "scheduler_fields", ())
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if field.name not in excluded
+    }
+
+
+def _from_values(cls, values):
+    # the values are shared by every lookup from the in-process cache, so each instance gets its own copy of
+    # mutable values such as ``config``
+    values = copy.deepcopy(values)
+    return cls.from_db(cls.objects.db, list(values), list(values.values()))
@@ -3,6 +3,7 @@ import logging
 import traceback
 
 from django.http import HttpResponseBadRequest, HttpResponseServerError
+from metagov.core import lookups
 from metagov.core.models import Community
 from rest_framework.views import exception_handler
 
@@ -27,7 +28,7 @@ class CommunityMiddleware:
         if not slug:
             return HttpResponseBadRequest(f"Missing required header '{COMMUNITY_HEADER}'")
         try:
-            community = Community.objects.get(slug=slug)
+            community = lookups.get_community(slug)
         except Community.DoesNotExist:
             return HttpResponseBadRequest(f"Community '{slug}' not found")
         request.community = community
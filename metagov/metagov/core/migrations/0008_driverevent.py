@@ -0,0 +1,37 @@
+# Generated by Django 3.2.12 on 2026-10-17 06:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_governanceprocess_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Name of the plugin that produced the event', max_length=30)),
+                ('event_type', models.CharField(max_length=100)),
+                ('timestamp', models.CharField(help_text='Time that the event was produced, in seconds since epoch', max_length=30)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('initiator', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'PENDING'), ('delivered', 'DELIVERED'), ('dead', 'DEAD')], default='pending', max_length=15)),
+                ('attempts', models.PositiveIntegerField(default=0, help_text='Number of failed delivery attempts')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Earliest time of the next delivery attempt')),
+                ('last_error', models.TextField(blank=True, help_text='Error from the most recent failed delivery attempt')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('community', models.ForeignKey(help_text='Community that the event belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='driver_events', to='core.community')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='driverevent',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='core_driver_status_f83d04_idx'),
+        ),
+    ]
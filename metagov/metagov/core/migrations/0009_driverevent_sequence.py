@@ -0,0 +1,27 @@
+# Generated by Django 3.2.12 on 2026-10-17 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_driverevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='last_event_sequence',
+            field=models.PositiveBigIntegerField(default=0, help_text='Sequence number of the most recent platform event in this community'),
+        ),
+        migrations.AddField(
+            model_name='driverevent',
+            name='sequence',
+            field=models.PositiveBigIntegerField(help_text='Sequence number of the event in its community', null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='driverevent',
+            unique_together={('community', 'sequence')},
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.12 on 2026-10-17 06:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_driverevent_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='governanceprocess',
+            name='next_run_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Time that the process is next due to be updated'),
+        ),
+        migrations.AddField(
+            model_name='plugin',
+            name='next_run_at',
+            field=models.DateTimeField(blank=True, db_index=True, help_text='Time that the plugin task is next due to run', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='governanceprocess',
+            index=models.Index(fields=['status', 'next_run_at'], name='core_govern_status_bcfd4f_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.12 on 2026-10-17 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_next_run_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='governanceprocess',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text="Time that the worker's lease on the process expires", null=True),
+        ),
+        migrations.AddField(
+            model_name='governanceprocess',
+            name='lease_token',
+            field=models.UUIDField(blank=True, editable=False, help_text='Worker run that holds the lease', null=True),
+        ),
+        migrations.AddField(
+            model_name='plugin',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text="Time that the worker's lease on the plugin task expires", null=True),
+        ),
+        migrations.AddField(
+            model_name='plugin',
+            name='lease_token',
+            field=models.UUIDField(blank=True, editable=False, help_text='Worker run that holds the lease', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-17 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='governanceprocess',
+            name='poll_interval',
+            field=models.PositiveIntegerField(blank=True, help_text='Current time between updates in seconds, which grows while the process is unchanged', null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.12 on 2026-10-17 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_governanceprocess_poll_interval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboundWebhook',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('plugin_name', models.CharField(help_text='Name of the plugin that the webhook was sent to', max_length=30)),
+                ('community_slug', models.CharField(blank=True, max_length=36, null=True)),
+                ('community_platform_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('meta', models.JSONField(default=dict, help_text='Request headers and metadata')),
+                ('body', models.BinaryField()),
+                ('status', models.CharField(choices=[('pending', 'PENDING'), ('processing', 'PROCESSING'), ('failed', 'FAILED')], default='pending', max_length=15)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='inboundwebhook',
+            index=models.Index(fields=['status', 'created_at'], name='core_inboun_status_1783c4_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.12 on 2026-10-17 06:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_inboundwebhook'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessRoutingKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('plugin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.plugin')),
+                ('process', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routing_keys', to='core.governanceprocess')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='processroutingkey',
+            index=models.Index(fields=['key'], name='core_proces_key_a122bb_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='processroutingkey',
+            unique_together={('plugin', 'key')},
+        ),
+    ]
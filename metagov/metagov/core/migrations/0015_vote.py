@@ -0,0 +1,28 @@
+# Generated by Django 3.2.12 on 2026-10-17 06:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_processroutingkey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vote',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('voter', models.CharField(help_text='Platform user ID of the voter', max_length=150)),
+                ('option', models.CharField(max_length=200)),
+                ('cast_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('process', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='core.governanceprocess')),
+            ],
+            options={
+                'unique_together': {('process', 'voter')},
+            },
+        ),
+    ]
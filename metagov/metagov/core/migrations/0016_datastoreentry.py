@@ -0,0 +1,56 @@
+# Generated by Django 3.2.12 on 2026-10-17 06:56
+
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def split_datastores(apps, schema_editor):
+    """Move each key of the datastore blobs to its own entry. Values in the blobs are jsonpickle-encoded strings, and
+    entries store the same JSON, decoded."""
+    DataStore = apps.get_model("core", "DataStore")
+    DataStoreEntry = apps.get_model("core", "DataStoreEntry")
+    for datastore in DataStore.objects.iterator():
+        entries = [
+            DataStoreEntry(datastore=datastore, key=key, value=json.loads(value))
+            for (key, value) in datastore.datastore.items()
+            if value is not None
+        ]
+        DataStoreEntry.objects.bulk_create(entries, batch_size=500)
+
+
+def join_datastores(apps, schema_editor):
+    DataStore = apps.get_model("core", "DataStore")
+    DataStoreEntry = apps.get_model("core", "DataStoreEntry")
+    for datastore in DataStore.objects.iterator():
+        entries = DataStoreEntry.objects.filter(datastore=datastore).values_list("key", "value")
+        datastore.datastore = {key: json.dumps(value) for (key, value) in entries}
+        datastore.save(update_fields=["datastore"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_vote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataStoreEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('value', models.JSONField(help_text='Value encoded with jsonpickle', null=True)),
+                ('datastore', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='core.datastore')),
+            ],
+            options={
+                'unique_together': {('datastore', 'key')},
+            },
+        ),
+        migrations.RunPython(split_datastores, join_datastores),
+        migrations.RemoveField(
+            model_name='datastore',
+            name='datastore',
+        ),
+    ]
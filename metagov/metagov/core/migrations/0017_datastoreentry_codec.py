@@ -0,0 +1,46 @@
+# Generated by Django 3.2.12 on 2026-10-17 07:04
+
+from django.db import migrations, models
+
+PICKLED_KEY = "py/jsonpickle"
+
+
+def has_jsonpickle_tags(value):
+    if isinstance(value, list):
+        return any(has_jsonpickle_tags(item) for item in value)
+    if isinstance(value, dict):
+        return any(key.startswith("py/") or has_jsonpickle_tags(item) for (key, item) in value.items())
+    return False
+
+
+def wrap_pickled_values(apps, schema_editor):
+    """Values that were encoded with jsonpickle are now wrapped, so that plain JSON values can be read without it"""
+    DataStoreEntry = apps.get_model("core", "DataStoreEntry")
+    for entry in DataStoreEntry.objects.iterator():
+        if has_jsonpickle_tags(entry.value):
+            entry.value = {PICKLED_KEY: entry.value}
+            entry.save(update_fields=["value"])
+
+
+def unwrap_pickled_values(apps, schema_editor):
+    DataStoreEntry = apps.get_model("core", "DataStoreEntry")
+    for entry in DataStoreEntry.objects.iterator():
+        if isinstance(entry.value, dict) and list(entry.value) == [PICKLED_KEY]:
+            entry.value = entry.value[PICKLED_KEY]
+            entry.save(update_fields=["value"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_datastoreentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='datastoreentry',
+            name='value',
+            field=models.JSONField(help_text='Value encoded with metagov.core.codecs', null=True),
+        ),
+        migrations.RunPython(wrap_pickled_values, unwrap_pickled_values),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.12 on 2026-10-17 07:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_datastoreentry_codec'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('plugin_name', models.CharField(max_length=30)),
+                ('action_id', models.CharField(max_length=100)),
+                ('community_platform_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('parameters', models.JSONField(blank=True, null=True)),
+                ('callback_url', models.CharField(blank=True, help_text='Callback URL to notify when the job has finished', max_length=100, null=True)),
+                ('status', models.CharField(choices=[('pending', 'PENDING'), ('running', 'RUNNING'), ('completed', 'COMPLETED'), ('failed', 'FAILED')], default='pending', max_length=15)),
+                ('result', models.JSONField(blank=True, help_text='Result of the action, once it has completed', null=True)),
+                ('error', models.JSONField(blank=True, help_text='Status code and detail of the error, if the action failed', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('community', models.ForeignKey(help_text='Community that the action is performed in', on_delete=django.db.models.deletion.CASCADE, related_name='action_jobs', to='core.community')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='actionjob',
+            index=models.Index(fields=['status', 'created_at'], name='core_action_status_132c9e_idx'),
+        ),
+    ]
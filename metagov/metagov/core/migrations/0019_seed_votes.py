@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def seed_votes(apps, schema_editor):
+    """Record the votes that were tallied in ``outcome["votes"]`` before the vote ledger existed, so that processes
+    that are still open keep them."""
+    GovernanceProcess = apps.get_model("core", "GovernanceProcess")
+    Vote = apps.get_model("core", "Vote")
+    for process in GovernanceProcess.objects.filter(votes__isnull=True).iterator():
+        tally = process.outcome.get("votes") if isinstance(process.outcome, dict) else None
+        if not isinstance(tally, dict):
+            continue
+        votes = {}
+        for (option, option_votes) in tally.items():
+            users = option_votes.get("users") if isinstance(option_votes, dict) else None
+            if not isinstance(users, list):
+                continue
+            for voter in users:
+                # each voter has one vote per process
+                votes.setdefault(str(voter), option)
+        Vote.objects.bulk_create(
+            [Vote(process=process, voter=voter, option=option) for (voter, option) in votes.items()], batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_actionjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_votes, migrations.RunPython.noop),
+    ]
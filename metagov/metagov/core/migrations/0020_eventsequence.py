@@ -0,0 +1,42 @@
+# Generated by Django 3.2.12 on 2026-10-17 07:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_counters(apps, schema_editor):
+    Community = apps.get_model("core", "Community")
+    EventSequence = apps.get_model("core", "EventSequence")
+    counters = Community.objects.filter(last_event_sequence__gt=0).values_list("pk", "last_event_sequence")
+    EventSequence.objects.bulk_create(
+        [EventSequence(community_id=pk, last_sequence=last_sequence) for (pk, last_sequence) in counters]
+    )
+
+
+def restore_counters(apps, schema_editor):
+    Community = apps.get_model("core", "Community")
+    EventSequence = apps.get_model("core", "EventSequence")
+    for (community_id, last_sequence) in EventSequence.objects.values_list("community_id", "last_sequence"):
+        Community.objects.filter(pk=community_id).update(last_event_sequence=last_sequence)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_seed_votes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventSequence',
+            fields=[
+                ('community', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='event_sequence', serialize=False, to='core.community')),
+                ('last_sequence', models.PositiveBigIntegerField(default=0, help_text='Sequence number of the most recent platform event in the community')),
+            ],
+        ),
+        migrations.RunPython(copy_counters, restore_counters),
+        migrations.RemoveField(
+            model_name='community',
+            name='last_event_sequence',
+        ),
+    ]
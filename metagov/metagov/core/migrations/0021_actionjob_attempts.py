@@ -0,0 +1,24 @@
+# Generated by Django 3.2.12 on 2026-10-17 07:17
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_eventsequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actionjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Number of times that a worker has started the job'),
+        ),
+        migrations.AddField(
+            model_name='actionjob',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Earliest time of the next attempt'),
+        ),
+    ]
@@ -1,15 +1,21 @@
+import copy
+import gzip
+import io
+import json
 import logging
 import time
 import uuid
+from datetime import timedelta
 from enum import Enum
 
 import jsonpickle
-import jsonschema
 import requests
 from django.conf import settings
-from django.db import IntegrityError, models
-
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from metagov.core import codecs, lookups
+from metagov.core.http import http_client
 from metagov.core.plugin_manager import Parameters, plugin_registry
 
 logger = logging.getLogger(__name__)
@@ -27,11 +33,32 @@ class Community(models.Model):
     )
     readable_name = models.CharField(max_length=100, blank=True, help_text="Human-readable name for the community")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Community, cls).from_db(db, field_names, values)
+        # remember the slug that was loaded, so that the lookups cached under it are invalidated if it's changed
+        instance._loaded_slug = instance.__dict__.get("slug")
+        return instance
+
     def __str__(self):
         if self.readable_name:
             return f"{self.readable_name} ({self.slug})"
         return str(self.slug)
 
+    def next_event_sequence(self):
+        """Allocate the next platform event sequence number for this community. The counter row stays locked
+        until the current transaction commits, so sequence numbers are gapless and in commit order."""
+        counter = EventSequence.objects.filter(community_id=self.pk)
+        if not counter.update(last_sequence=models.F("last_sequence") + 1):
+            try:
+                with transaction.atomic():
+                    EventSequence.objects.create(community_id=self.pk, last_sequence=1)
+                return 1
+            except IntegrityError:
+                # a concurrent event created the counter first
+                counter.update(last_sequence=models.F("last_sequence") + 1)
+        return counter.values_list("last_sequence", flat=True).get()
+
     @property
     def plugins(self):
         return Plugin.objects.filter(community=self)
@@ -43,11 +70,11 @@ class Community(models.Model):
         if not cls:
             raise ValueError(f"Plugin '{plugin_name}' not found")
         if id is not None:
-            return cls.objects.get(name=plugin_name, community=self, pk=id)
+            return lookups.get_plugin(self, cls, pk=id)
         if community_platform_id:
-            return cls.objects.get(name=plugin_name, community=self, community_platform_id=community_platform_id)
+            return lookups.get_plugin(self, cls, community_platform_id=community_platform_id)
         else:
-            return cls.objects.get(name=plugin_name, community=self)
+            return lookups.get_plugin(self, cls)
 
     def enable_plugin(self, plugin_name, plugin_config=None):
         """Enable or update plugin"""
@@ -63,49 +90,136 @@ class Community(models.Model):
         plugin.delete()
 
     def perform_action(
-        self, plugin_name, action_id, parameters=None, jsonschema_validation=True, community_platform_id=None
+        self,
+        plugin_name,
+        action_id,
+        parameters=None,
+        jsonschema_validation=True,
+        community_platform_id=None,
+        run_async=False,
+        callback_url=None,
     ):
-        """Perform an action in the community"""
+        """Perform an action in the community.
+
+        If ``run_async`` is set, the action is queued to be performed by a worker, and the ``ActionJob`` is returned
+        instead of the result. The plugin is looked up and the parameters are validated before the job is queued.
+        Only actions that are registered with ``allow_async=True`` can be performed asynchronously."""
         # Look up plugin instance
         cls = plugin_registry[plugin_name]
         meta = cls._action_registry[action_id]
+        if run_async and not meta.allow_async:
+            raise ValueError(f"Action '{plugin_name}.{action_id}' can't be performed asynchronously")
         plugin = self.get_plugin(plugin_name, community_platform_id)
 
         # Validate input parameters
-        if jsonschema_validation and meta.input_schema and parameters:
-            jsonschema.validate(parameters, meta.input_schema)
+        if jsonschema_validation and meta.input_validator and parameters:
+            meta.input_validator.validate(parameters)
+
+        if run_async:
+            return ActionJob.start(
+                community=self,
+                plugin_name=plugin_name,
+                action_id=action_id,
+                parameters=parameters,
+                community_platform_id=community_platform_id,
+                callback_url=callback_url,
+            )
 
         # Invoke action function
         action_function = getattr(plugin, meta.function_name)
         result = action_function(**parameters or {})
 
         # Validate result
-        if jsonschema_validation and meta.output_schema and result:
-            jsonschema.validate(result, meta.output_schema)
+        validate_output = getattr(settings, "VALIDATE_ACTION_OUTPUT", True)
+        if jsonschema_validation and validate_output and meta.output_validator and result:
+            meta.output_validator.validate(result)
 
         return result
 
 
+class EventSequence(models.Model):
+    """Counter of the platform event sequence numbers that have been allocated in a community. It's kept out of the
+    Community row, so that saving a community never writes back a stale counter, and allocating a number doesn't
+    lock the community."""
+
+    community = models.OneToOneField(Community, models.CASCADE, primary_key=True, related_name="event_sequence")
+    last_sequence = models.PositiveBigIntegerField(
+        default=0, help_text="Sequence number of the most recent platform event in the community"
+    )
+
+
 class DataStore(models.Model):
-    datastore = models.JSONField(default=dict)
+    """Key-value store for the state of a plugin or process. Each key is stored as its own ``DataStoreEntry``, so
+    that reading or writing a key doesn't load or rewrite the others. Values are encoded with ``metagov.core.codecs``,
+    and entries are loaded when they're first read."""
 
     def get(self, key):
-        value = self.datastore.get(key)
-        if value is not None:
-            return jsonpickle.decode(value)
-        return value
+        return self.get_many([key])[key]
+
+    def get_many(self, keys) -> dict:
+        """Get the values of several keys at once. Keys that aren't set are returned with value None."""
+        cache = self._entry_cache
+        missing = [key for key in keys if key not in cache]
+        if missing:
+            cache.update(dict.fromkeys(missing))
+            cache.update(self.entries.filter(key__in=missing).values_list("key", "value"))
+        # copy the values, so that changes made to them without ``set`` aren't kept in the cache
+        return {key: codecs.decode(copy.deepcopy(cache[key])) for key in keys}
 
     def set(self, key, value):
-        self.datastore[key] = jsonpickle.encode(value)
-        self.save()
+        return self.set_many({key: value})
+
+    def set_many(self, values: dict):
+        """Set the values of several keys at once"""
+        encoded = {key: codecs.encode(value) for (key, value) in values.items()}
+        try:
+            self._write_entries(encoded)
+        except IntegrityError:
+            # another request created one of the entries first, so it's updated this time
+            self._write_entries(encoded)
+        # copy the values, so that changes the caller makes to them later aren't kept in the cache
+        self._entry_cache.update(copy.deepcopy(encoded))
         return True
 
     def remove(self, key):
-        res = self.datastore.pop(key, None)
-        self.save()
-        if not res:
-            return False
-        return True
+        deleted, _ = self.entries.filter(key=key).delete()
+        self._entry_cache[key] = None
+        return bool(deleted)
+
+    def _write_entries(self, encoded):
+        with transaction.atomic():
+            existing = list(self.entries.filter(key__in=list(encoded)))
+            for entry in existing:
+                entry.value = encoded[entry.key]
+            DataStoreEntry.objects.bulk_update(existing, ["value"])
+            existing_keys = {entry.key for entry in existing}
+            new_entries = [
+                DataStoreEntry(datastore=self, key=key, value=value)
+                for (key, value) in encoded.items()
+                if key not in existing_keys
+            ]
+            DataStoreEntry.objects.bulk_create(new_entries)
+
+    @property
+    def _entry_cache(self):
+        # encoded values of the entries that have been loaded, or None for keys that aren't set
+        if not hasattr(self, "_entries"):
+            self._entries = {}
+        return self._entries
+
+
+class DataStoreEntry(models.Model):
+    """Value of one key in a DataStore"""
+
+    datastore = models.ForeignKey(DataStore, models.CASCADE, related_name="entries")
+    key = models.CharField(max_length=255)
+    value = models.JSONField(null=True, help_text="Value encoded with metagov.core.codecs")
+
+    class Meta:
+        unique_together = [["datastore", "key"]]
+
+    def __str__(self):
+        return f"{self.key} ({self.datastore_id})"
 
 
 class PluginManager(models.Manager):
@@ -141,6 +255,15 @@ def quality_is_greater(a, b):
     return order.index(a) > order.index(b)
 
 
+def _exclude_fields_from_save(instance, kwargs, excluded):
+    """Limit a full save of an existing row to the fields that aren't in ``excluded``."""
+    if instance._state.adding or kwargs.get("force_insert") or kwargs.get("update_fields") is not None:
+        return
+    kwargs["update_fields"] = [
+        field.name for field in instance._meta.concrete_fields if not field.primary_key and field.name not in excluded
+    ]
+
+
 class Plugin(models.Model):
     """Represents an instance of an activated plugin."""
 
@@ -156,6 +279,13 @@ class Plugin(models.Model):
         help_text="Optional identifier for this instance. If multiple instances are allowed per community, this field must be set to a unique value for each instance.",
     )
     state = models.OneToOneField(DataStore, models.CASCADE, help_text="Datastore to persist any state", null=True)
+    next_run_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, help_text="Time that the plugin task is next due to run"
+    )
+    lease_token = models.UUIDField(null=True, blank=True, editable=False, help_text="Worker run that holds the lease")
+    lease_expires_at = models.DateTimeField(
+        null=True, blank=True, editable=False, help_text="Time that the worker's lease on the plugin task expires"
+    )
 
     # Static metadata
     auth_type = AuthType.NONE
@@ -178,15 +308,31 @@ class Plugin(models.Model):
             community_platform_id_str = f" ({self.community_platform_id})"
         return f"{self.name}{community_platform_id_str} for '{self.community}'"
 
+    # Fields that the scheduler updates with its own queries. Saving the plugin doesn't write them, so that
+    # a copy loaded before the scheduler claimed the row doesn't overwrite the lease or schedule.
+    scheduler_fields = ("next_run_at", "lease_token", "lease_expires_at")
+
     def save(self, *args, **kwargs):
         if not self.pk:
             self.state = DataStore.objects.create()
+        _exclude_fields_from_save(self, kwargs, self.scheduler_fields)
         super(Plugin, self).save(*args, **kwargs)
 
     def initialize(self):
         """Initialize the plugin. Invoked once, directly after the plugin instance is created."""
         pass
 
+    def verify_webhook(self, request):
+        """Check that an incoming webhook request for this plugin instance really came from the platform, and raise
+        ``PluginErrorInternal`` if it didn't. Called before the request is queued, if webhooks are processed
+        asynchronously."""
+        pass
+
+    @property
+    def http(self):
+        """Client for making HTTP requests to external platforms, with pooled connections and a default timeout"""
+        return http_client
+
     def start_process(self, process_name, callback_url=None, **kwargs):
         """Start a new GovernanceProcess"""
         # Find the proxy class for the specified GovernanceProcess
@@ -227,30 +373,42 @@ class Plugin(models.Model):
 
     def send_event_to_driver(self, event_type: str, data: dict, initiator: dict):
         """Send an event to the driver"""
-        event = {
-            "community": self.community.slug,
-            "source": self.name,
-            "event_type": event_type,
-            "timestamp": str(time.time()),
-            "data": data,
-            "initiator": initiator,
-        }
-
-        # Emit signal
-        from metagov.core.signals import platform_event_created
-
-        platform_event_created.send(sender=self.__class__, instance=self, **event)
-
-        # Post serialized event to receiver HTTP endpoint
-        # TODO: maybe move this into a receiver for the platform_event_created signal?
-        if getattr(settings, "DRIVER_EVENT_RECEIVER_URL", None):
-            serialized = jsonpickle.encode(event, unpicklable=False)
-            logger.debug("Sending event to Driver: " + serialized)
-            resp = requests.post(settings.DRIVER_EVENT_RECEIVER_URL, data=serialized)
-            if not resp.ok:
-                logger.error(
-                    f"Error sending event to driver at {settings.DRIVER_EVENT_RECEIVER_URL}: {resp.status_code} {resp.reason}"
+        receiver_url = getattr(settings, "DRIVER_EVENT_RECEIVER_URL", None)
+        keep_event = bool(receiver_url or getattr(settings, "DRIVER_EVENT_RETENTION_DAYS", 0))
+        with transaction.atomic():
+            event = {
+                "community": self.community.slug,
+                "source": self.name,
+                "event_type": event_type,
+                # only events that are written to the outbox are numbered, so that other events don't lock the counter
+                "sequence": self.community.next_event_sequence() if keep_event else None,
+                "timestamp": str(time.time()),
+                "data": data,
+                "initiator": initiator,
+            }
+
+            # Emit signal
+            from metagov.core.signals import platform_event_created
+
+            platform_event_created.send(sender=self.__class__, instance=self, **event)
+
+            # Write the event to the outbox. It's delivered to the receiver HTTP endpoint by a separate
+            # task once the current transaction commits, so a slow Driver can't hold up the caller.
+            # If retention is enabled, the event is also kept for Drivers to pull from the event stream.
+            if keep_event:
+                driver_event = DriverEvent.objects.create(
+                    community=self.community,
+                    source=event["source"],
+                    event_type=event_type,
+                    sequence=event["sequence"],
+                    timestamp=event["timestamp"],
+                    data=json.loads(jsonpickle.encode(data, unpicklable=False)),
+                    initiator=json.loads(jsonpickle.encode(initiator, unpicklable=False)),
                 )
+                if receiver_url:
+                    transaction.on_commit(DriverEvent.schedule_delivery)
+                if getattr(settings, "DRIVER_EVENT_RETENTION_DAYS", 0):
+                    transaction.on_commit(driver_event.warn_if_committed_late)
 
     def add_linked_account(
         self, *, platform_identifier, external_id=None, custom_data=None, link_type=None, link_quality=None
@@ -294,6 +452,376 @@ class Plugin(models.Model):
         return PluginSerializer(self).data
 
 
+class DriverEventStatus(Enum):
+    PENDING = "pending"
+    DELIVERED = "delivered"
+    DEAD = "dead"
+
+
+class DriverEvent(models.Model):
+    """Outbox record for a platform event that needs to be delivered to the Driver.
+
+    Records are written in the same transaction as the webhook or task that produced the event, and are
+    delivered to ``DRIVER_EVENT_RECEIVER_URL`` by the ``deliver_driver_events`` task. Failed deliveries are
+    retried with exponential backoff. After ``DRIVER_EVENT_MAX_ATTEMPTS`` failures the event is marked ``dead``,
+    and can be re-queued with ``replay``.
+
+    Events are numbered with a per-community ``sequence``, and are delivered in sequence order within each
+    community. An event that is waiting to be retried holds back the later events from the same community.
+
+    If ``DRIVER_EVENT_RETENTION_DAYS`` is set, events are kept for that long regardless of their delivery status,
+    and Drivers can read them from the event stream endpoint. Otherwise delivered events are deleted after
+    ``DRIVER_EVENT_DELIVERED_GRACE`` seconds."""
+
+    community = models.ForeignKey(
+        Community, models.CASCADE, related_name="driver_events", help_text="Community that the event belongs to"
+    )
+    source = models.CharField(max_length=30, help_text="Name of the plugin that produced the event")
+    event_type = models.CharField(max_length=100)
+    sequence = models.PositiveBigIntegerField(null=True, help_text="Sequence number of the event in its community")
+    timestamp = models.CharField(max_length=30, help_text="Time that the event was produced, in seconds since epoch")
+    data = models.JSONField(default=dict, blank=True)
+    initiator = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(
+        max_length=15,
+        choices=[(s.value, s.name) for s in DriverEventStatus],
+        default=DriverEventStatus.PENDING.value,
+    )
+    attempts = models.PositiveIntegerField(default=0, help_text="Number of failed delivery attempts")
+    next_attempt_at = models.DateTimeField(default=timezone.now, help_text="Earliest time of the next delivery attempt")
+    last_error = models.TextField(blank=True, help_text="Error from the most recent failed delivery attempt")
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ["community", "sequence"]
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.source}.{self.event_type} for '{self.community.slug}' ({self.pk}, {self.status})"
+
+    @classmethod
+    def pending(cls):
+        """Pending events that are due for a delivery attempt, oldest first"""
+        return cls.objects.filter(
+            status=DriverEventStatus.PENDING.value, next_attempt_at__lte=timezone.now()
+        ).order_by("pk")
+
+    @classmethod
+    def deliverable(cls, community_id, limit):
+        """Up to ``limit`` pending events for a community that can be delivered now, in sequence order. Stops at the
+        first event that isn't due for another attempt yet, so that later events don't overtake it."""
+        events = []
+        now = timezone.now()
+        pending_events = cls.objects.filter(community_id=community_id, status=DriverEventStatus.PENDING.value)
+        for event in pending_events.select_related("community").order_by("sequence", "pk")[:limit]:
+            if event.next_attempt_at > now:
+                break
+            events.append(event)
+        return events
+
+    def warn_if_committed_late(self):
+        """Streams that aren't filtered by community only hold events back for ``DRIVER_EVENT_STREAM_LAG`` seconds,
+        so an event that took longer than that to commit may have been skipped by them."""
+        lag = getattr(settings, "DRIVER_EVENT_STREAM_LAG", 5)
+        elapsed = (timezone.now() - self.created_at).total_seconds()
+        if elapsed > lag:
+            logger.warning(
+                f"Event {self.pk} was committed {elapsed:.1f}s after it was created, which is longer than "
+                f"DRIVER_EVENT_STREAM_LAG ({lag}s). Event streams that aren't filtered by community may have "
+                "skipped it."
+            )
+
+    @staticmethod
+    def schedule_delivery(countdown=None):
+        """Ask a worker to deliver pending events, rather than waiting for the next scheduled run"""
+        from metagov.core.tasks import deliver_driver_events
+
+        try:
+            deliver_driver_events.apply_async(countdown=countdown, retry=False)
+        except Exception as e:
+            logger.warning(f"Failed to schedule event delivery, will retry on next scheduled run: {e}")
+
+    def serialize(self):
+        return {
+            "id": self.pk,
+            "community": self.community.slug,
+            "source": self.source,
+            "event_type": self.event_type,
+            "sequence": self.sequence,
+            "timestamp": self.timestamp,
+            "data": self.data,
+            "initiator": self.initiator,
+        }
+
+    def deliver(self):
+        """Post the event to the Driver. Returns True if the event was delivered."""
+        url = settings.DRIVER_EVENT_RECEIVER_URL
+        serialized = json.dumps(self.serialize())
+        logger.debug("Sending event to Driver: " + serialized)
+        try:
+            resp = http_client.post(url, data=serialized, timeout=getattr(settings, "DRIVER_EVENT_TIMEOUT", 10))
+        except requests.exceptions.RequestException as e:
+            self.mark_failed(str(e))
+            return False
+        if not resp.ok:
+            self.mark_failed(f"{resp.status_code} {resp.reason}")
+            return False
+        self.mark_delivered()
+        return True
+
+    @classmethod
+    def deliver_batch(cls, events):
+        """Post a list of events to the Driver as a gzipped JSON array.
+
+        If the Driver responds with ``{"acknowledged": [<event ids>]}``, only the listed events are considered
+        delivered and the rest are retried. Any other successful response acknowledges the whole batch.
+        Returns the number of delivered events."""
+        url = settings.DRIVER_EVENT_RECEIVER_URL
+        serialized = json.dumps([event.serialize() for event in events])
+        logger.debug(f"Sending batch of {len(events)} events to Driver")
+        try:
+            resp = http_client.post(
+                url,
+                data=gzip.compress(serialized.encode("utf-8")),
+                headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+                timeout=getattr(settings, "DRIVER_EVENT_TIMEOUT", 10),
+            )
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+            resp = None
+        else:
+            error = f"{resp.status_code} {resp.reason}"
+
+        if resp is None or not resp.ok:
+            for event in events:
+                event.mark_failed(error)
+            return 0
+
+        acknowledged = None
+        try:
+            acknowledged = resp.json().get("acknowledged")
+        except (ValueError, AttributeError):
+            pass
+        if acknowledged is None:
+            acknowledged = [event.pk for event in events]
+
+        delivered = 0
+        for event in events:
+            if event.pk in acknowledged:
+                event.mark_delivered()
+                delivered += 1
+            else:
+                event.mark_failed("Not acknowledged by the Driver")
+        return delivered
+
+    def mark_delivered(self):
+        self.status = DriverEventStatus.DELIVERED.value
+        self.delivered_at = timezone.now()
+        self.last_error = ""
+        self.save()
+
+    def mark_failed(self, error):
+        """Record a failed delivery attempt, and schedule a retry or move the event to the dead-letter state"""
+        self.attempts += 1
+        self.last_error = error
+        max_attempts = getattr(settings, "DRIVER_EVENT_MAX_ATTEMPTS", 8)
+        if self.attempts >= max_attempts:
+            logger.error(f"Giving up on delivering {self} after {self.attempts} attempts: {error}")
+            self.status = DriverEventStatus.DEAD.value
+        else:
+            backoff = getattr(settings, "DRIVER_EVENT_RETRY_BACKOFF", 30) * 2 ** (self.attempts - 1)
+            backoff = min(backoff, getattr(settings, "DRIVER_EVENT_MAX_RETRY_BACKOFF", 60 * 60))
+            logger.warning(f"Error delivering {self}, retrying in {backoff}s: {error}")
+            self.next_attempt_at = timezone.now() + timedelta(seconds=backoff)
+        self.save()
+
+    def replay(self):
+        """Re-queue a dead or delivered event for delivery"""
+        self.status = DriverEventStatus.PENDING.value
+        self.attempts = 0
+        self.last_error = ""
+        self.next_attempt_at = timezone.now()
+        self.save()
+
+
+class InboundWebhookStatus(Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    FAILED = "failed"
+
+
+class InboundWebhook(models.Model):
+    """Incoming webhook request that has been acknowledged, and is waiting to be processed by a worker.
+
+    Only used if ``WEBHOOK_ASYNC_PROCESSING`` is enabled. The request's body and headers are stored so that the
+    request can be rebuilt and passed to the plugin as if it had just been received. Webhooks are deleted once they
+    have been processed. Failed webhooks are kept, and can be retried with ``retry``."""
+
+    # request metadata to keep, besides the HTTP headers
+    META_KEYS = ["CONTENT_TYPE", "CONTENT_LENGTH", "PATH_INFO", "QUERY_STRING", "REQUEST_METHOD", "REMOTE_ADDR"]
+
+    plugin_name = models.CharField(max_length=30, help_text="Name of the plugin that the webhook was sent to")
+    community_slug = models.CharField(max_length=36, null=True, blank=True)
+    community_platform_id = models.CharField(max_length=100, null=True, blank=True)
+    meta = models.JSONField(default=dict, help_text="Request headers and metadata")
+    body = models.BinaryField()
+    status = models.CharField(
+        max_length=15,
+        choices=[(s.value, s.name) for s in InboundWebhookStatus],
+        default=InboundWebhookStatus.PENDING.value,
+    )
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.plugin_name} webhook for '{self.community_slug or 'all communities'}' ({self.pk}, {self.status})"
+
+    @classmethod
+    def from_request(cls, request, plugin_name, community_slug=None, community_platform_id=None):
+        meta = {
+            key: value
+            for (key, value) in request.META.items()
+            if isinstance(value, str) and (key.startswith("HTTP_") or key in cls.META_KEYS)
+        }
+        return cls.objects.create(
+            plugin_name=plugin_name,
+            community_slug=community_slug,
+            community_platform_id=community_platform_id,
+            meta=meta,
+            body=request.body,
+        )
+
+    def build_request(self):
+        """Rebuild the original request"""
+        from django.core.handlers.wsgi import WSGIRequest
+
+        body = bytes(self.body)
+        environ = {"SERVER_NAME": "localhost", "SERVER_PORT": "80", "wsgi.url_scheme": "http"}
+        environ.update(self.meta)
+        environ.update({"CONTENT_LENGTH": str(len(body)), "wsgi.input": io.BytesIO(body)})
+        return WSGIRequest(environ)
+
+    def retry(self):
+        """Re-queue a failed webhook"""
+        from metagov.core.tasks import process_inbound_webhook
+
+        self.status = InboundWebhookStatus.PENDING.value
+        self.error = ""
+        self.save()
+        transaction.on_commit(lambda: process_inbound_webhook.delay(self.pk))
+
+
+class ActionJobStatus(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class ActionJob(models.Model):
+    """Action that is performed asynchronously by a worker, started with ``Community.perform_action(run_async=True)``.
+
+    The job stores the action's result, or the error that the action endpoint would have responded with, so that the
+    Driver can poll for it. If ``callback_url`` is set, the job is posted to it once it has completed or failed.
+    Jobs that are rate limited are retried up to ``ACTION_JOB_MAX_ATTEMPTS`` times, and jobs that have been running
+    for longer than ``ACTION_JOB_TIMEOUT`` seconds fail. Finished jobs are deleted after ``ACTION_JOB_RETENTION_DAYS``
+    days."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    community = models.ForeignKey(
+        Community, models.CASCADE, related_name="action_jobs", help_text="Community that the action is performed in"
+    )
+    plugin_name = models.CharField(max_length=30)
+    action_id = models.CharField(max_length=100)
+    community_platform_id = models.CharField(max_length=100, null=True, blank=True)
+    parameters = models.JSONField(null=True, blank=True)
+    callback_url = models.CharField(
+        max_length=100, null=True, blank=True, help_text="Callback URL to notify when the job has finished"
+    )
+    status = models.CharField(
+        max_length=15,
+        choices=[(s.value, s.name) for s in ActionJobStatus],
+        default=ActionJobStatus.PENDING.value,
+    )
+    result = models.JSONField(null=True, blank=True, help_text="Result of the action, once it has completed")
+    error = models.JSONField(
+        null=True, blank=True, help_text="Status code and detail of the error, if the action failed"
+    )
+    attempts = models.PositiveIntegerField(default=0, help_text="Number of times that a worker has started the job")
+    next_attempt_at = models.DateTimeField(default=timezone.now, help_text="Earliest time of the next attempt")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.plugin_name}.{self.action_id} job for '{self.community.slug}' ({self.pk}, {self.status})"
+
+    @classmethod
+    def start(cls, community, plugin_name, action_id, parameters=None, community_platform_id=None, callback_url=None):
+        """Create a job, and queue it to be run once the current transaction commits"""
+        from metagov.core.tasks import run_action_job
+
+        job = cls.objects.create(
+            community=community,
+            plugin_name=plugin_name,
+            action_id=action_id,
+            parameters=parameters,
+            community_platform_id=community_platform_id,
+            callback_url=callback_url,
+        )
+        transaction.on_commit(lambda: run_action_job.delay(str(job.pk)))
+        return job
+
+    @property
+    def finished(self):
+        return self.status in [ActionJobStatus.COMPLETED.value, ActionJobStatus.FAILED.value]
+
+    def serialize(self):
+        return {
+            "id": str(self.pk),
+            "community": self.community.slug,
+            "plugin": self.plugin_name,
+            "action": self.action_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def finish(self, status, result=None, error=None) -> bool:
+        """Record the result or error of a running job, and post it to the callback URL. Returns False if the job
+        isn't running anymore, for example because it timed out."""
+        self.status, self.result, self.error, self.finished_at = status, result, error, timezone.now()
+        finished = ActionJob.objects.filter(pk=self.pk, status=ActionJobStatus.RUNNING.value).update(
+            status=status, result=result, error=error, finished_at=self.finished_at
+        )
+        if finished:
+            self.notify()
+        return bool(finished)
+
+    def notify(self):
+        """Post the job to its callback URL"""
+        if not self.callback_url:
+            return
+        logger.debug(f"Posting {self} to '{self.callback_url}'")
+        try:
+            resp = http_client.post(self.callback_url, json=self.serialize())
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error posting job to callback url: {e}")
+            return
+        if not resp.ok:
+            logger.error(f"Error posting job to callback url: {resp.status_code} {resp.reason}")
+
+
 class ProcessStatus(Enum):
     CREATED = "created"
     PENDING = "pending"
@@ -328,6 +856,14 @@ class GovernanceProcess(models.Model):
     )
     errors = models.JSONField(default=dict, blank=True, help_text="Errors to serialize and send back to driver")
     outcome = models.JSONField(default=dict, blank=True, help_text="Outcome to serialize and send back to driver")
+    next_run_at = models.DateTimeField(default=timezone.now, help_text="Time that the process is next due to be updated")
+    poll_interval = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Current time between updates in seconds, which grows while the process is unchanged"
+    )
+    lease_token = models.UUIDField(null=True, blank=True, editable=False, help_text="Worker run that holds the lease")
+    lease_expires_at = models.DateTimeField(
+        null=True, blank=True, editable=False, help_text="Time that the worker's lease on the process expires"
+    )
 
     # Optional: description of the governance process
     description = None
@@ -335,15 +871,27 @@ class GovernanceProcess(models.Model):
     input_schema = None
     # Optional: JSONSchema for outcome object
     outcome_schema = None
+    # Optional: how often to invoke ``update`` while the process is changing, in seconds. Defaults to the
+    # PROCESS_UPDATE_INTERVAL setting.
+    update_interval = None
 
     objects = GovernanceProcessManager()
 
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_run_at"])]
+
     def __str__(self):
         return f"{self.plugin.name}.{self.name} for '{self.plugin.community.slug}' ({self.pk}, {self.status})"
 
+    # Fields that the scheduler updates with its own queries. Saving the process doesn't write them, unless they're
+    # passed in ``update_fields``, so that a copy loaded before the scheduler claimed the row (for example, while
+    # handling a webhook) doesn't overwrite the lease or schedule.
+    scheduler_fields = ("next_run_at", "poll_interval", "lease_token", "lease_expires_at")
+
     def save(self, *args, **kwargs):
         if not self.pk:
             self.state = DataStore.objects.create()
+        _exclude_fields_from_save(self, kwargs, self.scheduler_fields)
         super(GovernanceProcess, self).save(*args, **kwargs)
 
     def start(self, parameters):
@@ -406,12 +954,146 @@ class GovernanceProcess(models.Model):
         - Call ``self.save()`` to persist changes."""
         pass
 
+    @classmethod
+    def get_webhook_routing_key(cls, request):
+        """(OPTIONAL) Return the routing key that an incoming webhook request pertains to, such as the ID of the message
+        or issue that it's about. The webhook is only passed to the process that registered the key with ``add_routing_key``.
+        Return ``None`` to pass the webhook to every pending process of this type."""
+        return None
+
+    @classmethod
+    def get_webhook_receivers(cls, request, **filters):
+        """Get the pending processes of this type that should receive an incoming webhook request"""
+        pending = cls.objects.filter(status=ProcessStatus.PENDING.value, **filters)
+        key = cls.get_webhook_routing_key(request)
+        if key is None:
+            return list(pending)
+        routed = pending.filter(pk__in=ProcessRoutingKey.objects.filter(key=str(key)).values("process_id"))
+        # processes that were started before they registered routing keys still receive every webhook
+        unrouted = pending.filter(routing_keys__isnull=True)
+        return list(routed) + list(unrouted)
+
+    def record_vote(self, voter, option) -> bool:
+        """Record ``voter``'s vote for ``option`` in the vote ledger, replacing any vote they cast before, and update
+        the tally in ``outcome["votes"]`` for the options that changed. Returns False if the voter had already voted
+        for ``option``."""
+        with transaction.atomic():
+            # lock the row so that concurrent votes update the tally one at a time, starting from the latest one
+            self.outcome = (
+                GovernanceProcess.objects.select_for_update().values_list("outcome", flat=True).get(pk=self.pk)
+            )
+            previous = self.votes.filter(voter=voter).values_list("option", flat=True).first()
+            if previous == option:
+                return False
+            if previous is None:
+                Vote.objects.create(process=self, voter=voter, option=option)
+            else:
+                self.votes.filter(voter=voter).update(option=option, cast_at=timezone.now())
+
+            tally = self.outcome.get("votes")
+            if isinstance(tally, dict):
+                previous_votes = tally.get(previous)
+                if previous_votes and voter in previous_votes["users"]:
+                    previous_votes["users"].remove(voter)
+                    previous_votes["count"] -= 1
+                option_votes = tally.get(option)
+                if option_votes is not None:
+                    option_votes["users"].append(voter)
+                    option_votes["count"] += 1
+                self.save(update_fields=["outcome", "poll_interval", "next_run_at"])
+        return True
+
+    def get_vote_tally(self, options):
+        """Count the votes in the vote ledger. Returns a dict of each option to its ``count`` and the ``users``
+        who voted for it."""
+        tally = {option: {"users": [], "count": 0} for option in options}
+        for option, voter in self.votes.order_by("cast_at", "pk").values_list("option", "voter"):
+            if option in tally:
+                tally[option]["users"].append(voter)
+                tally[option]["count"] += 1
+        return tally
+
+    def save_vote_tally(self, options):
+        """Rebuild ``outcome["votes"]`` from the vote ledger and save it. ``record_vote`` keeps the tally up to date,
+        so this is only needed to repair it."""
+        with transaction.atomic():
+            # lock the row so that concurrent votes save their tallies one at a time, and the last one is complete
+            GovernanceProcess.objects.select_for_update().values("pk").get(pk=self.pk)
+            self.outcome["votes"] = self.get_vote_tally(options)
+            self.save(update_fields=["outcome", "poll_interval", "next_run_at"])
+
+    def add_routing_key(self, key):
+        """Register a routing key for this process, so that webhooks that pertain to it are routed here.
+        Keys are unique per plugin instance."""
+        ProcessRoutingKey.objects.update_or_create(plugin=self.plugin, key=str(key), defaults={"process": self})
+
+    def get_closing_at(self):
+        """(OPTIONAL) Return the time that the process is due to close, if it's known. The process will be updated as soon
+        as it's due to close, no matter how long the current ``poll_interval`` is."""
+        return None
+
+    def get_next_run_at(self):
+        """(OPTIONAL) Return the time that ``update`` should next be invoked. By default, this is ``poll_interval`` seconds from now,
+        or the closing time from ``get_closing_at`` if that's sooner. Override this to choose the time in some other way."""
+        now = timezone.now()
+        next_run_at = now + timedelta(seconds=self.poll_interval or self.get_min_poll_interval())
+        closing_at = self.get_closing_at()
+        if closing_at:
+            next_run_at = max(min(next_run_at, closing_at), now)
+        return next_run_at
+
+    def get_min_poll_interval(self):
+        return self.update_interval or getattr(settings, "PROCESS_UPDATE_INTERVAL", 60 * 3)
+
+    def backoff_poll_interval(self, changed):
+        """Adjust ``poll_interval`` after an update. If the update changed the process, go back to polling every ``update_interval``
+        seconds. Otherwise, poll less often, up to the ``PROCESS_UPDATE_MAX_INTERVAL`` setting."""
+        min_interval = self.get_min_poll_interval()
+        if changed:
+            self.poll_interval = min_interval
+            return
+        factor = getattr(settings, "PROCESS_UPDATE_BACKOFF_FACTOR", 2)
+        max_interval = max(getattr(settings, "PROCESS_UPDATE_MAX_INTERVAL", 60 * 60), min_interval)
+        self.poll_interval = min(int((self.poll_interval or min_interval) * factor), max_interval)
+
     @property
     def proxy(self):
         # TODO: can we do this without hitting the database?
         cls = plugin_registry[self.plugin.name]._process_registry[self.name]
         return cls.objects.get(pk=self.pk)
 
+
+class Vote(models.Model):
+    """Vote cast in a GovernanceProcess. Each voter has one vote per process, which is replaced if they vote again."""
+
+    process = models.ForeignKey(GovernanceProcess, models.CASCADE, related_name="votes")
+    voter = models.CharField(max_length=150, help_text="Platform user ID of the voter")
+    option = models.CharField(max_length=200)
+    cast_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = [["process", "voter"]]
+
+    def __str__(self):
+        return f"{self.voter} voted {self.option} ({self.process_id})"
+
+
+class ProcessRoutingKey(models.Model):
+    """Key that identifies the external object that a GovernanceProcess is about, such as a Slack message timestamp
+    or a GitHub issue. Used to route incoming webhooks to the process that they pertain to."""
+
+    plugin = models.ForeignKey(Plugin, models.CASCADE)
+    process = models.ForeignKey(GovernanceProcess, models.CASCADE, related_name="routing_keys")
+    key = models.CharField(max_length=255)
+
+    class Meta:
+        unique_together = [["plugin", "key"]]
+        indexes = [models.Index(fields=["key"])]
+
+    def __str__(self):
+        return f"{self.key} ({self.process_id})"
+
+
 class MetagovID(models.Model):
     """Metagov ID table links all public_ids to a single internal representation of a user. When data
     associated with public_ids conflicts, primary_ID is used.
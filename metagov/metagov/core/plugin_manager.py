@@ -1,4 +1,5 @@
 from metagov.core.utils import SaferDraft7Validator
+from metagov.core.validators import get_validator
 
 plugin_registry = {}
 
@@ -55,18 +56,23 @@ class VotingStandard:
 
 class Registry:
     class EventProducerMeta:
-        def __init__(self, function_name, event_schemas):
+        def __init__(self, function_name, event_schemas, interval=None):
             self.function_name = function_name
             self.event_schemas = event_schemas
+            self.interval = interval
 
     class ActionFunctionMeta:
-        def __init__(self, slug, function_name, description, input_schema, output_schema, is_public):
+        def __init__(self, slug, function_name, description, input_schema, output_schema, is_public, allow_async=False):
             self.slug = slug
             self.function_name = function_name
             self.description = description
             self.input_schema = input_schema
             self.output_schema = output_schema
             self.is_public = is_public
+            self.allow_async = allow_async
+            # compiled once, and reused for every call
+            self.input_validator = get_validator(input_schema) if input_schema else None
+            self.output_validator = get_validator(output_schema) if output_schema else None
 
     @staticmethod
     def _validate_proxy_model(cls):
@@ -81,10 +87,12 @@ class Registry:
         Registry._validate_proxy_model(cls)
         if cls.config_schema:
             SaferDraft7Validator.check_schema(cls.config_schema)
+            get_validator(cls.config_schema, fill_defaults=True)
 
         cls._action_registry = {}
         cls._process_registry = {}
         cls._task_function = None
+        cls._task_interval = None
         cls._webhook_receiver_function = None
         cls._event_schemas = []
 
@@ -99,6 +107,7 @@ class Registry:
                 cls._action_registry[meta.slug] = method._meta
             elif hasattr(method, "_meta_task"):
                 cls._task_function = methodname
+                cls._task_interval = method._meta_task.interval
                 cls._event_schemas.extend(method._meta_task.event_schemas)
             elif hasattr(method, "_meta_webhook_receiver"):
                 cls._webhook_receiver_function = methodname
@@ -119,6 +128,7 @@ class Registry:
 
         if cls.input_schema:
             SaferDraft7Validator.check_schema(cls.input_schema)
+            get_validator(cls.input_schema, fill_defaults=True)
 
         plugin_cls = plugin_registry[cls.plugin_name]
         plugin_cls._process_registry[cls.name] = cls
@@ -134,13 +144,17 @@ class Registry:
         return cls
 
     @staticmethod
-    def event_producer_task(event_schemas=[]):
-        """Use this decorator on a method of a registered :class:`~metagov.core.models.Plugin` to register a task that sends Events to the Driver."""
+    def event_producer_task(event_schemas=[], interval=None):
+        """Use this decorator on a method of a registered :class:`~metagov.core.models.Plugin` to register a task that sends Events to the Driver.
+
+        :param int interval: how often to invoke the task, in seconds. Defaults to the ``PLUGIN_TASK_INTERVAL`` setting.
+        """
 
         def wrapper(function):
             function._meta_task = Registry.EventProducerMeta(
                 function_name=function.__name__,
                 event_schemas=event_schemas,
+                interval=interval,
             )
             return function
 
@@ -160,7 +174,7 @@ class Registry:
         return wrapper
 
     @staticmethod
-    def action(slug, description, input_schema=None, output_schema=None, is_public=False):
+    def action(slug, description, input_schema=None, output_schema=None, is_public=False, allow_async=False):
         """Use this decorator on a method of a registered :class:`~metagov.core.models.Plugin` to register an action endpoint.
 
         Metagov will expose the decorated function at endpoint ``/action/<plugin-name>.<slug>``
@@ -169,6 +183,8 @@ class Registry:
         :param str description: action description
         :param obj input_schema: jsonschema defining the input parameter object, optional
         :param obj output_schema: jsonschema defining the response object, optional
+        :param bool allow_async: whether the action can be performed asynchronously, as an
+            :class:`~metagov.core.models.ActionJob`. Set this for slow actions, so that callers don't wait for them.
         """
 
         def wrapper(function):
@@ -184,6 +200,7 @@ class Registry:
                 input_schema=input_schema,
                 output_schema=output_schema,
                 is_public=is_public,
+                allow_async=allow_async,
             )
             return function
 
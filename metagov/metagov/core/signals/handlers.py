@@ -1,7 +1,8 @@
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from metagov.core.models import GovernanceProcess, ProcessStatus
-import requests
+from metagov.core import lookups
+from metagov.core.http import http_client
+from metagov.core.models import Community, GovernanceProcess, Plugin, ProcessStatus
 import logging
 
 from metagov.core.signals import governance_process_updated, platform_event_created
@@ -9,6 +10,18 @@ from metagov.core.signals import governance_process_updated, platform_event_crea
 logger = logging.getLogger(__name__)
 
 
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_lookups(sender, instance, **kwargs):
+    """Invalidate the cached lookups of communities and plugins when they're changed or deleted"""
+    # check the instance rather than `sender`, because plugins are proxy models
+    if isinstance(instance, Community):
+        for slug in {instance.slug, getattr(instance, "_loaded_slug", None)} - {None}:
+            lookups.lookup_cache.invalidate(lookups.community_version_key(slug))
+    elif isinstance(instance, Plugin):
+        lookups.lookup_cache.invalidate(lookups.plugins_version_key(instance.community_id))
+
+
 @receiver(pre_save)
 def pre_save_governance_process(sender, instance, **kwargs):
     """
@@ -27,6 +40,15 @@ def pre_save_governance_process(sender, instance, **kwargs):
     except sender.DoesNotExist:
         pass  # process is new
     else:
+        if not obj.status == instance.status or not obj.outcome == instance.outcome:
+            # the process is active (for example, a webhook just changed it), so go back to polling quickly
+            instance.backoff_poll_interval(changed=True)
+            instance.next_run_at = min(obj.next_run_at, instance.get_next_run_at())
+            # saving the process doesn't write the schedule, so store it here
+            sender.objects.filter(pk=instance.pk).update(
+                poll_interval=instance.poll_interval, next_run_at=instance.next_run_at
+            )
+
         if not obj.status == instance.status and instance.status == ProcessStatus.COMPLETED.value:
             logger.debug(f"Status changed: {obj.status}->{instance.status}")
             notify_process_updated(instance)
@@ -54,6 +76,6 @@ def notify_process_updated(process: GovernanceProcess):
 
         serializer = GovernanceProcessSerializer(process)
         logger.debug(serializer.data)
-        resp = requests.post(process.callback_url, json=serializer.data)
+        resp = http_client.post(process.callback_url, json=serializer.data)
         if not resp.ok:
             logger.error(f"Error posting outcome to callback url: {resp.status_code} {resp.reason}")
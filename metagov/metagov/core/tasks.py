@@ -1,38 +1,476 @@
+import copy
 import logging
+import math
+import signal
+import threading
 import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
 
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+from metagov.core.http import RateLimitExceeded
 from metagov.core.models import ProcessStatus
 
 logger = logging.getLogger(__name__)
 
 
+class InvocationTimeout(Exception):
+    """Raised when a plugin task or process update runs past its PLUGIN_TASK_TIME_LIMIT"""
+
+# How long to wait before trying again when a plugin type's concurrency limit has been reached, in seconds
+PLUGIN_TASK_RETRY_DELAY = 10
+# Time that a plugin task gets to clean up after its soft time limit, before the worker is killed
+PLUGIN_TASK_HARD_TIME_LIMIT_GRACE = 30
+
+# Upper bound on how long a worker can hold a community's delivery lock, in case it dies without releasing it
+DRIVER_EVENT_LOCK_TIMEOUT = 60 * 5
+
+
 @shared_task
 def execute_plugin_tasks():
+    """Find the plugin tasks and governance process updates that are due to run, and hand them out to workers
+    as ``run_plugin_tasks`` subtasks, grouped by plugin instance.
+
+    Due rows are leased to this run before they're handed out, so overlapping runs (or several beat instances)
+    never hand out the same plugin task or process twice."""
+    from django.conf import settings
+    from metagov.core.models import GovernanceProcess
     from metagov.core.plugin_manager import plugin_registry
 
-    # invoke all the plugin tasks (listeners)
+    now = timezone.now()
+    token = uuid.uuid4()
+    lease_expires_at = now + timedelta(seconds=getattr(settings, "PLUGIN_TASK_LEASE_TIMEOUT", 60 * 10))
+    chunk_size = getattr(settings, "PLUGIN_TASK_CHUNK_SIZE", 20)
     for (plugin_name, cls) in plugin_registry.items():
+        # claim plugin instances whose task (listener) is due
+        due_plugin_ids = []
         if cls._task_function:
-            active_plugins = cls.objects.all()
-            if active_plugins.count() > 0:
-                logger.debug(f"Calling task function for {active_plugins.count()} instances of {plugin_name}")
-            for plugin in active_plugins:
-                task_function = getattr(plugin, cls._task_function)
-                task_function()
-
-        # invoke all the governance process pending task checkers
+            due_plugins = cls.objects.filter(Q(next_run_at__isnull=True) | Q(next_run_at__lte=now))
+            # schedule the next run now, so that a failing task isn't retried on every tick
+            interval = cls._task_interval or getattr(settings, "PLUGIN_TASK_INTERVAL", 60 * 3)
+            _claim(due_plugins, token, now, lease_expires_at, next_run_at=now + timedelta(seconds=interval))
+            due_plugin_ids = list(cls.objects.filter(lease_token=token).values_list("pk", flat=True))
+
+        # claim pending governance processes that are due for an update
+        due_process_ids = {}
         for (process_name, process_cls) in cls._process_registry.items():
-            active_processes = process_cls.objects.filter(status=ProcessStatus.PENDING.value)
-            if active_processes.count() > 0:
-                logger.debug(
-                    f"Calling update function for {active_processes.count()} pending {process_name} processes"
+            due_processes = process_cls.objects.filter(status=ProcessStatus.PENDING.value, next_run_at__lte=now)
+            # the worker sets the actual next run time
+            interval = process_cls.update_interval or getattr(settings, "PROCESS_UPDATE_INTERVAL", 60 * 3)
+            _claim(due_processes, token, now, lease_expires_at, next_run_at=now + timedelta(seconds=interval))
+        claimed = GovernanceProcess.objects.filter(plugin__name=plugin_name, lease_token=token).order_by("pk")
+        for (process_id, plugin_id) in claimed.values_list("pk", "plugin_id"):
+            due_process_ids.setdefault(plugin_id, []).append(process_id)
+
+        for plugin_id in sorted(set(due_plugin_ids) | set(due_process_ids)):
+            process_ids = due_process_ids.get(plugin_id, [])
+            chunks = [process_ids[i : i + chunk_size] for i in range(0, len(process_ids), chunk_size)] or [[]]
+            for (i, chunk) in enumerate(chunks):
+                run_task = i == 0 and plugin_id in due_plugin_ids
+                soft_limit = _plugin_task_time_limit(len(chunk) + run_task)
+                run_plugin_tasks.apply_async(
+                    args=(plugin_name, plugin_id, chunk, run_task, str(token)),
+                    soft_time_limit=soft_limit,
+                    time_limit=soft_limit + PLUGIN_TASK_HARD_TIME_LIMIT_GRACE,
                 )
-            for process in active_processes:
+
+
+@shared_task(bind=True)
+def run_plugin_tasks(self, plugin_name, plugin_id, process_ids, run_task, lease_token):
+    """Invoke the plugin task and update the given governance processes for one plugin instance. Waits for a free
+    slot if the plugin's concurrency limit has been reached. Plugin tasks and processes whose lease has been
+    claimed by another run in the meantime are skipped."""
+    from metagov.core.plugin_manager import plugin_registry
+
+    cls = plugin_registry[plugin_name]
+    hard_limit = _plugin_task_time_limit(len(process_ids) + run_task) + PLUGIN_TASK_HARD_TIME_LIMIT_GRACE
+    slot = _acquire_plugin_task_slot(plugin_name, timeout=hard_limit)
+    if slot is None:
+        logger.debug(f"Concurrency limit reached for {plugin_name}, retrying in {PLUGIN_TASK_RETRY_DELAY}s")
+        raise self.retry(countdown=PLUGIN_TASK_RETRY_DELAY, max_retries=None)
+
+    try:
+        # invoke the plugin task (listener)
+        plugin = cls.objects.filter(pk=plugin_id, lease_token=lease_token).first() if run_task else None
+        if plugin and _renew_lease(plugin, lease_token, hard_limit):
+            logger.debug(f"Calling task function for {plugin}")
+            try:
+                with _invocation_deadline():
+                    getattr(plugin, cls._task_function)()
+            except SoftTimeLimitExceeded:
+                raise
+            except InvocationTimeout:
+                logger.error(f"Timed out running task for {plugin}")
+            except Exception as e:
+                logger.error(f"Error running task for {plugin}!")
+                logger.error(traceback.format_exc())
+            finally:
+                _release_lease(plugin, lease_token)
+
+        # invoke the governance process pending task checkers
+        for (process_name, process_cls) in cls._process_registry.items():
+            pending_processes = process_cls.objects.filter(
+                pk__in=process_ids, status=ProcessStatus.PENDING.value, lease_token=lease_token
+            )
+            for process in pending_processes:
+                if not _renew_lease(process, lease_token, hard_limit):
+                    continue
+                logger.debug(f"Calling update function for {process}")
+                # copy the outcome, since `update` may change it in place
+                before = (process.status, copy.deepcopy(process.outcome))
+                next_run_at = None
                 # Invoke `update`. It may lead to the outcome or status being changed,
                 # which will send a callback notification to the Driver from the `pre_save signal`
                 try:
-                    process.update()
+                    with _invocation_deadline():
+                        process.update()
+                except SoftTimeLimitExceeded:
+                    raise
+                except InvocationTimeout:
+                    logger.error(f"Timed out updating {process}")
+                except RateLimitExceeded as e:
+                    # try again once the platform's rate limit has been reset
+                    logger.warning(f"Rate limited while updating {process}, retrying in {e.retry_after:.0f}s")
+                    next_run_at = timezone.now() + timedelta(seconds=e.retry_after)
                 except Exception as e:
                     logger.error("Error updating process!")
                     logger.error(traceback.format_exc())
+                finally:
+                    # poll less often while the process isn't changing
+                    process.backoff_poll_interval(changed=(process.status, process.outcome) != before)
+                    scheduled = process.get_next_run_at()
+                    next_run_at = max(next_run_at, scheduled) if next_run_at else scheduled
+                    _release_lease(process, lease_token, poll_interval=process.poll_interval, next_run_at=next_run_at)
+    except SoftTimeLimitExceeded:
+        # the remaining processes are picked up again when their lease expires
+        logger.error(f"Timed out running tasks for {plugin_name} instance {plugin_id}")
+    finally:
+        cache.delete(slot)
+
+
+def _claim(queryset, token, now, lease_expires_at, **updates):
+    """Lease the rows in the queryset that aren't already leased to another run. Claiming is a single
+    UPDATE statement on the model's table, so concurrent runs can't claim the same row."""
+    ids = list(queryset.values_list("pk", flat=True))
+    unleased = Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now)
+    queryset.model._meta.concrete_model.objects.filter(unleased, pk__in=ids).update(
+        lease_token=token, lease_expires_at=lease_expires_at, **updates
+    )
+
+
+def _renew_lease(instance, token, seconds, **updates):
+    """Extend a lease that is still held by this run. Returns False if another run has claimed it since."""
+    lease_expires_at = timezone.now() + timedelta(seconds=seconds)
+    model = instance._meta.concrete_model
+    updates["lease_expires_at"] = lease_expires_at
+    if not model.objects.filter(pk=instance.pk, lease_token=token).update(**updates):
+        logger.debug(f"Lease on {instance} was claimed by another run, skipping")
+        return False
+    for (field, value) in updates.items():
+        setattr(instance, field, value)
+    return True
+
+
+def _release_lease(instance, token, **updates):
+    model = instance._meta.concrete_model
+    updates.update(lease_token=None, lease_expires_at=None)
+    model.objects.filter(pk=instance.pk, lease_token=token).update(**updates)
+    for (field, value) in updates.items():
+        setattr(instance, field, value)
+
+
+def _plugin_task_time_limit(invocations):
+    from django.conf import settings
+
+    return getattr(settings, "PLUGIN_TASK_TIME_LIMIT", 60) * max(invocations, 1)
+
+
+@contextmanager
+def _invocation_deadline():
+    """Interrupt the plugin task or process update with ``InvocationTimeout`` once it has run for
+    PLUGIN_TASK_TIME_LIMIT seconds, so that one that hangs doesn't hold up the rest of its chunk. The deadline is set
+    with a timer signal, so it only applies in the main thread of the worker process (as in the prefork pool). The
+    time limit of the whole subtask still applies otherwise."""
+    from django.conf import settings
+
+    if threading.current_thread() is not threading.main_thread() or not hasattr(signal, "setitimer"):
+        yield
+        return
+
+    def timeout(signum, frame):
+        raise InvocationTimeout()
+
+    previous = signal.signal(signal.SIGALRM, timeout)
+    signal.setitimer(signal.ITIMER_REAL, getattr(settings, "PLUGIN_TASK_TIME_LIMIT", 60))
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _acquire_plugin_task_slot(plugin_name, timeout):
+    """Claim one of the plugin type's concurrency slots. Returns the slot's cache key, or None if they're all taken."""
+    from django.conf import settings
+
+    concurrency = getattr(settings, "PLUGIN_TASK_CONCURRENCY", {}).get(
+        plugin_name, getattr(settings, "PLUGIN_TASK_DEFAULT_CONCURRENCY", 4)
+    )
+    for i in range(concurrency):
+        key = f"metagov:plugin-task-slot:{plugin_name}:{i}"
+        if cache.add(key, True, timeout=timeout):
+            return key
+    return None
+
+
+@shared_task
+def deliver_driver_events():
+    """Deliver pending events from the outbox to the Driver. Communities are delivered independently of
+    each other, so that a failing or busy community doesn't hold up the rest."""
+    from django.conf import settings
+    from metagov.core.models import DriverEvent
+
+    if not getattr(settings, "DRIVER_EVENT_RECEIVER_URL", None):
+        return
+
+    community_ids = DriverEvent.pending().order_by().values_list("community_id", flat=True).distinct()
+    for community_id in community_ids:
+        deliver_community_events.delay(community_id)
+
+
+@shared_task
+def deliver_community_events(community_id):
+    """Deliver pending events for one community, in sequence order. Only one worker delivers a given
+    community's events at a time."""
+    from metagov.core.models import DriverEvent
+
+    lock_key = f"metagov:driver-event-delivery:{community_id}"
+    token = uuid.uuid4().hex
+    if not cache.add(lock_key, token, timeout=DRIVER_EVENT_LOCK_TIMEOUT):
+        logger.debug(f"Events for community {community_id} are already being delivered")
+        return
+    try:
+        more = _deliver_community_events(community_id, lambda: _renew_delivery_lock(lock_key, token))
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+    if more:
+        # the run stopped at DRIVER_EVENT_DELIVERY_LIMIT, so deliver the rest once the lock has been released
+        DriverEvent.schedule_delivery()
+
+
+def _renew_delivery_lock(lock_key, token):
+    """Extend the delivery lock before each post. Returns False if it expired and another worker has taken it."""
+    if cache.get(lock_key) != token:
+        return False
+    cache.touch(lock_key, DRIVER_EVENT_LOCK_TIMEOUT)
+    return True
+
+
+def _deliver_community_events(community_id, renew_lock):
+    """Deliver up to DRIVER_EVENT_DELIVERY_LIMIT events. Returns True if they were all delivered, and there may be
+    more waiting."""
+    from django.conf import settings
+    from metagov.core.models import DriverEvent
+
+    limit = getattr(settings, "DRIVER_EVENT_DELIVERY_LIMIT", 500)
+    events = DriverEvent.deliverable(community_id, limit)
+    if not events:
+        return False
+    logger.debug(f"Delivering {len(events)} pending events for community {community_id} to the Driver")
+
+    if not getattr(settings, "DRIVER_EVENT_BATCH_MODE", False):
+        # Stop at the first failure, the rest are sent after it has been retried
+        for event in events:
+            if not renew_lock():
+                logger.warning(f"Lost the delivery lock for community {community_id}, stopping")
+                return False
+            if not event.deliver():
+                return False
+        return len(events) == limit
+
+    # Batch mode: flush once there are enough events to fill a batch, or the oldest event has waited for
+    # the full flush window. Otherwise check again when the window closes.
+    batch_size = getattr(settings, "DRIVER_EVENT_BATCH_SIZE", 100)
+    window = getattr(settings, "DRIVER_EVENT_BATCH_WINDOW", 0.25)
+    wait = window - (timezone.now() - min(event.created_at for event in events)).total_seconds()
+    if wait > 0 and len(events) < batch_size:
+        # some cache backends truncate the timeout to whole seconds, and would never expire a key with a timeout of 0
+        if cache.add(f"metagov:driver-event-flush-scheduled:{community_id}", True, timeout=max(1, math.ceil(wait))):
+            DriverEvent.schedule_delivery(countdown=wait)
+        return False
+
+    for i in range(0, len(events), batch_size):
+        if not renew_lock():
+            logger.warning(f"Lost the delivery lock for community {community_id}, stopping")
+            return False
+        batch = events[i : i + batch_size]
+        if DriverEvent.deliver_batch(batch) < len(batch):
+            return False
+    return len(events) == limit
+
+
+@shared_task
+def prune_driver_events():
+    """Delete events that are older than the retention period. Without a retention period, events are only kept
+    until they've been delivered, so delivered events are deleted once they're past a short grace period."""
+    from django.conf import settings
+    from metagov.core.models import DriverEvent, DriverEventStatus
+
+    now = timezone.now()
+    retention_days = getattr(settings, "DRIVER_EVENT_RETENTION_DAYS", 0)
+    if retention_days:
+        expired = DriverEvent.objects.filter(created_at__lt=now - timedelta(days=retention_days))
+        if getattr(settings, "DRIVER_EVENT_RECEIVER_URL", None):
+            # don't drop events that are still waiting to be pushed to the Driver
+            expired = expired.exclude(status=DriverEventStatus.PENDING.value)
+        description = f"older than {retention_days} days"
+    else:
+        grace = getattr(settings, "DRIVER_EVENT_DELIVERED_GRACE", 60 * 60)
+        expired = DriverEvent.objects.filter(
+            status=DriverEventStatus.DELIVERED.value, delivered_at__lt=now - timedelta(seconds=grace)
+        )
+        description = "that were delivered"
+    count, _ = expired.delete()
+    if count:
+        logger.info(f"Deleted {count} events {description}")
+
+
+@shared_task
+def process_inbound_webhook(webhook_id):
+    """Process a webhook request that was queued by ``MetagovRequestHandler.enqueue_webhook``"""
+    from metagov.core.app import MetagovApp
+    from metagov.core.handlers import MetagovRequestHandler
+    from metagov.core.models import InboundWebhook, InboundWebhookStatus
+
+    # claim the webhook, in case it has been queued more than once
+    claimed = InboundWebhook.objects.filter(pk=webhook_id, status=InboundWebhookStatus.PENDING.value).update(
+        status=InboundWebhookStatus.PROCESSING.value
+    )
+    if not claimed:
+        return
+    webhook = InboundWebhook.objects.get(pk=webhook_id)
+
+    try:
+        MetagovRequestHandler(app=MetagovApp()).process_webhook(
+            request=webhook.build_request(),
+            plugin_name=webhook.plugin_name,
+            community_slug=webhook.community_slug,
+            community_platform_id=webhook.community_platform_id,
+        )
+    except Exception as e:
+        logger.error(f"Error processing {webhook}: {e}")
+        webhook.status = InboundWebhookStatus.FAILED.value
+        webhook.error = traceback.format_exc()
+        webhook.save()
+        return
+    webhook.delete()
+
+
+@shared_task
+def process_inbound_webhooks():
+    """Queue webhooks that are still waiting to be processed, for example because queueing them failed"""
+    from metagov.core.models import InboundWebhook, InboundWebhookStatus
+
+    stale = InboundWebhook.objects.filter(
+        status=InboundWebhookStatus.PENDING.value, created_at__lt=timezone.now() - timedelta(minutes=1)
+    )
+    for webhook_id in stale.values_list("pk", flat=True):
+        process_inbound_webhook.delay(webhook_id)
+
+
+@shared_task
+def run_action_job(job_id):
+    """Perform an action that was queued by ``ActionJob.start``, store its result, and notify the callback URL"""
+    from django.conf import settings
+    from django.db.models import F
+    from metagov.core.models import ActionJob, ActionJobStatus
+
+    # claim the job, in case it has been queued more than once
+    claimed = ActionJob.objects.filter(pk=job_id, status=ActionJobStatus.PENDING.value).update(
+        status=ActionJobStatus.RUNNING.value, started_at=timezone.now(), attempts=F("attempts") + 1
+    )
+    if not claimed:
+        return
+    job = ActionJob.objects.select_related("community").get(pk=job_id)
+
+    try:
+        result = job.community.perform_action(
+            plugin_name=job.plugin_name,
+            action_id=job.action_id,
+            parameters=job.parameters,
+            community_platform_id=job.community_platform_id,
+        )
+        job.finish(ActionJobStatus.COMPLETED.value, result=result)
+    except RateLimitExceeded as e:
+        if job.attempts >= getattr(settings, "ACTION_JOB_MAX_ATTEMPTS", 5):
+            job.finish(ActionJobStatus.FAILED.value, error=_action_job_error(job, e))
+            return
+        logger.info(f"Rate limited while running {job}, retrying in {e.wait}s")
+        ActionJob.objects.filter(pk=job_id, status=ActionJobStatus.RUNNING.value).update(
+            status=ActionJobStatus.PENDING.value, next_attempt_at=timezone.now() + timedelta(seconds=e.wait)
+        )
+        run_action_job.apply_async(args=(job_id,), countdown=e.wait)
+    except Exception as e:
+        job.finish(ActionJobStatus.FAILED.value, error=_action_job_error(job, e))
+
+
+@shared_task
+def sweep_action_jobs():
+    """Queue action jobs that are still waiting to be run, for example because queueing them failed, and fail the
+    jobs that have been running for longer than ``ACTION_JOB_TIMEOUT`` seconds, for example because their worker died"""
+    from django.conf import settings
+    from metagov.core.models import ActionJob, ActionJobStatus
+
+    now = timezone.now()
+    stale = ActionJob.objects.filter(
+        status=ActionJobStatus.PENDING.value, next_attempt_at__lt=now - timedelta(minutes=1)
+    )
+    for job_id in stale.values_list("pk", flat=True):
+        run_action_job.delay(str(job_id))
+
+    timeout = getattr(settings, "ACTION_JOB_TIMEOUT", 60 * 10)
+    timed_out = ActionJob.objects.select_related("community").filter(
+        status=ActionJobStatus.RUNNING.value, started_at__lt=now - timedelta(seconds=timeout)
+    )
+    for job in timed_out:
+        logger.warning(f"{job} has been running for more than {timeout}s, marking it as failed")
+        job.finish(ActionJobStatus.FAILED.value, error={"status": 504, "detail": "The action timed out."})
+
+
+def _action_job_error(job, error):
+    """Status code and detail of the error that the action endpoint would have responded with"""
+    from jsonschema.exceptions import ValidationError
+    from metagov.core.models import Plugin
+    from rest_framework.exceptions import APIException
+
+    if isinstance(error, APIException):
+        detail = error.detail[0] if isinstance(error.detail, list) else error.detail
+        return {"status": error.status_code, "detail": str(detail)}
+    if isinstance(error, ValidationError):
+        return {"status": 400, "detail": error.message}
+    if isinstance(error, Plugin.DoesNotExist):
+        return {"status": 400, "detail": f"Plugin '{job.plugin_name}' not enabled for community '{job.community}'"}
+    logger.error(f"Error running {job}: {traceback.format_exc()}")
+    return {"status": 500, "detail": "A server error occurred."}
+
+
+@shared_task
+def prune_action_jobs():
+    """Delete finished action jobs that are older than the retention period"""
+    from django.conf import settings
+    from metagov.core.models import ActionJob, ActionJobStatus
+
+    retention_days = getattr(settings, "ACTION_JOB_RETENTION_DAYS", 7)
+    expired = ActionJob.objects.filter(
+        status__in=[ActionJobStatus.COMPLETED.value, ActionJobStatus.FAILED.value],
+        finished_at__lt=timezone.now() - timedelta(days=retention_days),
+    )
+    count, _ = expired.delete()
+    if count:
+        logger.info(f"Deleted {count} action jobs older than {retention_days} days")
@@ -79,11 +79,11 @@ def get_process_schemas(cls):
 
 
 def validate_and_fill_defaults(values, schema):
-    from metagov.core.validators import DefaultValidatingDraft7Validator
+    from metagov.core.validators import get_validator
 
     # this mutates `plugin_config` by filling in default values from schema
     # raises jsonschema.exceptions.ValidationError
-    DefaultValidatingDraft7Validator(schema).validate(values)
+    get_validator(schema, fill_defaults=True).validate(values)
 
 
 def create_or_update_plugin(plugin_name, plugin_config, community):
@@ -1,4 +1,11 @@
+from django.conf import settings
 from jsonschema import Draft7Validator, validators
+from jsonschema.exceptions import ValidationError, best_match
+
+try:
+    import fastjsonschema
+except ImportError:  # fastjsonschema is optional, and only makes validation faster
+    fastjsonschema = None
 
 
 def extend_with_default(validator_class):
@@ -27,3 +34,48 @@ def extend_with_default(validator_class):
 
 
 DefaultValidatingDraft7Validator = extend_with_default(Draft7Validator)
+
+
+class SchemaValidator:
+    """Validator for a jsonschema, compiled once so that it can be reused for every validation.
+
+    If ``fill_defaults`` is set, validation fills in default values from the schema. Raises
+    ``jsonschema.exceptions.ValidationError`` if the instance is invalid. If the ``SCHEMA_VALIDATION_BACKEND`` setting
+    is ``"fastjsonschema"`` and fastjsonschema is installed, the schema is compiled with it instead of jsonschema."""
+
+    def __init__(self, schema, fill_defaults=False):
+        self.schema = schema
+        self._validator = None
+        self._compiled = None
+        if getattr(settings, "SCHEMA_VALIDATION_BACKEND", "jsonschema") == "fastjsonschema" and fastjsonschema:
+            try:
+                self._compiled = fastjsonschema.compile(schema, use_default=fill_defaults)
+            except fastjsonschema.JsonSchemaDefinitionException:
+                pass
+        if self._compiled is None:
+            validator_class = DefaultValidatingDraft7Validator if fill_defaults else Draft7Validator
+            self._validator = validator_class(schema)
+
+    def validate(self, instance):
+        if self._compiled is not None:
+            try:
+                self._compiled(instance)
+            except fastjsonschema.JsonSchemaValueException as e:
+                raise ValidationError(e.message)
+            return
+        error = best_match(self._validator.iter_errors(instance))
+        if error is not None:
+            raise error
+
+
+_validators = {}
+
+
+def get_validator(schema, fill_defaults=False) -> SchemaValidator:
+    """Get the compiled validator for a schema, compiling it the first time. Schemas shouldn't be changed once
+    they've been used."""
+    key = (id(schema), fill_defaults)
+    cached = _validators.get(key)
+    if cached is None or cached[0] is not schema:
+        cached = _validators[key] = (schema, SchemaValidator(schema, fill_defaults=fill_defaults))
+    return cached[1]
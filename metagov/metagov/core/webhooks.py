@@ -0,0 +1,71 @@
+import json
+
+from django.utils.functional import cached_property
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, and only makes decoding faster
+    orjson = None
+
+# headers that platforms use to describe a webhook delivery
+DELIVERY_HEADERS = [
+    "X-GitHub-Event",
+    "X-GitHub-Delivery",
+    "X-Discourse-Event",
+    "X-Discourse-Event-Type",
+    "X-Discourse-Event-Id",
+    "X-Discourse-Instance",
+    "X-Slack-Retry-Num",
+    "X-Slack-Retry-Reason",
+]
+
+
+def json_loads(data):
+    """Decode a JSON string or bytes, using orjson if it's installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class WebhookEnvelope:
+    """An incoming webhook request, with its payload parsed once and shared by every plugin and process that receives it.
+
+    The envelope can be used anywhere that a request is expected: attributes that aren't defined here, such as ``body``,
+    ``headers`` and ``POST``, are looked up on the wrapped request."""
+
+    def __init__(self, request):
+        self.request = request
+        # set once the platform's signature on the request has been checked
+        self.signature_verified = False
+        # the platform's unique ID for the delivery, if it has one
+        self.delivery_id = None
+
+    @classmethod
+    def wrap(cls, request):
+        return request if isinstance(request, cls) else cls(request)
+
+    def __getattr__(self, name):
+        return getattr(self.request, name)
+
+    @property
+    def is_form(self) -> bool:
+        content_type = self.request.META.get("CONTENT_TYPE", "")
+        return content_type.startswith(("application/x-www-form-urlencoded", "multipart/form-data"))
+
+    @cached_property
+    def json(self):
+        """Request body decoded as JSON"""
+        return json_loads(self.request.body)
+
+    @cached_property
+    def payload(self):
+        """Request payload. For form-encoded requests with a ``payload`` field, such as Slack interactions and GitHub
+        webhooks that aren't sent as JSON, this is the decoded field. Otherwise it's the decoded body."""
+        if self.is_form and "payload" in self.request.POST:
+            return json_loads(self.request.POST["payload"])
+        return self.json
+
+    @cached_property
+    def delivery_headers(self) -> dict:
+        """Headers that describe the delivery, such as the event type and retry count"""
+        return {header: self.request.headers[header] for header in DELIVERY_HEADERS if header in self.request.headers}
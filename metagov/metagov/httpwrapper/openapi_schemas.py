@@ -10,6 +10,7 @@ class Tags(object):
     ACTION = "Actions"
     COMMUNITY = "Community Configuration"
     PLUGIN_AUTH = "Plugin Auth"
+    EVENTS = "Platform Events"
 
 def json_schema_to_openapi_object(json_schema):
     schema = convert(json_schema)
@@ -150,3 +151,174 @@ plugin_authorize = {
         ),
     ],
 }
+
+event_stream = {
+    "method": "get",
+    "operation_id": "Stream platform events",
+    "operation_description": """Read platform events from the retained event log, in the order they were created. Requires `DRIVER_EVENT_RETENTION_DAYS` to be set.
+
+Responds with JSON by default. Pass a `cursor` to get the events that came after it, and a `timeout` to wait for new events if there aren't any yet (long polling). The response includes the cursor to use for the next request.
+
+If `community` is set, the cursor is the event's `sequence` number in the community. Otherwise it's the event's `id`, and events are only returned once they're `DRIVER_EVENT_STREAM_LAG` seconds old, so that events that are committed out of order aren't skipped. An event that takes longer than that to commit can still be skipped; filter by `community` to read events in commit order.
+
+Requests with `Accept: text/event-stream` get a stream of server-sent events instead. Each message's `id` is the event's cursor, so clients reconnecting with the `Last-Event-ID` header resume where they left off. The stream is closed after `timeout` seconds.""",
+    "tags": [Tags.EVENTS],
+    "manual_parameters": [
+        openapi.Parameter(
+            "cursor",
+            openapi.IN_QUERY,
+            required=False,
+            type=openapi.TYPE_INTEGER,
+            description="Only return events that came after this cursor. Defaults to the start of the event log.",
+        ),
+        openapi.Parameter(
+            "community",
+            openapi.IN_QUERY,
+            required=False,
+            type=openapi.TYPE_STRING,
+            description="Only return events for the community with this slug.",
+        ),
+        openapi.Parameter(
+            "source",
+            openapi.IN_QUERY,
+            required=False,
+            type=openapi.TYPE_STRING,
+            description="Only return events from these plugins (comma-separated).",
+        ),
+        openapi.Parameter(
+            "event_type",
+            openapi.IN_QUERY,
+            required=False,
+            type=openapi.TYPE_STRING,
+            description="Only return events of these types (comma-separated).",
+        ),
+        openapi.Parameter(
+            "limit",
+            openapi.IN_QUERY,
+            required=False,
+            type=openapi.TYPE_INTEGER,
+            default=100,
+            description="Maximum number of events to return (at most 1000).",
+        ),
+        openapi.Parameter(
+            "timeout",
+            openapi.IN_QUERY,
+            required=False,
+            type=openapi.TYPE_NUMBER,
+            description="Seconds to wait for new events. Defaults to 0 for JSON responses, and to the maximum for event streams.",
+        ),
+        openapi.Parameter(
+            "partitions",
+            openapi.IN_QUERY,
+            required=False,
+            type=openapi.TYPE_INTEGER,
+            description="Split communities into this many partitions, so that several Driver replicas can share the events. Each community's events are always in the same partition.",
+        ),
+        openapi.Parameter(
+            "partition",
+            openapi.IN_QUERY,
+            required=False,
+            type=openapi.TYPE_INTEGER,
+            description="Which partition to return events for, from 0 to `partitions - 1`.",
+        ),
+    ],
+    "responses": {
+        200: openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                "events": openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_OBJECT)),
+                "cursor": openapi.Schema(type=openapi.TYPE_INTEGER, description="Cursor to use for the next request"),
+            },
+        )
+    },
+}
+
+perform_actions_batch = {
+    "method": "post",
+    "operation_id": "Perform actions in batch",
+    "operation_description": """Perform several actions in one request. Actions are performed concurrently, so they shouldn't depend on each other, and each one succeeds or fails on its own.
+
+Responds with a result for each action, in the same order as the request. Successful actions have `status` 200 and the action's response in `result`. Failed actions have the status code that the action's own endpoint would have responded with, and the reason in `error`.""",
+    "tags": [Tags.ACTION],
+    "manual_parameters": [community_header],
+    "request_body": openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        required=["actions"],
+        properties={
+            "actions": openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Items(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        "plugin": openapi.Schema(type=openapi.TYPE_STRING, description="plugin name"),
+                        "action": openapi.Schema(type=openapi.TYPE_STRING, description="action slug"),
+                        "parameters": openapi.Schema(type=openapi.TYPE_OBJECT, description="action parameters"),
+                        "community_platform_id": openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            description="plugin instance to use, if the community has several instances of the plugin",
+                        ),
+                    },
+                ),
+            )
+        },
+    ),
+    "responses": {
+        200: openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                "results": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Items(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            "status": openapi.Schema(type=openapi.TYPE_INTEGER),
+                            "result": openapi.Schema(type=openapi.TYPE_OBJECT),
+                            "error": openapi.Schema(type=openapi.TYPE_STRING),
+                        },
+                    ),
+                )
+            },
+        )
+    },
+}
+
+action_job = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        "id": openapi.Schema(type=openapi.TYPE_STRING, description="job ID"),
+        "community": openapi.Schema(type=openapi.TYPE_STRING, description="community slug"),
+        "plugin": openapi.Schema(type=openapi.TYPE_STRING, description="plugin name"),
+        "action": openapi.Schema(type=openapi.TYPE_STRING, description="action slug"),
+        "status": openapi.Schema(type=openapi.TYPE_STRING, enum=["pending", "running", "completed", "failed"]),
+        "result": openapi.Schema(type=openapi.TYPE_OBJECT, description="response of the action, once it has completed"),
+        "error": openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            description="if the action failed, the `status` code and `detail` that its endpoint would respond with",
+        ),
+        "created_at": openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        "finished_at": openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+    },
+)
+
+async_action_properties = {
+    "async": openapi.Schema(
+        type=openapi.TYPE_BOOLEAN,
+        description="perform the action asynchronously, and respond with a job rather than waiting for the result",
+    ),
+    "callback_url": openapi.Schema(
+        type=openapi.TYPE_STRING, description="URL to POST the job to when the action has finished, if `async` is set"
+    ),
+}
+
+action_job_started_response = openapi.Response(
+    "Action queued to be performed asynchronously. Use the URL from the `Location` header in the response to get the status and result of the job.",
+    action_job,
+)
+
+get_action_job = {
+    "method": "get",
+    "operation_id": "Check status of action job",
+    "operation_description": "Poll an action that is being performed asynchronously. Check the `status` field to see if the action has finished.",
+    "tags": [Tags.ACTION],
+    "responses": {200: openapi.Response("Current job record", action_job), 404: "Job not found"},
+}
@@ -30,6 +30,14 @@ management_patterns = [
     path("api/hooks/<slug:community>/<slug:plugin_name>", views.receive_webhook, name="receive_webhook"),
     path("api/hooks/<slug:plugin_name>", views.receive_webhook_global, name="receive_webhook_global"),
 
+    # Perform several actions in one request
+    path(f"{utils.internal_path}/actions/batch", views.perform_actions_batch, name="perform_actions_batch"),
+    # Check the status and result of an action that is performed asynchronously
+    path(f"{utils.internal_path}/action/jobs/<uuid:job_id>", views.get_action_job, name="get_action_job"),
+
+    # Pull platform events from the event log
+    path(f"{utils.internal_path}/events/stream", views.event_stream, name="event_stream"),
+
 ]
 
 
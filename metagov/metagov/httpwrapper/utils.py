@@ -9,3 +9,7 @@ def construct_action_url(plugin_name: str, slug: str, is_public=False) -> str:
 
 def construct_process_url(plugin_name: str, slug: str) -> str:
     return f"{internal_path}/process/{plugin_name}.{slug}"
+
+
+def construct_action_job_url(job_id) -> str:
+    return f"{internal_path}/action/jobs/{job_id}"
@@ -2,13 +2,22 @@
 This module contains views necessary for external drivers to interact with metagov. Django-based apps
 can call the underlying methods directly.
 """
+import json
 import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from http import HTTPStatus
 
 import jsonschema
 import metagov.httpwrapper.openapi_schemas as MetagovSchemas
-from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotFound, JsonResponse
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotFound, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect
+from django.utils import timezone
 from django.utils.decorators import decorator_from_middleware
 from django.views.decorators.csrf import csrf_exempt
 from drf_yasg import openapi
@@ -19,14 +28,15 @@ from metagov.httpwrapper import utils
 from metagov.core.app import MetagovApp
 from metagov.core.handlers import MetagovRequestHandler
 from metagov.core.middleware import CommunityMiddleware
-from metagov.core.models import Community, Plugin, ProcessStatus
+from metagov.core.models import ActionJob, Community, DriverEvent, Plugin, ProcessStatus
 from metagov.httpwrapper.openapi_schemas import Tags
 from metagov.core.plugin_manager import plugin_registry
 from metagov.core.serializers import CommunitySerializer, GovernanceProcessSerializer, PluginSerializer
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 
 
 
@@ -312,6 +322,7 @@ def decorated_perform_action_view(plugin_name, slug, tags=[]):
         """
 
         parameters = None
+        payload = {}
         if request.method == "POST" and request.body:
             payload = JSONParser().parse(request)
             parameters = payload.get("parameters", {})
@@ -320,25 +331,20 @@ def decorated_perform_action_view(plugin_name, slug, tags=[]):
             parameters = request.GET.dict()  # doesnt support repeated params 'a=2&a=3'
             core_utils.restruct(parameters)
 
-        community = request.community
-
-        try:
-            result = community.perform_action(
-                plugin_name=plugin_name,
-                action_id=slug,
-                parameters=parameters,
-                jsonschema_validation=True,
-                # TODO(#50) add support for specifying comm platform id
-                community_platform_id=None,
-            )
-        except Plugin.DoesNotExist:
-            raise ValidationError(f"Plugin '{plugin_name}' not enabled for community '{community}'")
-        except Plugin.MultipleObjectsReturned:
-            raise ValidationError(
-                f"Plugin '{plugin_name}' has multiple instances for community '{community}'. Please specify community_platform_id."
+        if payload.get("async"):
+            if not meta.allow_async:
+                raise ValidationError(f"Action '{prefixed_slug}' can't be performed asynchronously")
+            callback_url = payload.get("callback_url")
+            job = _perform_action(
+                request.community, plugin_name, slug, parameters, run_async=True, callback_url=callback_url
             )
-        except jsonschema.exceptions.ValidationError as err:
-            raise ValidationError(err.message)
+            # Return 202 with job location in header
+            response = JsonResponse(job.serialize(), status=HTTPStatus.ACCEPTED)
+            response["Location"] = f"/{utils.construct_action_job_url(job.pk)}"
+            return response
+
+        # TODO(#50) add support for specifying comm platform id
+        result = _perform_action(request.community, plugin_name, slug, parameters)
 
         if result is None:
             return HttpResponse()
@@ -355,19 +361,108 @@ def decorated_perform_action_view(plugin_name, slug, tags=[]):
         "operation_id": prefixed_slug,
         "tags": tags or [Tags.ACTION],
     }
+    properties = {}
     if meta.input_schema:
-        properties = {"parameters": MetagovSchemas.json_schema_to_openapi_object(meta.input_schema)}
-
+        properties["parameters"] = MetagovSchemas.json_schema_to_openapi_object(meta.input_schema)
+    if meta.allow_async:
+        properties.update(MetagovSchemas.async_action_properties)
+    if properties:
         arg_dict["request_body"] = openapi.Schema(type=openapi.TYPE_OBJECT, properties={**properties})
 
     if meta.output_schema:
         arg_dict["responses"] = {200: MetagovSchemas.json_schema_to_openapi_object(meta.output_schema)}
     else:
         arg_dict["responses"] = {200: "action was performed successfully"}
+    if meta.allow_async:
+        arg_dict["responses"][202] = MetagovSchemas.action_job_started_response
 
     return swagger_auto_schema(**arg_dict)(perform_action)
 
 
+def _perform_action(
+    community, plugin_name, slug, parameters, community_platform_id=None, run_async=False, callback_url=None
+):
+    try:
+        return community.perform_action(
+            plugin_name=plugin_name,
+            action_id=slug,
+            parameters=parameters,
+            jsonschema_validation=True,
+            community_platform_id=community_platform_id,
+            run_async=run_async,
+            callback_url=callback_url,
+        )
+    except Plugin.DoesNotExist:
+        raise ValidationError(f"Plugin '{plugin_name}' not enabled for community '{community}'")
+    except Plugin.MultipleObjectsReturned:
+        raise ValidationError(
+            f"Plugin '{plugin_name}' has multiple instances for community '{community}'. Please specify community_platform_id."
+        )
+    except jsonschema.exceptions.ValidationError as err:
+        raise ValidationError(err.message)
+
+
+@swagger_auto_schema(**MetagovSchemas.perform_actions_batch)
+@community_middleware
+@api_view(["POST"])
+def perform_actions_batch(request):
+    actions = request.data.get("actions") if isinstance(request.data, dict) else None
+    if not isinstance(actions, list):
+        raise ValidationError("'actions' must be a list")
+    max_size = getattr(settings, "ACTION_BATCH_MAX_SIZE", 50)
+    if len(actions) > max_size:
+        raise ValidationError(f"At most {max_size} actions can be performed in one batch")
+
+    community = request.community
+    concurrency = min(getattr(settings, "ACTION_BATCH_CONCURRENCY", 4), len(actions))
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda item: _perform_batch_action_in_thread(community, item), actions))
+    else:
+        results = [_perform_batch_action(community, item) for item in actions]
+    return JsonResponse({"results": results})
+
+
+def _perform_batch_action(community, item):
+    """Perform one action of a batch, and return its result or the error that its endpoint would have responded with"""
+    try:
+        if not isinstance(item, dict):
+            raise ValidationError("Each action must be an object")
+        plugin_name, slug = item.get("plugin"), item.get("action")
+        cls = plugin_registry.get(plugin_name)
+        if not cls or slug not in cls._action_registry:
+            raise ValidationError(f"No such action '{plugin_name}.{slug}'")
+        parameters = item.get("parameters")
+        if parameters is not None and not isinstance(parameters, dict):
+            raise ValidationError("'parameters' must be an object")
+        result = _perform_action(community, plugin_name, slug, parameters, item.get("community_platform_id"))
+        return {"status": HTTPStatus.OK, "result": result}
+    except APIException as err:
+        return {"status": err.status_code, "error": str(err.detail[0] if isinstance(err.detail, list) else err.detail)}
+    except Exception as err:
+        logger.error(traceback.format_exc())
+        logger.error(f"ERROR: {type(err).__name__} {str(err)} thrown in batch action '{item}'")
+        return {"status": HTTPStatus.INTERNAL_SERVER_ERROR, "error": "A server error occurred."}
+
+
+def _perform_batch_action_in_thread(community, item):
+    try:
+        return _perform_batch_action(community, item)
+    finally:
+        # worker threads open their own database connections
+        connections.close_all()
+
+
+@swagger_auto_schema(**MetagovSchemas.get_action_job)
+@api_view(["GET"])
+def get_action_job(request, job_id):
+    try:
+        job = ActionJob.objects.select_related("community").get(pk=job_id)
+    except ActionJob.DoesNotExist:
+        return HttpResponseNotFound()
+    return JsonResponse(job.serialize())
+
+
 # Webhook endpoints
 
 
@@ -407,4 +502,137 @@ def receive_webhook_global(request, plugin_name):
             community_platform_id=None,
         )
     except (Community.DoesNotExist, Plugin.DoesNotExist):
-        return HttpResponseNotFound()
\ No newline at end of file
+        return HttpResponseNotFound()
+
+
+# Event endpoints
+
+# How often to check for new events while a request is waiting for them, in seconds
+EVENT_STREAM_POLL_INTERVAL = 1
+# How often to send a comment on an idle event stream, to keep proxies from closing the connection
+EVENT_STREAM_KEEPALIVE_INTERVAL = 15
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Renderer for server-sent events. Successful responses are streamed by the view, so this only renders errors."""
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f"event: error\ndata: {json.dumps(data)}\n\n"
+
+
+def _list_param(request, name):
+    """Get a query parameter that can be repeated or comma-separated"""
+    return [value for param in request.GET.getlist(name) for value in param.split(",") if value]
+
+
+def _int_param(request, name, default=None, minimum=None, maximum=None):
+    value = request.GET.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValidationError(f"'{name}' must be an integer")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValidationError(f"'{name}' must be between {minimum} and {maximum}")
+    return value
+
+
+def _next_events(events, cursor, limit, cursor_field):
+    """Get the events after the cursor. Events are numbered in commit order within a community, so a community's
+    stream uses the sequence number as the cursor. Across communities, events are ordered by ID, which isn't
+    in commit order: an event that is still being committed can get a lower ID than one that has already been
+    read. So events are held back until they're ``DRIVER_EVENT_STREAM_LAG`` seconds old. An event that takes longer
+    than that to commit is skipped, and ``DriverEvent.warn_if_committed_late`` logs a warning."""
+    if cursor_field == "pk":
+        lag = getattr(settings, "DRIVER_EVENT_STREAM_LAG", 5)
+        events = events.filter(created_at__lte=timezone.now() - timedelta(seconds=lag))
+    return list(events.filter(**{f"{cursor_field}__gt": cursor}).order_by(cursor_field)[:limit])
+
+
+def _wait_for_events(events, cursor, limit, timeout, cursor_field):
+    """Long-poll for events after the cursor, returning as soon as there are any or the timeout has passed"""
+    deadline = time.monotonic() + timeout
+    while True:
+        batch = _next_events(events, cursor, limit, cursor_field)
+        if batch or time.monotonic() >= deadline:
+            return batch
+        time.sleep(EVENT_STREAM_POLL_INTERVAL)
+
+
+def _stream_events(events, cursor, limit, timeout, cursor_field):
+    """Generate server-sent events for events after the cursor, until the timeout has passed"""
+    deadline = time.monotonic() + timeout
+    last_sent = time.monotonic()
+    while True:
+        batch = _next_events(events, cursor, limit, cursor_field)
+        for event in batch:
+            cursor = getattr(event, cursor_field)
+            yield f"id: {cursor}\ndata: {json.dumps(event.serialize())}\n\n"
+            last_sent = time.monotonic()
+        if len(batch) == limit:
+            continue
+        if time.monotonic() >= deadline:
+            return
+        if time.monotonic() - last_sent >= EVENT_STREAM_KEEPALIVE_INTERVAL:
+            yield ": keepalive\n\n"
+            last_sent = time.monotonic()
+        time.sleep(EVENT_STREAM_POLL_INTERVAL)
+
+
+@swagger_auto_schema(**MetagovSchemas.event_stream)
+@api_view(["GET"])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def event_stream(request):
+    if not getattr(settings, "DRIVER_EVENT_RETENTION_DAYS", 0):
+        return HttpResponseNotFound("Event log is disabled. Set DRIVER_EVENT_RETENTION_DAYS to enable it.")
+
+    streaming = request.accepted_renderer.format == EventStreamRenderer.format
+    # EventSource clients send the id of the last event they received when they reconnect
+    cursor = request.GET.get("cursor") or request.headers.get("Last-Event-ID") or 0
+    try:
+        cursor = int(cursor)
+    except ValueError:
+        raise ValidationError("'cursor' must be an integer")
+    limit = _int_param(request, "limit", default=100, minimum=1, maximum=1000)
+    max_wait = getattr(settings, "DRIVER_EVENT_STREAM_MAX_WAIT", 60)
+    try:
+        timeout = float(request.GET.get("timeout", max_wait if streaming else 0))
+    except ValueError:
+        raise ValidationError("'timeout' must be a number")
+    timeout = min(max(timeout, 0), max_wait)
+
+    events = DriverEvent.objects.select_related("community")
+    cursor_field = "pk"
+    if request.GET.get("community"):
+        events = events.filter(community__slug=request.GET["community"], sequence__isnull=False)
+        cursor_field = "sequence"
+    sources = _list_param(request, "source")
+    if sources:
+        events = events.filter(source__in=sources)
+    event_types = _list_param(request, "event_type")
+    if event_types:
+        events = events.filter(event_type__in=event_types)
+    partitions = _int_param(request, "partitions", minimum=1)
+    if partitions:
+        partition = _int_param(request, "partition", default=0, minimum=0, maximum=partitions - 1)
+        events = events.annotate(community_partition=F("community_id") % partitions).filter(
+            community_partition=partition
+        )
+
+    if streaming:
+        response = StreamingHttpResponse(
+            _stream_events(events, cursor, limit, timeout, cursor_field), content_type=EventStreamRenderer.media_type
+        )
+        response["Cache-Control"] = "no-cache"
+        # disable response buffering in nginx
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    batch = _wait_for_events(events, cursor, limit, timeout, cursor_field)
+    next_cursor = getattr(batch[-1], cursor_field) if batch else cursor
+    return JsonResponse({"events": [event.serialize() for event in batch], "cursor": next_cursor})
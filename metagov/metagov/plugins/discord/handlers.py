@@ -1,10 +1,9 @@
-import json
 import logging
-import requests
 from django.conf import settings
 
 from django.http.response import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
 from metagov.core.errors import PluginErrorInternal, PluginAuthError
+from metagov.core.http import http_client
 from metagov.core.plugin_manager import AuthorizationType
 from metagov.core.models import ProcessStatus
 from metagov.plugins.discord.models import Discord, DiscordVote
@@ -54,7 +53,7 @@ class DiscordRequestHandler(PluginRequestHandler):
 
         The request body is an Interaction object: https://discord.com/developers/docs/interactions/receiving-and-responding#interaction-object
         """
-        json_data = json.loads(request.body)
+        json_data = request.payload
         logger.debug(f"received discord request: {json_data}")
 
         validate_discord_interaction(request)
@@ -79,10 +78,10 @@ class DiscordRequestHandler(PluginRequestHandler):
 
         # Process type 3, MESSAGE_COMPONENT (a user interacting with an interactive message component that was posted by the bot. for example, clicking a voting button.)
         if json_data["type"] == 3:
-            # Pass the interaction event to all active governance processes in this guild
+            # Pass the interaction event to the active governance process in this guild that posted the message
             # TODO: maybe should pass message components to Plugins too, in case bots are posting interactive messages
-            active_processes = DiscordVote.objects.filter(
-                plugin__community_platform_id=community_platform_id, status=ProcessStatus.PENDING.value
+            active_processes = DiscordVote.get_webhook_receivers(
+                request, plugin__community_platform_id=community_platform_id
             )
             for process in active_processes:
                 logger.info(f"Passing interaction request to {process}")
@@ -92,6 +91,13 @@ class DiscordRequestHandler(PluginRequestHandler):
 
         return HttpResponse()
 
+    def verify_webhook(self, request):
+        validate_discord_interaction(request)
+
+    def requires_inline_response(self, request):
+        # Discord expects every interaction to be answered with an interaction response
+        return True
+
     def construct_oauth_authorize_url(self, type: str, community=None):
         if not DISCORD_CLIENT_ID:
             raise PluginAuthError(detail="Client ID not configured")
@@ -139,7 +145,7 @@ class DiscordRequestHandler(PluginRequestHandler):
         user_refresh_token = response["refresh_token"]
 
         # Get user info
-        resp = requests.get(
+        resp = http_client.get(
             "https://discord.com/api/users/@me", headers={"Authorization": f"Bearer {user_access_token}"}
         )
         logger.debug(resp.request.headers)
@@ -207,7 +213,7 @@ class DiscordRequestHandler(PluginRequestHandler):
         elif type == AuthorizationType.USER_LOGIN:
 
             # Find which guilds this user is a part of
-            resp = requests.get(
+            resp = http_client.get(
                 "https://discord.com/api/users/@me/guilds",
                 headers={"Authorization": f"Bearer {response['access_token']}"},
             )
@@ -263,7 +269,7 @@ def _exchange_code(code):
         "code": code,
         "redirect_uri": f"{settings.SERVER_URL}/auth/discord/callback",
     }
-    resp = requests.post("https://discordapp.com/api/oauth2/token", data=data)
+    resp = http_client.post("https://discordapp.com/api/oauth2/token", data=data)
     if not resp.ok:
         logger.error(f"Discord auth failed: {resp.status_code} {resp.reason}")
         raise PluginAuthError
@@ -278,6 +284,8 @@ def add_query_parameters(url, params):
 
 
 def validate_discord_interaction(request):
+    if getattr(request, "signature_verified", False):
+        return
     timestamp = request.headers.get("X-Signature-Timestamp")
     signature = request.headers.get("X-Signature-Ed25519")
     if not timestamp or not signature:
@@ -288,6 +296,7 @@ def validate_discord_interaction(request):
 
     if not verify_key(raw_body, signature, timestamp, client_public_key):
         raise PluginErrorInternal("Bad request signature: verification failed")
+    request.signature_verified = True
 
 
 def verify_key(raw_body, signature, timestamp, client_public_key):
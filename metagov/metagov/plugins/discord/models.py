@@ -1,7 +1,5 @@
-import json
 import logging
 
-import requests
 from django.conf import settings
 from metagov.core.errors import PluginErrorInternal
 from metagov.core.models import AuthType, Plugin, ProcessStatus, GovernanceProcess
@@ -80,7 +78,7 @@ class Discord(Plugin):
             'type': 2,
             'version': 1}
         """
-        interaction_object = json.loads(request.body)
+        interaction_object = request.payload
         if interaction_object["type"] != 2:
             # ignore it if its not an application command
             return None
@@ -109,11 +107,14 @@ class Discord(Plugin):
         if not route.startswith("/"):
             route = f"/{route}"
 
-        resp = requests.request(
+        # Discord rate limits each route separately, by its top-level resource (e.g. /channels/<id>)
+        bucket = "/".join(route.split("/")[:3])
+        resp = self.http.request(
             method,
             f"https://discord.com/api{route}",
             headers={"Authorization": f"Bot {DISCORD_BOT_TOKEN}"},
             json=json,
+            rate_limit=("discord", bucket),
         )
 
         if not resp.ok:
@@ -272,6 +273,7 @@ class DiscordVote(GovernanceProcess):
         message_id = resp["id"]
         guild_id = self.plugin.community_platform_id
         self.outcome["message_id"] = message_id
+        self.add_routing_key(message_id)
         self.url = f"https://discord.com/channels/{guild_id}/{parameters.channel}/{message_id}"
         self.status = ProcessStatus.PENDING.value
         self.save()
@@ -347,8 +349,12 @@ class DiscordVote(GovernanceProcess):
 
         return [{"type": 1, "components": blocks}]
 
+    @classmethod
+    def get_webhook_routing_key(cls, request):
+        return request.payload.get("message", {}).get("id")
+
     def receive_webhook(self, request):
-        json_data = json.loads(request.body)
+        json_data = request.payload
         message_id_to_match = self.outcome["message_id"]
         if not json_data.get("message", {}).get("id") == message_id_to_match:
             return None
@@ -387,22 +393,10 @@ class DiscordVote(GovernanceProcess):
         return True
 
     def _cast_vote(self, user: str, value: str):
-        if not self.outcome["votes"].get(value):
-            return False
-        if user in self.outcome["votes"][value]["users"]:
+        if value not in self.outcome["votes"]:
             return False
-
-        # Update vote count for selected value
-        self.outcome["votes"][value]["users"].append(user)
-        self.outcome["votes"][value]["count"] = len(self.outcome["votes"][value]["users"])
-
-        # If user previously voter for a different option, remove old vote
-        for k, v in self.outcome["votes"].items():
-            if k != value and user in v["users"]:
-                v["users"].remove(user)
-                v["count"] = len(v["users"])
-
-        self.save()
+        # Record the vote in the vote ledger, which updates the vote counts
+        return self.record_vote(user, value)
 
     def close(self):
         # Set governance process to completed
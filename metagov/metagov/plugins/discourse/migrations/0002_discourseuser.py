@@ -0,0 +1,30 @@
+# Generated by Django 3.2.12 on 2026-10-17 06:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_vote'),
+        ('metagov_discourse', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscourseUser',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(help_text='Discourse user ID')),
+                ('username', models.CharField(max_length=255)),
+                ('data', models.JSONField(default=dict, help_text='User record returned by the Discourse API')),
+                ('list_digest', models.CharField(blank=True, help_text="Digest of the user's entry in the user list when the user was last synced", max_length=64)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+                ('plugin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discourse_users', to='core.plugin')),
+            ],
+            options={
+                'unique_together': {('plugin', 'user_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+import jsonpickle
+
+PICKLED_KEY = "py/jsonpickle"
+
+
+def seed_users(apps, schema_editor):
+    """Copy the users that were kept in the ``users`` map of the plugin state into ``DiscourseUser`` rows, so that
+    the old records are there to compare ``user_updated`` webhooks against until the first sync."""
+    Plugin = apps.get_model("core", "Plugin")
+    DataStoreEntry = apps.get_model("core", "DataStoreEntry")
+    DiscourseUser = apps.get_model("metagov_discourse", "DiscourseUser")
+    for plugin in Plugin.objects.filter(name="discourse", state__isnull=False).iterator():
+        entry = DataStoreEntry.objects.filter(datastore_id=plugin.state_id, key="users").first()
+        if entry is None:
+            continue
+        users = entry.value
+        if isinstance(users, dict) and list(users) == [PICKLED_KEY]:
+            users = jsonpickle.unpickler.Unpickler().restore(users[PICKLED_KEY], reset=True)
+        if not isinstance(users, dict):
+            continue
+        stored = set(DiscourseUser.objects.filter(plugin=plugin).values_list("user_id", flat=True))
+        # the list digest is left blank, so the first sync fetches the users again and fills it in
+        new_users = [
+            DiscourseUser(plugin=plugin, user_id=user["id"], username=user.get("username", ""), data=user)
+            for user in users.values()
+            if isinstance(user, dict) and "id" in user and user["id"] not in stored
+        ]
+        DiscourseUser.objects.bulk_create(new_users, batch_size=500)
+        entry.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_datastoreentry_codec'),
+        ('metagov_discourse', '0002_discourseuser'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_users, migrations.RunPython.noop),
+    ]
@@ -2,10 +2,15 @@ import hashlib
 import hmac
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 from metagov.core.plugin_manager import Registry, Parameters, VotingStandard
 import metagov.plugins.discourse.schemas as Schemas
-import requests
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from metagov.core.errors import PluginErrorInternal
 from metagov.core.models import GovernanceProcess, Plugin, AuthType, ProcessStatus
 
@@ -15,6 +20,13 @@ EVENT_POST_CREATED = "post_created"
 EVENT_TOPIC_CREATED = "topic_created"
 EVENT_USER_FIELDS_CHANGED = "user_fields_changed"
 
+# number of users per page of the admin user list
+USER_LIST_PAGE_SIZE = 100
+# fields of a user list entry that indicate that the user needs to be fetched again
+USER_LIST_FIELDS = [
+    "username", "name", "active", "admin", "moderator", "trust_level", "suspended_till", "silenced_till"
+]
+
 """
 TODO: add actions and events for "user actions":
  LIKE = 1
@@ -57,12 +69,12 @@ class Discourse(Plugin):
         proxy = True
 
     def initialize(self):
-        resp = requests.get(f"{self.config['server_url']}/about.json")
+        resp = self.http.get(f"{self.config['server_url']}/about.json")
         response = resp.json()
         community_name = response.get("about").get("title")
         logger.info(f"Initialized Discourse plugin for community {community_name}")
         self.state.set("community_name", community_name)
-        self.store_user_list()
+        # the users are synced by the plugin task, which is due as soon as the plugin is created
 
     def construct_post_url(self, post):
         return f"{self.config['server_url']}/t/{post['topic_slug']}/{post['topic_id']}/{post['post_number']}"
@@ -78,7 +90,9 @@ class Discourse(Plugin):
         logger.info(f"{method} {url}")
 
         headers = {"Api-Key": self.config["api_key"]}
-        resp = requests.request(method, url, headers=headers, json=json, data=data)
+        resp = self.http.request(
+            method, url, headers=headers, json=json, data=data, rate_limit=("discourse", self.config["api_key"])
+        )
         if not resp.ok:
             logger.error(f"{resp.status_code} {resp.reason}")
             logger.error(resp.request.body)
@@ -92,6 +106,7 @@ class Discourse(Plugin):
         description="Start a new private message thread",
         input_schema=Schemas.send_message_parameters,
         output_schema=Schemas.create_post_or_topic_response,
+        allow_async=True,
     )
     def create_message(self, target_usernames, **kwargs):
         parameters = {**kwargs}
@@ -186,17 +201,56 @@ class Discourse(Plugin):
         instance = request.headers["X-Discourse-Instance"]
         if instance != self.config["server_url"]:
             raise PluginErrorInternal("Unexpected X-Discourse-Instance")
+        request.signature_verified = True
+
+    def verify_webhook(self, request):
+        self.validate_request_signature(request)
 
-    def store_user_list(self):
-        # TODO paginate request
-        response = self.discourse_request("GET", f"admin/users/list/active.json")
-        logger.info(f"Fetching {len(response)} users...")
-        users = {}
-        for user in response:
-            id = str(user["id"])
-            users[id] = self.discourse_request("GET", f"admin/users/{id}.json")
-        self.state.set("users", users)
-        logger.info(f"Saved {len(response)} users in state.")
+    def get_user(self, user_id):
+        """Get the stored Discourse user record, or None if the user hasn't been synced"""
+        user = DiscourseUser.objects.filter(plugin=self, user_id=user_id).first()
+        return user.data if user else None
+
+    def fetch_user(self, user_id):
+        return self.discourse_request("GET", f"admin/users/{user_id}.json")
+
+    @Registry.event_producer_task(interval=getattr(settings, "DISCOURSE_USER_SYNC_INTERVAL", 60 * 60))
+    def sync_users(self):
+        """Sync the active users. Pages through the user list, and only fetches the full record of users that are new,
+        or whose list entry changed since the last sync. Changes to other fields, such as ``user_fields``, are received
+        through the ``user_updated`` webhook."""
+        entries = {}
+        page = 1
+        while True:
+            response = self.discourse_request("GET", f"admin/users/list/active.json?page={page}")
+            entries.update({entry["id"]: entry for entry in response})
+            if len(response) < USER_LIST_PAGE_SIZE:
+                break
+            page += 1
+
+        digests = {user_id: user_list_digest(entry) for (user_id, entry) in entries.items()}
+        stored = dict(DiscourseUser.objects.filter(plugin=self).values_list("user_id", "list_digest"))
+        changed = [user_id for (user_id, digest) in digests.items() if stored.get(user_id) != digest]
+        logger.info(f"Fetching {len(changed)} of {len(entries)} users...")
+
+        # fetch users concurrently, within the limits of the Discourse API
+        concurrency = getattr(settings, "DISCOURSE_USER_SYNC_CONCURRENCY", 4)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            users = list(executor.map(self.fetch_user, changed))
+
+        with transaction.atomic():
+            DiscourseUser.objects.filter(plugin=self).exclude(user_id__in=list(entries)).delete()
+            existing = {user.user_id: user for user in DiscourseUser.objects.filter(plugin=self, user_id__in=changed)}
+            new_users = []
+            for user in users:
+                record = existing.get(user["id"]) or DiscourseUser(plugin=self, user_id=user["id"])
+                record.username, record.data, record.list_digest = user["username"], user, digests[user["id"]]
+                if record.pk is None:
+                    new_users.append(record)
+            DiscourseUser.objects.bulk_update(existing.values(), ["username", "data", "list_digest"], batch_size=500)
+            DiscourseUser.objects.bulk_create(new_users, batch_size=500)
+
+        logger.info(f"Synced {len(users)} users.")
 
     @Registry.webhook_receiver(
         event_schemas=[
@@ -208,7 +262,7 @@ class Discourse(Plugin):
     def process_discourse_webhook(self, request):
         self.validate_request_signature(request)
         event = request.headers.get("X-Discourse-Event")
-        body = json.loads(request.body)
+        body = request.payload
         logger.info(f"Received event '{event}' from Discourse")
 
         if event == "post_created":
@@ -235,14 +289,15 @@ class Discourse(Plugin):
         elif event == "user_updated":
             updated_user = body.get("user")
 
-            # Get the old user record from state
-            user_map = self.state.get("users")
-            user_id = str(updated_user["id"])
-            old_user = user_map.get(user_id)
+            # Get the old user record
+            old_user = self.get_user(updated_user["id"])
 
-            # Update state so that we have the latest user map
-            user_map[user_id] = updated_user
-            self.state.set("users", user_map)
+            # Store the latest user record
+            DiscourseUser.objects.update_or_create(
+                plugin=self,
+                user_id=updated_user["id"],
+                defaults={"username": updated_user["username"], "data": updated_user},
+            )
 
             # if `user_fields` changed, send an event to the Driver
             if not old_user or old_user["user_fields"] != updated_user["user_fields"]:
@@ -256,6 +311,31 @@ class Discourse(Plugin):
                 self.send_event_to_driver(event_type=EVENT_USER_FIELDS_CHANGED, initiator=initiator, data=data)
 
 
+class DiscourseUser(models.Model):
+    """Discourse user record, kept up to date by ``Discourse.sync_users`` and the ``user_updated`` webhook."""
+
+    plugin = models.ForeignKey(Plugin, models.CASCADE, related_name="discourse_users")
+    user_id = models.IntegerField(help_text="Discourse user ID")
+    username = models.CharField(max_length=255)
+    data = models.JSONField(default=dict, help_text="User record returned by the Discourse API")
+    list_digest = models.CharField(
+        max_length=64, blank=True, help_text="Digest of the user's entry in the user list when the user was last synced"
+    )
+    synced_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [["plugin", "user_id"]]
+
+    def __str__(self):
+        return f"{self.username} ({self.plugin_id})"
+
+
+def user_list_digest(entry):
+    """Digest of the fields of a user list entry that indicate that the user changed"""
+    fields = {field: entry.get(field) for field in USER_LIST_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+
 """
 GOVERNANCE PROCESSES
 """
@@ -351,6 +431,7 @@ class DiscoursePoll(GovernanceProcess):
         self.state.set("post_id", response.get("id"))
         self.state.set("topic_id", response.get("topic_id"))
         self.state.set("topic_slug", response.get("topic_slug"))
+        self.state.set("closing_at", parameters.closing_at)
 
         self.outcome = {}
         self.status = ProcessStatus.PENDING.value
@@ -369,6 +450,18 @@ class DiscoursePoll(GovernanceProcess):
         poll = response["polls"][0]
         self.update_outcome_from_discourse_poll(poll)
 
+    def get_closing_at(self):
+        """Time that Discourse will automatically close the poll, if any"""
+        closing_at = self.state.get("closing_at")
+        closing_at = closing_at and (parse_datetime(closing_at) or parse_date(closing_at))
+        if not closing_at:
+            return None
+        if not isinstance(closing_at, datetime):
+            closing_at = datetime.combine(closing_at, datetime.min.time())
+        if timezone.is_naive(closing_at):
+            closing_at = timezone.make_aware(closing_at, timezone.utc)
+        return closing_at
+
     def close(self):
         """
         Invoked by the Driver to manually close the poll. This would be used in cases where `closing_at` param is not set,
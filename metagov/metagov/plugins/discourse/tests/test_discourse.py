@@ -2,7 +2,7 @@ import metagov.plugins.discourse.tests.mocks as DiscourseMock
 import requests
 import requests_mock
 from metagov.core.tasks import execute_plugin_tasks
-from metagov.plugins.discourse.models import Discourse, DiscoursePoll
+from metagov.plugins.discourse.models import Discourse, DiscoursePoll, DiscourseUser
 from metagov.tests.plugin_test_utils import PluginTestCase
 
 mock_server_url = "https://discourse.metagov.org"
@@ -20,6 +20,14 @@ class ApiTests(PluginTestCase):
         # set up mocks needed for the `initialize` method, which is called with the plugin is enabled
         with requests_mock.Mocker() as m:
             m.get(f"{mock_server_url}/about.json", json={"about": {"title": "my community"}})
+
+            # enable the plugin
+            self.enable_plugin(
+                name="discourse", config={"server_url": mock_server_url, "api_key": "empty", "webhook_secret": "empty"}
+            )
+
+        # users are synced by the first run of the plugin task, rather than while the plugin is enabled
+        with requests_mock.Mocker() as m:
             m.get(
                 f"{mock_server_url}/admin/users/list/active.json",
                 json=[{"id": 1, "username": "alice"}],
@@ -28,17 +36,33 @@ class ApiTests(PluginTestCase):
                 f"{mock_server_url}/admin/users/1.json",
                 json={"id": 1, "username": "alice", "foo": "bar"},
             )
-
-            # enable the plugin
-            self.enable_plugin(
-                name="discourse", config={"server_url": mock_server_url, "api_key": "empty", "webhook_secret": "empty"}
-            )
+            execute_plugin_tasks()
 
     def test_init_works(self):
         """Plugin is properly initialized"""
         plugin = Discourse.objects.first()
         self.assertIsNotNone(plugin)
-        self.assertEqual(plugin.state.get("users").get("1").get("username"), "alice")
+        self.assertEqual(plugin.get_user(1).get("username"), "alice")
+
+    def test_sync_users(self):
+        """Users are synced page by page, and only changed users are fetched again"""
+        plugin = Discourse.objects.first()
+        page = [{"id": 1, "username": "alice"}] + [{"id": i, "username": f"user{i}"} for i in range(2, 101)]
+        with requests_mock.Mocker() as m:
+            user_id = lambda request: int(request.path.split("/")[-1].split(".")[0])
+            m.get(requests_mock.ANY, json=lambda request, context: {"id": user_id(request), "username": "x"})
+            m.get(f"{mock_server_url}/admin/users/list/active.json?page=1", json=page)
+            m.get(f"{mock_server_url}/admin/users/list/active.json?page=2", json=[{"id": 101, "username": "bob"}])
+            plugin.sync_users()
+            self.assertEqual(DiscourseUser.objects.filter(plugin=plugin).count(), 101)
+            # alice was already synced and hasn't changed
+            self.assertEqual(len([r for r in m.request_history if "list" not in r.path]), 100)
+
+            m.get(f"{mock_server_url}/admin/users/list/active.json?page=2", json=[{"id": 101, "username": "robert"}])
+            request_count = m.call_count
+            plugin.sync_users()
+            self.assertEqual(m.call_count, request_count + 3)
+            self.assertEqual(m.last_request.path, "/admin/users/101.json")
 
     def start_discourse_poll(self):
         self.assertEqual(DiscoursePoll.objects.all().count(), 0)
@@ -45,6 +45,7 @@ class Randomness(Plugin):
         description="Get a random integer in range",
         input_schema={"type": "object", "properties": {"low": {"type": "integer"}, "high": {"type": "integer"}}},
         output_schema={"type": "object", "properties": {"value": {"type": "integer"}}},
+        allow_async=True,
     )
     def rand_int(self, low=None, high=None):
         import random
@@ -98,6 +99,10 @@ class StochasticVote(GovernanceProcess):
         self.status = ProcessStatus.PENDING.value
         self.save()
 
+    def get_closing_at(self):
+        # make sure that the process is updated as soon as it's due to close
+        return self.state.get("closing_at")
+
     def update(self):
         closing_at = self.state.get("closing_at")
         if datetime.now(timezone.utc) >= closing_at:
@@ -1,10 +1,8 @@
-import json
 import logging
-import requests
 
 from django.conf import settings
-from metagov.core.models import ProcessStatus
 from metagov.core.plugin_manager import AuthorizationType
+from metagov.core.http import http_client
 from metagov.plugins.github.models import Github, GithubIssueReactVote, GithubIssueCommentVote
 from metagov.plugins.github.utils import get_jwt
 from metagov.core.handlers import PluginRequestHandler
@@ -20,7 +18,7 @@ class GithubRequestHandler(PluginRequestHandler):
         if not "X-GitHub-Event" in request.headers:
             return
 
-        json_data = json.loads(request.body)
+        json_data = request.payload
         installation = json_data.get("installation")
         if not installation:
             return
@@ -36,7 +34,7 @@ class GithubRequestHandler(PluginRequestHandler):
         plugin.github_webhook_receiver(request)
 
         for process_type in [GithubIssueCommentVote, GithubIssueReactVote]:
-            for process in process_type.objects.filter(plugin=plugin, status=ProcessStatus.PENDING.value):
+            for process in process_type.get_webhook_receivers(request, plugin=plugin):
                 if hasattr(process, "receive_webhook"):
                     process.receive_webhook(request)
 
@@ -55,7 +53,7 @@ class GithubRequestHandler(PluginRequestHandler):
         installation_id = request.GET.get("installation_id")
         headers = {"Accept": "application/vnd.github.v3+json", "Authorization": f"Bearer {get_jwt()}"}
         url = f"https://api.github.com/app/installations/{installation_id}"
-        resp = requests.request("GET", url, headers=headers)
+        resp = http_client.request("GET", url, headers=headers)
         owner = resp.json()["account"]["login"]
 
         # create new plugin
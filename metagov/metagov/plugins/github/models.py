@@ -1,15 +1,19 @@
-import requests, json, logging
+import logging
 from collections import Counter
+from urllib.parse import urlencode
 
 from metagov.core.plugin_manager import Registry, Parameters, VotingStandard
 from metagov.core.models import Plugin, GovernanceProcess, ProcessStatus, AuthType
 from metagov.core.errors import PluginErrorInternal
 import metagov.plugins.github.schemas as Schemas
-from metagov.plugins.github.utils import (get_access_token, create_issue_text, close_comment_vote_text,
-    close_react_vote_text, get_jwt)
+from metagov.plugins.github.utils import (create_issue_text, close_comment_vote_text, close_react_vote_text,
+    get_jwt, issue_routing_key, get_webhook_issue_routing_key, token_manager)
 
 logger = logging.getLogger(__name__)
 
+# maximum number of items per page for list requests
+PAGE_SIZE = 100
+
 
 @Registry.plugin
 class Github(Plugin):
@@ -25,8 +29,11 @@ class Github(Plugin):
         """Requests a new installation access token from Github using a JWT signed by private key."""
         installation_id = self.config["installation_id"]
         self.state.set("installation_id", installation_id)
-        token = get_access_token(installation_id)
-        self.state.set("installation_access_token", token)
+        return token_manager.refresh_installation_token(installation_id)
+
+    def get_token(self):
+        """Installation access token, which is cached until shortly before it expires"""
+        return token_manager.get_installation_token(self.config["installation_id"])
 
     def initialize(self):
         self.state.set("owner", self.config["owner"])
@@ -35,10 +42,7 @@ class Github(Plugin):
 
     def parse_github_webhook(self, request):
 
-        if 'payload' in request.POST:
-            body = json.loads(request.POST['payload'])
-        else:
-            body = json.loads(request.body)
+        body = request.payload
 
         action_target_type = request.headers["X_GITHUB_EVENT"]
         action_type = body["action"]
@@ -52,10 +56,24 @@ class Github(Plugin):
         self.send_event_to_driver(event_type=f"{action_type} {action_target_type}", data=body, initiator=initiator)
 
     def github_request(self, method, route, data=None, add_headers=None, refresh=False, use_jwt=False):
-        """Makes request to Github. If status code returned is 401 (bad credentials), refreshes the
+        """Makes request to Github. The installation access token is refreshed before it expires, but if status
+        code returned is 401 (bad credentials), for example because the token was revoked, refreshes the
         access token and tries again. Refresh parameter is used to make sure we only try once."""
 
-        authorization = f"Bearer {get_jwt()}" if use_jwt else f"token {self.state.get('installation_access_token')}"
+        url = f"https://api.github.com{route}"
+        resp = self.github_response(method, url, data=data, add_headers=add_headers, refresh=refresh, use_jwt=use_jwt)
+        if not resp.ok:
+            logger.error(f"Request error for {method}, {route}; status {resp.status_code}, details: {resp.text}")
+            raise PluginErrorInternal(resp.text)
+        if resp.content:
+            return resp.json()
+        return None
+
+    def github_response(self, method, url, data=None, add_headers=None, refresh=False, use_jwt=False):
+        """Makes request to Github and returns the response, refreshing the access token and trying again once if
+        status code returned is 401 (bad credentials)."""
+
+        authorization = f"Bearer {get_jwt()}" if use_jwt else f"token {self.get_token()}"
         headers = {
             "Authorization": authorization,
             "Accept": "application/vnd.github.v3+json"
@@ -63,20 +81,53 @@ class Github(Plugin):
         if add_headers:
             headers.update(add_headers)
 
-        url = f"https://api.github.com{route}"
-        logger.info(f"Making request {method} to {route}")
-        resp = requests.request(method, url, headers=headers, json=data)
+        logger.info(f"Making request {method} to {url}")
+        credential = "app" if use_jwt else self.community_platform_id
+        resp = self.http.request(method, url, headers=headers, json=data, rate_limit=("github", credential))
 
         if resp.status_code == 401 and refresh == False and use_jwt == False:
             logger.info(f"Bad credentials, refreshing token and retrying")
             self.refresh_token()
-            return self.github_request(method=method, route=route, data=data, add_headers=add_headers, refresh=True)
-        if not resp.ok:
-            logger.error(f"Request error for {method}, {route}; status {resp.status_code}, details: {resp.text}")
-            raise PluginErrorInternal(resp.text)
-        if resp.content:
-            return resp.json()
-        return None
+            return self.github_response(method=method, url=url, data=data, add_headers=add_headers, refresh=True)
+        return resp
+
+    def github_list(self, route, params=None, add_headers=None, pages=None, compact=None):
+        """Gets every page of a list from Github.
+
+        ``pages`` are the pages returned by a previous call for the same list. Those pages are requested with their
+        ETag, and aren't downloaded again if they haven't changed (responses with status 304 Not Modified don't count
+        against the rate limit). ``compact`` is applied to each item, to keep only what's needed when the pages are
+        stored in state.
+
+        Returns the items, the pages to pass to the next call, and whether the list changed since those pages."""
+        previous = {page["url"]: page for page in pages or []}
+        url = f"https://api.github.com{route}?{urlencode({'per_page': PAGE_SIZE, **(params or {})})}"
+        new_pages, changed = [], False
+        while url:
+            cached = previous.get(url)
+            headers = dict(add_headers or {})
+            if cached and cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            resp = self.github_response("get", url, add_headers=headers)
+            if resp.status_code == 304 and cached:
+                page = cached
+            elif resp.ok:
+                items = resp.json()
+                page = {
+                    "url": url,
+                    "etag": resp.headers.get("ETag"),
+                    "items": [compact(item) for item in items] if compact else items,
+                    "next": resp.links.get("next", {}).get("url"),
+                }
+                changed = True
+            else:
+                logger.error(f"Request error for get, {url}; status {resp.status_code}, details: {resp.text}")
+                raise PluginErrorInternal(resp.text)
+            new_pages.append(page)
+            url = page["next"]
+
+        items = [item for page in new_pages for item in page["items"]]
+        return items, new_pages, changed or len(new_pages) != len(previous)
 
     @Registry.action(
         slug="method",
@@ -160,6 +211,7 @@ class GithubIssueReactVote(GovernanceProcess):
 
         self.state.set("issue_number", issue["number"])
         self.state.set("bot_id", issue["user"]["id"])
+        self.add_routing_key(issue_routing_key(self.state.get("owner"), parameters.repo_name, issue["number"]))
         self.status = ProcessStatus.PENDING.value
         self.url = f"https://github.com/{self.plugin_inst.config['owner']}/{parameters.repo_name}/issues/{issue['number']}"
         self.outcome = {
@@ -169,6 +221,10 @@ class GithubIssueReactVote(GovernanceProcess):
         self.save()
         logger.info(f"Starting IssueReactVote with issue # {issue['number']}")
 
+    @classmethod
+    def get_webhook_routing_key(cls, request):
+        return get_webhook_issue_routing_key(request)
+
     def get_basic_info(self):
         return self.state.get("owner"), self.state.get("repo"), self.state.get("issue_number")
 
@@ -176,10 +232,16 @@ class GithubIssueReactVote(GovernanceProcess):
 
         owner, repo, issue_number = self.get_basic_info()
 
-        # Get issue react count
+        # Get issue reactions, reusing the pages that haven't changed since the last update
         headers = {"Accept": "application/vnd.github.squirrel-girl-preview"}
-        reactions = self.plugin_inst.github_request(
-            method="get", route=f"/repos/{owner}/{repo}/issues/{issue_number}/reactions", add_headers=headers)
+        reactions, pages, changed = self.plugin_inst.github_list(
+            route=f"/repos/{owner}/{repo}/issues/{issue_number}/reactions",
+            add_headers=headers,
+            pages=self.state.get("reaction_pages"),
+            compact=compact_reaction,
+        )
+        if changed:
+            self.state.set("reaction_pages", pages)
 
         upvotes, downvotes = reactions_to_user_lists(reactions)
         upvotes_num, downvotes_num = len(upvotes), len(downvotes)
@@ -225,12 +287,19 @@ class GithubIssueReactVote(GovernanceProcess):
         if max_votes and (upvotes + downvotes >= max_votes):
             self.outcome["result"] = result
             self.status = ProcessStatus.COMPLETED.value
-            self.close_vote()
+            self.close_vote(upvotes, downvotes, result)
 
         self.save()
         owner, repo, issue_number = self.get_basic_info()
         logger.info(f"Updating IssueReactVote {owner}/{repo} - issue # {issue_number}")
 
+
+def compact_reaction(reaction):
+    """Keep the fields of a reaction that are needed to count votes"""
+    user = reaction["user"]
+    return {"content": reaction["content"], "user": {"login": user["login"], "type": user["type"]}}
+
+
 def reactions_to_user_lists(reaction_list):
     """Convert list of reactions from GitHub API into list of usernames for upvote and downvote"""
     upvotes = []
@@ -273,37 +342,77 @@ class GithubIssueCommentVote(GovernanceProcess):
         # save
         self.state.set("issue_number", issue["number"])
         self.state.set("bot_id", issue["user"]["id"])
+        self.state.set("comments", {})
+        self.add_routing_key(issue_routing_key(self.state.get("owner"), parameters.repo_name, issue["number"]))
         self.status = ProcessStatus.PENDING.value
         self.save()
         logger.info(f"Starting IssueCommentVote with issue # {issue['number']}")
 
+    @classmethod
+    def get_webhook_routing_key(cls, request):
+        return get_webhook_issue_routing_key(request)
+
     def get_basic_info(self):
         return self.state.get("owner"), self.state.get("repo"), self.state.get("issue_number")
 
     def get_vote_data(self):
-        """Gets vote data from issue comments, looking for text between strings _VOTE_ and _ENDVOTE_.
-        Only counts the first comment for a given user. Not case sensitive, and removes spaces."""
+        """Fetches the issue comments that are new or edited since the last time, and gets the vote data."""
+        self.sync_comments()
+        return self.tally_comments()
+
+    def sync_comments(self, full=False):
+        """Fetches the issue comments that were created or edited since the last sync, and adds them to the comments
+        kept in state. Comments that were deleted are removed when their webhook is received. With ``full``, fetches
+        every comment and replaces the comments kept in state, which also removes comments whose webhook was lost."""
 
         owner, repo, issue_number = self.get_basic_info()
+        since = None if full else self.state.get("comments_since")
+        comments, pages, changed = self.plugin_inst.github_list(
+            route=f"/repos/{owner}/{repo}/issues/{issue_number}/comments",
+            params={"since": since} if since else None,
+            pages=None if full else self.state.get("comment_pages"),
+            compact=compact_comment,
+        )
+        if not changed:
+            return
+
+        stored = {} if full else self.state.get("comments") or {}
+        for comment in comments:
+            stored[str(comment["id"])] = comment
+        self.state.set("comments", stored)
+        if not full:
+            self.state.set("comment_pages", pages)
+        self.state.set("comments_since", max([since or ""] + [comment["updated_at"] for comment in comments]) or None)
 
-        # Get issue comments
-        comments = self.plugin_inst.github_request(
-            method="get", route=f"/repos/{owner}/{repo}/issues/{issue_number}/comments")
+    def tally_comments(self):
+        """Gets vote data from the issue comments kept in state, looking for text between strings ^^^^ and ^^^^.
+        Only counts the first comment for a given user. Not case sensitive."""
 
-        voter_list = []  #
+        voter_list = []
         votes = Counter()
+        comments = sorted((self.state.get("comments") or {}).values(), key=lambda comment: comment["id"])
         for comment in comments:
-            body, user, user_id = comment["body"], comment["user"]["login"], comment["user"]["id"]
+            user, user_id = comment["user"], comment["user_id"]
             if user in voter_list or user_id == self.state.get("bot_id"):
                 continue
             voter_list.append(user)
-            vote_split = body.split("^^^^")
-            if len(vote_split) >= 3:
-                vote_text = vote_split[1].lower()
-                votes[vote_text] += 1
+            if comment["vote"] is not None:
+                votes[comment["vote"]] += 1
 
         return voter_list, votes
 
+    def receive_comment(self, action_type, comment):
+        """Updates the comments kept in state from an ``issue_comment`` webhook"""
+        if self.state.get("comments") is None:
+            # process started before comments were kept in state
+            self.sync_comments()
+        stored = self.state.get("comments") or {}
+        if action_type == "deleted":
+            stored.pop(str(comment["id"]), None)
+        else:
+            stored[str(comment["id"])] = compact_comment(comment)
+        self.state.set("comments", stored)
+
     def close_vote(self, voter_list, votes):
 
         # Add a comment to the issue declaring the vote closed and show the results.
@@ -316,9 +425,10 @@ class GithubIssueCommentVote(GovernanceProcess):
         self.plugin_inst.github_request(
             method="post", route=f"/repos/{owner}/{repo}/issues/{issue_number}", data={"state": "closed"})
 
-    def close(self, voter_list=None, votes=None):
-        if not voter_list or not votes:
-            voter_list, votes = self.get_vote_data()
+    def close(self):
+        # reconcile with every comment on the issue, in case the webhook for a deleted comment was lost
+        self.sync_comments(full=True)
+        voter_list, votes = self.tally_comments()
         self.close_vote(voter_list, votes)
         self.status = ProcessStatus.COMPLETED.value
         self.save()
@@ -330,6 +440,19 @@ class GithubIssueCommentVote(GovernanceProcess):
         if action_target_type != "issue_comment" or initiator["user_id"] == self.state.get("bot_id"):
             return
         if body["issue"]["number"] == self.state.get("issue_number") and action_type in ["created", "edited", "deleted"]:
-            voter_list, votes = self.get_vote_data()
+            self.receive_comment(action_type, body["comment"])
+            voter_list, votes = self.tally_comments()
             if self.state.get("max_votes") and sum(votes.values()) >= self.state.get("max_votes"):
-                self.close(voter_list, votes)
+                self.close()
+
+
+def compact_comment(comment):
+    """Keep the fields of an issue comment that are needed to count votes"""
+    vote_split = comment["body"].split("^^^^")
+    return {
+        "id": comment["id"],
+        "user": comment["user"]["login"],
+        "user_id": comment["user"]["id"],
+        "vote": vote_split[1].lower() if len(vote_split) >= 3 else None,
+        "updated_at": comment["updated_at"],
+    }
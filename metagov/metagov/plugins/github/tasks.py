@@ -0,0 +1,17 @@
+import logging
+
+from celery import shared_task
+from django.core.cache import cache
+from metagov.plugins.github.utils import token_manager
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_installation_token(installation_id):
+    """Replace an installation access token that's about to expire. Scheduled by ``TokenManager``."""
+    logger.debug(f"Refreshing installation access token for installation {installation_id}")
+    try:
+        token_manager.refresh_installation_token(installation_id)
+    finally:
+        cache.delete(token_manager.refresh_scheduled_key(installation_id))
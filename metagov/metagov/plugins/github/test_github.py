@@ -1,5 +1,12 @@
+import time
+from unittest import mock
+
+import jwt
 import requests_mock
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import cache
 from django.test import TestCase
+from metagov.plugins.github import utils
 from metagov.plugins.github.models import Github, reactions_to_user_lists
 from metagov.tests.plugin_test_utils import PluginTestCase
 from test.support import EnvironmentVarGuard # Python >=3
@@ -27,6 +34,65 @@ class ApiTests(PluginTestCase):
         plugin = Github.objects.first()
         self.assertIsNotNone(plugin)
 
+    def test_list_is_paginated_and_conditional(self):
+        """Lists are fetched page by page, and unchanged pages aren't downloaded again"""
+        plugin = Github.objects.first()
+        url = "https://api.github.com/repos/dummy/r/issues/1/reactions?per_page=100"
+        with requests_mock.Mocker() as m:
+            m.get(url, json=[{"id": 1}], headers={"ETag": '"a"', "Link": f'<{url}&page=2>; rel="next"'})
+            m.get(f"{url}&page=2", json=[{"id": 2}], headers={"ETag": '"b"'})
+            items, pages, changed = plugin.github_list("/repos/dummy/r/issues/1/reactions")
+            self.assertEqual(items, [{"id": 1}, {"id": 2}])
+            self.assertTrue(changed)
+
+            m.get(url, status_code=304)
+            m.get(f"{url}&page=2", json=[{"id": 2}, {"id": 3}], headers={"ETag": '"c"'})
+            items, pages, changed = plugin.github_list("/repos/dummy/r/issues/1/reactions", pages=pages)
+            self.assertEqual(items, [{"id": 1}, {"id": 2}, {"id": 3}])
+            self.assertTrue(changed)
+            self.assertEqual(m.request_history[-2].headers["If-None-Match"], '"a"')
+
+            m.get(f"{url}&page=2", status_code=304)
+            items, pages, changed = plugin.github_list("/repos/dummy/r/issues/1/reactions", pages=pages)
+            self.assertEqual(len(items), 3)
+            self.assertFalse(changed)
+
+    def test_comment_vote_tally(self):
+        """Comment votes are synced incrementally, and updated from webhooks without fetching the comments"""
+        plugin = Github.objects.first()
+        with requests_mock.Mocker() as m:
+            m.post("https://api.github.com/repos/dummy/r/issues", json={"number": 1, "user": {"id": 100}})
+            process = plugin.start_process("issue-comment-vote", repo_name="r", question="q")
+
+            def comment(id, login, body, updated_at):
+                return {"id": id, "user": {"login": login, "id": id}, "body": body, "updated_at": updated_at}
+
+            comments_url = "https://api.github.com/repos/dummy/r/issues/1/comments?per_page=100"
+            m.get(comments_url, json=[comment(1, "alice", "^^^^Yes^^^^", "2021-01-01T00:00:00Z")])
+            self.assertEqual(process.get_vote_data(), (["alice"], {"yes": 1}))
+
+            m.get(
+                f"{comments_url}&since=2021-01-01T00%3A00%3A00Z",
+                json=[comment(2, "bob", "^^^^no^^^^", "2021-01-02T00:00:00Z")],
+            )
+            self.assertEqual(process.get_vote_data(), (["alice", "bob"], {"yes": 1, "no": 1}))
+            self.assertEqual(process.state.get("comments_since"), "2021-01-02T00:00:00Z")
+
+            request_count = m.call_count
+            process.receive_comment("edited", comment(2, "bob", "^^^^yes^^^^", "2021-01-03T00:00:00Z"))
+            process.receive_comment("created", comment(3, "carol", "^^^^no^^^^", "2021-01-03T00:00:00Z"))
+            process.receive_comment("deleted", comment(1, "alice", "", "2021-01-03T00:00:00Z"))
+            self.assertEqual(process.tally_comments(), (["bob", "carol"], {"yes": 1, "no": 1}))
+            self.assertEqual(m.call_count, request_count)
+
+            # closing the vote reconciles with every comment, so a comment whose webhook was lost isn't counted
+            m.get(comments_url, json=[comment(2, "bob", "^^^^yes^^^^", "2021-01-03T00:00:00Z")])
+            m.post("https://api.github.com/repos/dummy/r/issues/1/comments", json={})
+            m.post("https://api.github.com/repos/dummy/r/issues/1", json={})
+            process.close()
+            self.assertEqual(process.tally_comments(), (["bob"], {"yes": 1}))
+            self.assertIn("yes", m.request_history[-2].json()["body"])
+
 
 class UnitTests(TestCase):
     def test_reactions_to_user_lists(self):
@@ -75,3 +141,45 @@ class UnitTests(TestCase):
         yes_votes, no_votes = reactions_to_user_lists(reactions)
         self.assertListEqual(yes_votes, ["foo"])
         self.assertListEqual(no_votes, [])
+
+
+class TokenManagerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.token_manager = utils.TokenManager()
+        self.token_manager._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    @mock.patch.object(utils, "TEST", False)
+    def test_jwt_is_reused_until_it_expires(self):
+        token = self.token_manager.get_jwt()
+        public_key = self.token_manager._private_key.public_key()
+        self.assertEqual(jwt.decode(token, public_key, algorithms=["RS256"])["iss"], utils.APP_ID)
+        self.assertEqual(self.token_manager.get_jwt(), token)
+
+        with mock.patch.object(utils.time, "time", return_value=time.time() + utils.JWT_LIFETIME):
+            self.assertNotEqual(self.token_manager.get_jwt(), token)
+
+    def test_installation_token_is_cached(self):
+        url = "https://api.github.com/app/installations/1/access_tokens"
+        with requests_mock.Mocker() as m:
+            m.post(url, json={"token": "first", "expires_at": "2100-01-01T00:00:00Z"})
+            self.assertEqual(self.token_manager.get_installation_token(1), "first")
+            self.assertEqual(self.token_manager.get_installation_token(1), "first")
+            self.assertEqual(m.call_count, 1)
+
+    def test_installation_token_is_refreshed_before_it_expires(self):
+        url = "https://api.github.com/app/installations/1/access_tokens"
+        expires_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 5 * 60))
+        with requests_mock.Mocker() as m:
+            m.post(url, json={"token": "first", "expires_at": expires_at})
+            self.assertEqual(self.token_manager.get_installation_token(1), "first")
+
+            # the token is about to expire, so it's still used while a new one is requested in the background
+            m.post(url, json={"token": "second", "expires_at": "2100-01-01T00:00:00Z"})
+            with mock.patch("metagov.plugins.github.tasks.refresh_installation_token.delay") as delay:
+                self.assertEqual(self.token_manager.get_installation_token(1), "first")
+                self.assertEqual(self.token_manager.get_installation_token(1), "first")
+            delay.assert_called_once_with(1)
+
+            self.token_manager.refresh_installation_token(1)
+            self.assertEqual(self.token_manager.get_installation_token(1), "second")
@@ -1,8 +1,11 @@
 """ Authentication """
 
-import jwt, datetime, logging, requests
+import jwt, datetime, logging, threading, time
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
 from metagov.core.errors import PluginErrorInternal
+from metagov.core.http import http_client
 
 import sys
 
@@ -14,6 +17,15 @@ github_settings = settings.METAGOV_SETTINGS["GITHUB"]
 PRIVATE_KEY_PATH = github_settings["PRIVATE_KEY_PATH"]
 APP_ID = github_settings["APP_ID"]
 
+# JWTs are valid for up to 10 minutes. Make a new one when the current one has less than a minute left.
+JWT_LIFETIME = 9 * 60
+JWT_REFRESH_MARGIN = 60
+# Installation tokens are valid for an hour. Tokens with less than INSTALLATION_TOKEN_REFRESH_AHEAD seconds left are
+# refreshed in the background, and tokens with less than INSTALLATION_TOKEN_REFRESH_MARGIN seconds left aren't used.
+INSTALLATION_TOKEN_LIFETIME = 60 * 60
+INSTALLATION_TOKEN_REFRESH_AHEAD = 60 * 10
+INSTALLATION_TOKEN_REFRESH_MARGIN = 60
+
 
 def get_private_key():
     with open(PRIVATE_KEY_PATH) as f:
@@ -24,35 +36,102 @@ def get_private_key():
         return "".join(lines)
 
 
+class TokenManager:
+    """Keeps the credentials used to authenticate with GitHub: the JWT that authenticates as the GitHub App, and an
+    installation access token for each installation.
+
+    The private key is loaded and parsed once, and the JWT is reused until shortly before it expires. Installation
+    tokens are cached with their expiry time, so that they're shared by all workers, and are refreshed in the background
+    before they expire."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._private_key = None
+        self._jwt = None
+        self._jwt_expires_at = 0
+
+    def get_jwt(self):
+        if TEST: return ""
+
+        with self._lock:
+            now = int(time.time())
+            if self._jwt is None or self._jwt_expires_at - now < JWT_REFRESH_MARGIN:
+                payload = {
+                    # GitHub App's identifier
+                    "iss": APP_ID,
+                    # issued at time, 60 seconds in the past to allow for clock drift
+                    "iat": now - 60,
+                    # JWT expiration time (10 minute maximum)
+                    "exp": now + JWT_LIFETIME
+                }
+                self._jwt = jwt.encode(payload, self._get_private_key(), algorithm="RS256")
+                self._jwt_expires_at = payload["exp"]
+            return self._jwt
+
+    def get_installation_token(self, installation_id):
+        """Get an installation access token, requesting a new one if there's no cached token that's still valid"""
+        cached = cache.get(self._cache_key(installation_id))
+        remaining = cached["expires_at"] - time.time() if cached else 0
+        if remaining < INSTALLATION_TOKEN_REFRESH_MARGIN:
+            return self.refresh_installation_token(installation_id)
+        if remaining < INSTALLATION_TOKEN_REFRESH_AHEAD:
+            self._schedule_refresh(installation_id)
+        return cached["token"]
+
+    def refresh_installation_token(self, installation_id):
+        """Request a new installation access token from GitHub, and cache it until it expires"""
+        headers = {
+            "Accept": "application/vnd.github.v3+json",
+            "Authorization": f"Bearer {self.get_jwt()}"
+        }
+        url = f"https://api.github.com/app/installations/{installation_id}/access_tokens"
+        resp = http_client.request("POST", url, headers=headers, rate_limit=("github", "app"))
+
+        if not resp.ok:
+            logger.error(f"Error refreshing token: status {resp.status_code}, details: {resp.text}")
+            raise PluginErrorInternal(resp.text)
+        if not resp.content:
+            return None
+
+        data = resp.json()
+        expires_at = parse_datetime(data["expires_at"]).timestamp() if data.get("expires_at") else None
+        expires_at = expires_at or time.time() + INSTALLATION_TOKEN_LIFETIME
+        timeout = int(expires_at - time.time()) - INSTALLATION_TOKEN_REFRESH_MARGIN
+        if timeout > 0:
+            cache.set(self._cache_key(installation_id), {"token": data["token"], "expires_at": expires_at}, timeout)
+        return data["token"]
+
+    def clear_installation_token(self, installation_id):
+        cache.delete(self._cache_key(installation_id))
+
+    def _get_private_key(self):
+        if self._private_key is None:
+            from cryptography.hazmat.primitives import serialization
+
+            self._private_key = serialization.load_pem_private_key(get_private_key().encode("utf-8"), password=None)
+        return self._private_key
+
+    def _schedule_refresh(self, installation_id):
+        from metagov.plugins.github.tasks import refresh_installation_token
+
+        # only schedule one refresh at a time for each installation
+        if cache.add(self.refresh_scheduled_key(installation_id), True, timeout=INSTALLATION_TOKEN_REFRESH_AHEAD):
+            refresh_installation_token.delay(installation_id)
+
+    @staticmethod
+    def _cache_key(installation_id):
+        return f"metagov:github:installation-token:{installation_id}"
+
+    @staticmethod
+    def refresh_scheduled_key(installation_id):
+        return f"metagov:github:installation-token-refresh:{installation_id}"
+
+
+token_manager = TokenManager()
+
+
 def get_jwt():
-    if TEST: return ""
-
-    payload = {
-        # GitHub App's identifier
-        "iss": APP_ID,
-        # issued at time, 60 seconds in the past to allow for clock drift
-        "iat": int(datetime.datetime.now().timestamp()) - 60,
-        # JWT expiration time (10 minute maximum)
-        "exp": int(datetime.datetime.now().timestamp()) + (9 * 60)
-    }
-    return jwt.encode(payload, get_private_key(), algorithm="RS256")
-
-
-def get_access_token(installation_id):
-    """Get installation access token using installation id"""
-    headers = {
-        "Accept": "application/vnd.github.v3+json",
-        "Authorization": f"Bearer {get_jwt()}"
-    }
-    url = f"https://api.github.com/app/installations/{installation_id}/access_tokens"
-    resp = requests.request("POST", url, headers=headers)
-
-    if not resp.ok:
-        logger.error(f"Error refreshing token: status {resp.status_code}, details: {resp.text}")
-        raise PluginErrorInternal(resp.text)
-    if resp.content:
-        token = resp.json()["token"]
-        return token
+    return token_manager.get_jwt()
 
 
 """ Text generation """
@@ -112,4 +191,19 @@ def close_comment_vote_text(voter_list, votes):
         f"This vote is now closed. You may continue commenting, but it will not affect the result.\n\n"
         f"The result was:\n\n{outcome}\n"
         f"People voting: {', '.join(voter_list)}"
-    )
\ No newline at end of file
+    )
+
+
+def issue_routing_key(owner, repo, issue_number):
+    """Routing key for webhooks about an issue, in the form ``owner/repo#number``. GitHub names aren't case sensitive."""
+    return f"{owner}/{repo}#{issue_number}".lower()
+
+
+def get_webhook_issue_routing_key(request):
+    """Get the routing key for the issue that a webhook request is about, if any"""
+    body = request.payload
+    repository, issue = body.get("repository"), body.get("issue")
+    if not repository or not issue:
+        return None
+    owner, repo = repository["full_name"].split("/", 1)
+    return issue_routing_key(owner, repo, issue["number"])
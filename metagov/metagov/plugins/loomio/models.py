@@ -1,14 +1,15 @@
-import json
 import logging
+import re
 
 from metagov.core.plugin_manager import Registry, Parameters, VotingStandard
 import metagov.plugins.loomio.schemas as Schemas
-import requests
 from metagov.core.errors import PluginErrorInternal
 from metagov.core.models import GovernanceProcess, Plugin, ProcessStatus, AuthType
 
 logger = logging.getLogger(__name__)
 
+POLL_URL_KEY_PATTERN = re.compile(r"/p/([^/?#]+)")
+
 
 @Registry.plugin
 class Loomio(Plugin):
@@ -54,7 +55,7 @@ class Loomio(Plugin):
         raise PluginErrorInternal(f"No API key found for Loomio group {key_or_handle}.")
 
     def _get_memberships(self, api_key):
-        resp = requests.get(f"https://www.loomio.org/api/b1/memberships?api_key={api_key}")
+        resp = self.http.get(f"https://www.loomio.org/api/b1/memberships?api_key={api_key}")
         if not resp.ok:
             logger.error(f"Error: {resp.status_code} {resp.text}")
             raise PluginErrorInternal(resp.text)
@@ -86,7 +87,7 @@ class Loomio(Plugin):
         payload = {"title": title, **kwargs}
         payload["api_key"] = self._get_api_key(subgroup)
 
-        resp = requests.post(f"https://www.loomio.org/api/b1/discussions", payload)
+        resp = self.http.post(f"https://www.loomio.org/api/b1/discussions", payload)
         if not resp.ok:
             logger.error(f"Error: {resp.status_code} {resp.text}")
             raise PluginErrorInternal(resp.text)
@@ -124,7 +125,7 @@ class LoomioPoll(GovernanceProcess):
         if parameters.recipient_user_ids:
             payload["recipient_user_ids[]"] = parameters.recipient_user_ids
             payload.pop("recipient_user_ids")
-        resp = requests.post(url, payload)
+        resp = self.plugin_inst.http.post(url, payload)
 
         if not resp.ok:
             logger.error(f"Error: {resp.status_code} {resp.text}")
@@ -139,14 +140,21 @@ class LoomioPoll(GovernanceProcess):
         poll_key = response.get("polls")[0].get("key")
         self.url = f"https://www.loomio.org/p/{poll_key}"
         self.state.set("poll_key", poll_key)
+        self.add_routing_key(poll_key)
         self.outcome = {}
         self.status = ProcessStatus.PENDING.value
         self.save()
 
+    @classmethod
+    def get_webhook_routing_key(cls, request):
+        url = request.payload.get("url")
+        match = url and POLL_URL_KEY_PATTERN.search(url)
+        return match.group(1) if match else None
+
     def receive_webhook(self, request):
         poll_key = self.state.get("poll_key")
 
-        body = json.loads(request.body)
+        body = request.payload
         url = body.get("url")
         if url is None or not url.startswith(self.url):
             return
@@ -164,7 +172,7 @@ class LoomioPoll(GovernanceProcess):
         poll_key = self.state.get("poll_key")
         api_key = self.state.get("poll_api_key")
         url = f"https://www.loomio.org/api/b1/polls/{poll_key}?api_key={api_key}"
-        resp = requests.get(url)
+        resp = self.plugin_inst.http.get(url)
         if not resp.ok:
             logger.error(f"Error fetching poll: {resp.status_code} {resp.text}")
             raise PluginErrorInternal(resp.text)
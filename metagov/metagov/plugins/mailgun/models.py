@@ -1,7 +1,6 @@
 from metagov.core.plugin_manager import AuthorizationType, Registry, Parameters, VotingStandard
 from metagov.core.models import Plugin
 
-import requests
 
 @Registry.plugin
 class Mailgun(Plugin):
@@ -57,7 +56,7 @@ class Mailgun(Plugin):
     )
     def send_message(self, **kwargs):
         # making post request to mailgun api
-        response = requests.post(
+        response = self.http.post(
             url='https://api.mailgun.net/v3/{0}/messages'.format(self.config['domain_name']),
             auth=('api', self.config['api_key']),
             data=kwargs # this is the json set in internal/action/mailgun.send-mail
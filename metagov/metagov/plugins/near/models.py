@@ -129,6 +129,7 @@ class Near(Plugin):
         slug="call",
         description="Makes a contract call which can modify or view state. The master account will be charged a transaction fee.",
         input_schema=Schemas.call_parameters,
+        allow_async=True,
     )
     def call(self, method_name, **kwargs):
         """
@@ -1,10 +1,10 @@
 import logging
-import requests
 from django.conf import settings
 
 import metagov.plugins.opencollective.queries as Queries
 from django.http.response import HttpResponseBadRequest, HttpResponseRedirect
 from metagov.core.errors import PluginAuthError, PluginErrorInternal
+from metagov.core.http import http_client
 from metagov.core.plugin_manager import AuthorizationType
 from metagov.core.models import ProcessStatus
 from metagov.plugins.opencollective.models import OpenCollective, OPEN_COLLECTIVE_URL, OPEN_COLLECTIVE_GRAPHQL
@@ -79,7 +79,7 @@ class OpenCollectiveRequestHandler(PluginRequestHandler):
         user_access_token = response["access_token"]
 
         # Get user info
-        resp = requests.post(
+        resp = http_client.post(
             OPEN_COLLECTIVE_GRAPHQL,
             json={"query": Queries.me},
             headers={"Authorization": f"Bearer {user_access_token}"}
@@ -150,7 +150,7 @@ def _exchange_code(code):
         "code": code,
         "redirect_uri": f"{settings.SERVER_URL}/auth/opencollective/callback",
     }
-    resp = requests.post(f"{OPEN_COLLECTIVE_URL}/oauth/token", data=data)
+    resp = http_client.post(f"{OPEN_COLLECTIVE_URL}/oauth/token", data=data)
     if not resp.ok:
         logger.error(f"OC auth failed: {resp.status_code} {resp.reason}")
         raise PluginAuthError
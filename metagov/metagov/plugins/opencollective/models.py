@@ -1,11 +1,9 @@
-import json
 import logging
 from django.conf import settings
 
 from metagov.core.plugin_manager import Registry, Parameters
 import metagov.plugins.opencollective.queries as Queries
 import metagov.plugins.opencollective.schemas as Schemas
-import requests
 from metagov.core.errors import PluginErrorInternal
 from metagov.core.models import GovernanceProcess, Plugin, ProcessStatus, AuthType
 
@@ -68,7 +66,7 @@ class OpenCollective(Plugin):
         logger.info("Initialized Open Collective: " + str(result))
 
     def run_query(self, query, variables):
-        resp = requests.post(
+        resp = self.http.post(
             OPEN_COLLECTIVE_GRAPHQL,
             json={"query": query, "variables": variables},
             headers={"Authorization": f"Bearer {self.config['access_token']}"},
@@ -169,7 +167,7 @@ class OpenCollective(Plugin):
 
     @Registry.webhook_receiver()
     def process_oc_webhook(self, request):
-        body = json.loads(request.body)
+        body = request.payload
         self.__validate_collective_or_project(body.get("CollectiveId"))
 
         event_type = body.get("type")
@@ -1,15 +1,14 @@
 import hashlib
 import hmac
-import json
 import logging
 
-import requests
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.http.response import HttpResponse, HttpResponseBadRequest, HttpResponseRedirect
 from metagov.core.errors import PluginAuthError, PluginErrorInternal
+from metagov.core.http import http_client
 from metagov.core.handlers import PluginRequestHandler
-from metagov.core.models import LinkQuality, LinkType, ProcessStatus
+from metagov.core.models import LinkQuality, LinkType
 from metagov.core.plugin_manager import AuthorizationType
 from metagov.plugins.slack.models import Slack, SlackEmojiVote, SlackAdvancedVote, ADVANCED_VOTE_ACTION_ID, VOTE_ACTION_ID
 from requests.models import PreparedRequest
@@ -56,30 +55,28 @@ class SlackRequestHandler(PluginRequestHandler):
         """
         # Check if this is an interactivity payload
         # See: https://api.slack.com/interactivity/handling#payloads
-        if request.META["CONTENT_TYPE"] == "application/x-www-form-urlencoded" and request.POST.get("payload"):
-            payload = json.loads(request.POST.get("payload"))
+        if is_interactivity_payload(request):
+            payload = request.payload
             if payload["type"] != "block_actions":
                 return
             team_id = payload["team"]["id"]
             if len(payload["actions"]) > 0:
                 action_id_example = payload["actions"][0]["action_id"]
                 if action_id_example == VOTE_ACTION_ID:
-                    for plugin in Slack.objects.filter(community_platform_id=team_id):
-                        active_emoji_vote_processes = SlackEmojiVote.objects.filter(plugin=plugin, status=ProcessStatus.PENDING.value)
-                        for process in active_emoji_vote_processes:
-                            logger.info(f"Passing Slack interaction to {process}")
-                            process.receive_webhook(request)
+                    process_type = SlackEmojiVote
                 elif action_id_example.startswith(ADVANCED_VOTE_ACTION_ID):
-                    for plugin in Slack.objects.filter(community_platform_id=team_id):
-                        active_advanced_vote_processes = SlackAdvancedVote.objects.filter(plugin=plugin, status=ProcessStatus.PENDING.value)
-                        for process in active_advanced_vote_processes:
-                            logger.info(f"Passing Slack interaction to {process}")
-                            process.receive_webhook(request)
+                    process_type = SlackAdvancedVote
+                else:
+                    return
+                # Only pass the interaction to the process that posted the message
+                for process in process_type.get_webhook_receivers(request, plugin__community_platform_id=team_id):
+                    logger.info(f"Passing Slack interaction to {process}")
+                    process.receive_webhook(request)
             return
 
         # Assume that this is a request from the Slack Events API
         # See: https://api.slack.com/apis/connections/events-api
-        json_data = json.loads(request.body)
+        json_data = request.payload
         if json_data["type"] == "url_verification":
             challenge = json_data.get("challenge")
             return HttpResponse(challenge)
@@ -102,6 +99,19 @@ class SlackRequestHandler(PluginRequestHandler):
                 plugin.receive_event(request)
         return HttpResponse()
 
+    def get_delivery_id(self, request):
+        # Events API requests have an event ID, which stays the same when Slack retries the request
+        if not is_interactivity_payload(request):
+            return request.payload.get("event_id")
+
+    def verify_webhook(self, request):
+        if not is_interactivity_payload(request) and request.payload["type"] == "event_callback":
+            validate_slack_event(request)
+
+    def requires_inline_response(self, request):
+        # Slack expects the challenge in the response body when verifying the request URL
+        return not is_interactivity_payload(request) and request.payload["type"] == "url_verification"
+
     def construct_oauth_authorize_url(self, type: str, community=None):
         if type == AuthorizationType.APP_INSTALL:
             team = None
@@ -149,7 +159,7 @@ class SlackRequestHandler(PluginRequestHandler):
             "client_secret": CLIENT_SECRET,
             "code": code,
         }
-        resp = requests.post("https://slack.com/api/oauth.v2.access", data=data)
+        resp = http_client.post("https://slack.com/api/oauth.v2.access", data=data)
         if not resp.ok:
             logger.error(f"Slack auth failed: {resp.status_code} {resp.reason}")
             raise PluginAuthError
@@ -200,7 +210,7 @@ class SlackRequestHandler(PluginRequestHandler):
             installer_user_token = response["authed_user"].get("access_token")
             if REQUIRE_INSTALLER_TO_BE_ADMIN:
                 # Check whether installing user is an admin. Use the Bot Token to make the request.
-                resp = requests.get(
+                resp = http_client.get(
                     "https://slack.com/api/users.info",
                     params={"user": installer_user_id},
                     headers={"Authorization": f"Bearer {response['access_token']}"},
@@ -296,13 +306,20 @@ def find_plugin(community_platform_id):
     return Slack.objects.filter(community_platform_id=community_platform_id).first()
 
 
+def is_interactivity_payload(request):
+    return request.META["CONTENT_TYPE"] == "application/x-www-form-urlencoded" and request.POST.get("payload")
+
+
 def validate_slack_event(request):
+    if getattr(request, "signature_verified", False):
+        return
     req_timestamp = request.headers.get("X-Slack-Request-Timestamp")
     if req_timestamp is None:
         raise PluginErrorInternal("missing request timestamp")
     req_signature = request.headers.get("X-Slack-Signature")
     if req_signature is None or not verify_signature(request, req_timestamp, req_signature):
         raise PluginErrorInternal("Invalid request signature")
+    request.signature_verified = True
 
 
 def verify_signature(request, timestamp, signature):
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def add_channel_to_routing_keys(apps, schema_editor):
+    """Routing keys for Slack messages used to be just the message timestamp. Prefix them with the channel, which
+    the process kept in its outcome, since timestamps are only unique within a channel."""
+    ProcessRoutingKey = apps.get_model("core", "ProcessRoutingKey")
+    for routing_key in ProcessRoutingKey.objects.filter(plugin__name="slack").select_related("process").iterator():
+        outcome = routing_key.process.outcome
+        channel = outcome.get("channel") if isinstance(outcome, dict) else None
+        if channel and ":" not in routing_key.key:
+            routing_key.key = f"{channel}:{routing_key.key}"
+            routing_key.save(update_fields=["key"])
+
+
+def remove_channel_from_routing_keys(apps, schema_editor):
+    ProcessRoutingKey = apps.get_model("core", "ProcessRoutingKey")
+    for routing_key in ProcessRoutingKey.objects.filter(plugin__name="slack", key__contains=":").iterator():
+        routing_key.key = routing_key.key.split(":", 1)[1]
+        routing_key.save(update_fields=["key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_processroutingkey'),
+        ('metagov_slack', '0003_auto_20210625_1859'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_channel_to_routing_keys, remove_channel_from_routing_keys),
+    ]
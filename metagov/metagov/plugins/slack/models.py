@@ -1,14 +1,19 @@
 import json
 import logging
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from rest_framework.exceptions import ValidationError
 from metagov.core.plugin_manager import Registry, Parameters, VotingStandard
-import requests
 from metagov.core.errors import PluginErrorInternal
 from metagov.core.models import GovernanceProcess, Plugin, ProcessStatus, AuthType
 
 logger = logging.getLogger(__name__)
 
+# seconds to keep a scheduled vote message render marked as scheduled, beyond its countdown
+RENDER_SCHEDULE_GRACE = 60
+
 
 @Registry.plugin
 class Slack(Plugin):
@@ -33,14 +38,15 @@ class Slack(Plugin):
         """
         Passes on ALL received events to the driver
         """
-        json_data = json.loads(request.body)
+        json_data = request.payload
         if json_data["type"] != "event_callback" or json_data["team_id"] != self.config["team_id"]:
             return
 
         # Data types: https://api.slack.com/apis/connections/events-api#the-events-api__receiving-events__events-dispatched-as-json
         # Event list: https://api.slack.com/events
 
-        event = json_data["event"]
+        # copy the event, since the payload is shared with other receivers
+        event = dict(json_data["event"])
 
         # pop off 'type' and 'user' since they are represented separately in metagov-style event
         event_type = event.pop("type")
@@ -97,6 +103,7 @@ class Slack(Plugin):
             "required": ["method_name"],
         },
         description="Perform any Slack method (provided sufficient scopes)",
+        allow_async=True,
     )
     def method(self, method_name, **kwargs):
         """
@@ -126,7 +133,9 @@ class Slack(Plugin):
     def slack_request(self, method, route, json=None, data=None):
         url = f"https://slack.com/api/{route}"
         logger.debug(f"{method} {url}")
-        resp = requests.request(method, url, json=json, data=data)
+        # rate limits apply per workspace, which the token identifies
+        token = (data or {}).get("token") or self.config.get("bot_token")
+        resp = self.http.request(method, url, json=json, data=data, rate_limit=("slack", token))
         if not resp.ok:
             logger.error(f"{resp.status_code} {resp.reason}")
             logger.error(resp.request.body)
@@ -272,16 +281,20 @@ class SlackEmojiVote(GovernanceProcess):
         self.url = permalink_resp["permalink"]
         self.outcome["channel"] = channel
         self.outcome["message_ts"] = ts
+        self.add_routing_key(interaction_routing_key(channel, ts))
 
         self.status = ProcessStatus.PENDING.value
         self.save()
 
+    @classmethod
+    def get_webhook_routing_key(cls, request):
+        return get_interaction_routing_key(request)
+
     def receive_webhook(self, request):
-        payload = json.loads(request.POST.get("payload"))
+        payload = request.payload
         if payload["message"]["ts"] != self.outcome["message_ts"]:
             return
         logger.info(f"{self} received block action")
-        response_url = payload["response_url"]
 
         for a in payload["actions"]:
             if a["action_id"] == VOTE_ACTION_ID:
@@ -299,29 +312,17 @@ class SlackEmojiVote(GovernanceProcess):
 
                 self._cast_vote(user, selected_option)
 
-        # Update vote message to show votes cast
-        blocks = self._construct_blocks()
-        blocks = json.dumps(blocks)
-        requests.post(response_url, json={"replace_original": "true", "blocks": blocks})
+        # Update vote message to show votes cast. Updates are coalesced, so that a burst of votes
+        # only re-renders the message once.
+        schedule_vote_message_render(self)
 
     def _cast_vote(self, user: str, value: str):
-        if not self.outcome["votes"].get(value):
+        if value not in self.outcome["votes"]:
             return False
-        if user in self.outcome["votes"][value]["users"]:
+        # Record the vote in the vote ledger, which updates the vote counts
+        if not self.record_vote(user, value):
             return False
-
-        # Update vote count for selected value
         logger.debug(f"> {user} cast vote for {value}")
-        self.outcome["votes"][value]["users"].append(user)
-        self.outcome["votes"][value]["count"] = len(self.outcome["votes"][value]["users"])
-
-        # If user previously voter for a different option, remove old vote
-        for k, v in self.outcome["votes"].items():
-            if k != value and user in v["users"]:
-                v["users"].remove(user)
-                v["count"] = len(v["users"])
-
-        self.save()
 
     def _is_eligible_voter(self, user):
         eligible_voters = self.state.get("parameters").get("eligible_voters")
@@ -370,18 +371,22 @@ class SlackEmojiVote(GovernanceProcess):
             blocks.append(vote_option_section)
         return blocks
 
-    def close(self):
-        # Set governnace process to completed
-        self.status = ProcessStatus.COMPLETED.value
-
-        # Update vote message to hide voting buttons
-        blocks = self._construct_blocks(hide_buttons=True)
+    def render_message(self, hide_buttons=False):
+        """Update the vote message to show the current votes"""
+        blocks = self._construct_blocks(hide_buttons=hide_buttons)
         self.plugin_inst.method(
             method_name="chat.update",
             channel=self.outcome["channel"],
             ts=self.outcome["message_ts"],
             blocks=json.dumps(blocks),
         )
+
+    def close(self):
+        # Set governnace process to completed
+        self.status = ProcessStatus.COMPLETED.value
+
+        # Update vote message to hide voting buttons
+        self.render_message(hide_buttons=True)
         self.save()
 
 
@@ -471,12 +476,17 @@ class SlackAdvancedVote(GovernanceProcess):
         self.url = permalink_resp["permalink"]
         self.outcome["channel"] = channel
         self.outcome["message_ts"] = ts
+        self.add_routing_key(interaction_routing_key(channel, ts))
 
         self.status = ProcessStatus.PENDING.value
         self.save()
     
+    @classmethod
+    def get_webhook_routing_key(cls, request):
+        return get_interaction_routing_key(request)
+
     def receive_webhook(self, request):
-        payload = json.loads(request.POST.get("payload"))
+        payload = request.payload
         
         if payload["message"]["ts"] != self.outcome["message_ts"]:
             return
@@ -555,4 +565,34 @@ class SlackAdvancedVote(GovernanceProcess):
     def close(self):
         # Set governnace process to completed
         self.status = ProcessStatus.COMPLETED.value
-        self.save()
\ No newline at end of file
+        self.save()
+
+
+def interaction_routing_key(channel, ts):
+    """Routing key for a message. Timestamps are only unique within a channel, so the key includes the channel."""
+    return f"{channel}:{ts}"
+
+
+def get_interaction_routing_key(request):
+    """Get the routing key of the message that an interactivity payload is about"""
+    payload = request.payload
+    channel = payload.get("channel", {}).get("id") or payload.get("container", {}).get("channel_id")
+    ts = payload.get("message", {}).get("ts")
+    if not channel or not ts:
+        return None
+    return interaction_routing_key(channel, ts)
+
+
+def schedule_vote_message_render(process):
+    """Schedule a re-render of a vote message, at most once every ``SLACK_VOTE_RENDER_INTERVAL`` seconds.
+    If a render is already scheduled, it will show this change too, because it renders the latest votes."""
+    from metagov.plugins.slack.tasks import render_vote_message
+
+    interval = getattr(settings, "SLACK_VOTE_RENDER_INTERVAL", 2)
+    # the key expires in case the scheduled render is lost, so that later votes can schedule another one
+    if cache.add(render_scheduled_key(process.pk), True, timeout=interval + RENDER_SCHEDULE_GRACE):
+        transaction.on_commit(lambda: render_vote_message.apply_async(args=(process.pk,), countdown=interval))
+
+
+def render_scheduled_key(process_id):
+    return f"metagov:slack-vote-render:{process_id}"
@@ -0,0 +1,21 @@
+import logging
+
+from celery import shared_task
+from django.core.cache import cache
+from metagov.core.models import ProcessStatus
+from metagov.plugins.slack.models import SlackEmojiVote, render_scheduled_key
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def render_vote_message(process_id):
+    """Update a vote message to show the latest votes. Scheduled by ``schedule_vote_message_render``."""
+    # clear the flag before reading the votes, so that votes cast during the render schedule another one
+    cache.delete(render_scheduled_key(process_id))
+    process = SlackEmojiVote.objects.filter(pk=process_id, status=ProcessStatus.PENDING.value).first()
+    if not process:
+        # the process was closed, which renders the final votes
+        return
+    logger.debug(f"Rendering vote message for {process}")
+    process.render_message()
@@ -1,6 +1,11 @@
+import json
+from unittest import mock
+from urllib.parse import urlencode
+
 import requests_mock
+from django.core.cache import cache
 from django.test import TestCase
-from metagov.plugins.slack.models import Slack
+from metagov.plugins.slack.models import VOTE_ACTION_ID, Slack
 from metagov.tests.plugin_test_utils import PluginTestCase
 
 
@@ -14,3 +19,66 @@ class ApiTests(PluginTestCase):
         """Plugin is properly initialized"""
         plugin = Slack.objects.first()
         self.assertIsNotNone(plugin)
+
+
+class VoteMessageRenderTests(PluginTestCase):
+    def setUp(self):
+        cache.clear()
+        self.enable_plugin(
+            name="slack", config={"team_id": "123", "team_name": "test", "bot_token": "empty", "bot_user-id": "001"}
+        )
+        self.plugin = Slack.objects.first()
+        with mock.patch.object(Slack, "post_message", return_value={"ts": "1.1", "channel": "C1"}), mock.patch.object(
+            Slack, "method", return_value={"permalink": "https://slack.test/p1"}
+        ):
+            self.process = self.plugin.start_process("emoji-vote", title="vote", poll_type="boolean", channel="C1")
+
+    def click(self, user, option, channel="C1"):
+        payload = {
+            "type": "block_actions",
+            "team": {"id": "123"},
+            "user": {"id": user},
+            "channel": {"id": channel},
+            "message": {"ts": "1.1"},
+            "response_url": "https://slack.test/response",
+            "actions": [{"action_id": VOTE_ACTION_ID, "value": option}],
+        }
+        return self.client.post(
+            "/api/hooks/slack",
+            data=urlencode({"payload": json.dumps(payload)}),
+            content_type="application/x-www-form-urlencoded",
+        )
+
+    def test_renders_are_coalesced(self):
+        with mock.patch.object(Slack, "method") as method:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.click("alice", "yes")
+                self.click("bob", "no")
+            # nothing is rendered on the request path, and only one render is scheduled
+            method.assert_not_called()
+            self.assertEqual(len(callbacks), 1)
+
+            callbacks[0]()
+            method.assert_called_once()
+            self.assertEqual(method.call_args.kwargs["method_name"], "chat.update")
+            # the render shows both votes
+            blocks = method.call_args.kwargs["blocks"]
+            self.assertIn("<@alice>", blocks)
+            self.assertIn("<@bob>", blocks)
+
+            # once it has been rendered, the next vote schedules another render
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.click("carol", "yes")
+            self.assertEqual(len(callbacks), 1)
+
+    def test_interactions_are_routed_by_channel_and_timestamp(self):
+        # a message in another channel can have the same timestamp
+        with mock.patch.object(Slack, "post_message", return_value={"ts": "1.1", "channel": "C2"}), mock.patch.object(
+            Slack, "method", return_value={"permalink": "https://slack.test/p2"}
+        ):
+            other = self.plugin.start_process("emoji-vote", title="vote", poll_type="boolean", channel="C2")
+
+        with mock.patch.object(Slack, "method"), self.captureOnCommitCallbacks():
+            self.click("alice", "yes", channel="C2")
+        self.assertEqual(list(other.votes.values_list("voter", flat=True)), ["alice"])
+        self.assertFalse(self.process.votes.exists())
@@ -2,7 +2,6 @@ import logging
 from typing import Dict, Optional
 
 from metagov.core.plugin_manager import Registry
-import requests
 from metagov.core.errors import PluginErrorInternal
 from metagov.core.models import Plugin
 
@@ -86,7 +85,7 @@ class SourceCred(Plugin):
 
     def fetch_accounts_analysis(self):
         server = self.config["server_url"]
-        resp = requests.get(f"{server}/output/accounts.json")
+        resp = self.http.get(f"{server}/output/accounts.json")
         if resp.status_code == 404:
             raise PluginErrorInternal(
                 "'output/accounts.json' file not present. Run 'yarn sourcecred analysis' when generating sourcecred instance."
@@ -1,7 +1,6 @@
 from metagov.core.plugin_manager import AuthorizationType, Registry, Parameters, VotingStandard
 from metagov.core.models import Plugin
 
-import requests
 
 @Registry.plugin
 class TSC(Plugin):
@@ -30,7 +29,7 @@ class TSC(Plugin):
     )
     def get_user(self, user_id):
         url = self.config['server_url'] + '/api/user/' + user_id
-        response = requests.get(url)
+        response = self.http.get(url)
 
         return response.json()
 
@@ -48,7 +47,7 @@ class TSC(Plugin):
     )
     def get_contract(self, contract_id):
         url = self.config['server_url'] + '/api/contract/' + contract_id
-        response = requests.get(url)
+        response = self.http.get(url)
 
         return response.json()
     
@@ -65,7 +64,7 @@ class TSC(Plugin):
     )
     def get_execution(self, execution_id):
         url = self.config['server_url'] + '/api/execution/' + execution_id
-        response = requests.get(url)
+        response = self.http.get(url)
 
         return response.json()
     
@@ -82,6 +81,6 @@ class TSC(Plugin):
     )
     def get_agreement(self, agreement_id):
         url = self.config['server_url'] + '/api/agreement/' + agreement_id
-        response = requests.get(url)
+        response = self.http.get(url)
 
         return response.json()
@@ -0,0 +1,17 @@
+import datetime
+
+from django.test import SimpleTestCase
+from metagov.core import codecs
+
+
+class CodecTests(SimpleTestCase):
+    def test_plain_values_are_stored_as_json(self):
+        value = {"options": ["yes", "no"], "count": 2, "ratio": 0.5, "open": True, "closed_at": None}
+        self.assertIs(codecs.encode(value), value)
+        self.assertIs(codecs.decode(value), value)
+
+    def test_other_values_fall_back_to_jsonpickle(self):
+        for value in [{1, 2}, ("a", "b"), [datetime.date(2021, 1, 1)]]:
+            encoded = codecs.encode(value)
+            self.assertEqual(list(encoded), [codecs.PICKLED_KEY])
+            self.assertEqual(codecs.decode(encoded), value)
@@ -1,6 +1,18 @@
-from django.test import Client, TestCase
-from metagov.core.models import Community, GovernanceProcess, Plugin
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+import requests_mock
+from django.core.cache import cache
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from metagov.core import lookups
+from metagov.core.app import MetagovApp
+from metagov.core.errors import PluginErrorInternal
+from metagov.core.http import RateLimitExceeded
+from metagov.core.models import ActionJob, Community, GovernanceProcess, Plugin
 from metagov.core.signals import governance_process_updated
+from metagov.core.tasks import run_action_job, sweep_action_jobs
 from metagov.plugins.example.models import Randomness, StochasticVote
 from metagov.plugins.sourcecred.models import SourceCred
 from .plugin_test_utils import catch_signal
@@ -35,6 +47,23 @@ class UnitTests(TestCase):
         self.assertEqual(params.numeric, 8)
         self.assertDictEqual(params._json, values)
 
+    def test_validators_are_compiled_once(self):
+        """Validators are compiled once per schema, and raise jsonschema ValidationErrors"""
+        import jsonschema
+        from metagov.core.validators import get_validator
+
+        meta = Randomness._action_registry["random-int"]
+        self.assertIs(get_validator(meta.input_schema), meta.input_validator)
+
+        schema = {"properties": {"count": {"type": "integer", "default": 1}}, "required": ["name"]}
+        validator = get_validator(schema, fill_defaults=True)
+        self.assertIs(get_validator(schema, fill_defaults=True), validator)
+        values = {"name": "x"}
+        validator.validate(values)
+        self.assertEqual(values, {"name": "x", "count": 1})
+        with self.assertRaises(jsonschema.exceptions.ValidationError):
+            validator.validate({"count": 2})
+
 
 class ApiTests(TestCase):
     def setUp(self):
@@ -194,3 +223,157 @@ class ApiTests(TestCase):
         data["plugins"].pop()
         response = client.put(url, data=data, content_type="application/json")
         self.assertEqual(Plugin.objects.filter(community=community).count(), 0)
+
+
+class BatchActionTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        lookups.lookup_cache.clear()
+        community = MetagovApp().create_community(slug="batch")
+        community.enable_plugin("randomness", {"default_low": 2, "default_high": 200})
+        self.headers = {"HTTP_X_METAGOV_COMMUNITY": "batch"}
+
+    def perform_batch(self, actions):
+        return self.client.post(
+            "/api/internal/actions/batch", data={"actions": actions}, content_type="application/json", **self.headers
+        )
+
+    def test_batch(self):
+        actions = [
+            {"plugin": "randomness", "action": "random-int", "parameters": {"low": 1, "high": 2}},
+            {"plugin": "randomness", "action": "random-int", "parameters": {"low": "one"}},
+            {"plugin": "randomness", "action": "nonexistent"},
+            {"plugin": "sourcecred", "action": "user-cred", "parameters": {"username": "x"}},
+        ]
+        for concurrency in [1, 4]:
+            with override_settings(ACTION_BATCH_CONCURRENCY=concurrency):
+                response = self.perform_batch(actions)
+            self.assertEqual(response.status_code, 200)
+            results = response.json()["results"]
+            self.assertEqual(results[0], {"status": 200, "result": {"value": 1}})
+            self.assertEqual(results[1], {"status": 400, "error": "'one' is not of type 'integer'"})
+            self.assertEqual(results[2], {"status": 400, "error": "No such action 'randomness.nonexistent'"})
+            self.assertEqual(results[3]["status"], 400)
+            self.assertIn("not enabled", results[3]["error"])
+
+    @override_settings(ACTION_BATCH_MAX_SIZE=2)
+    def test_invalid_batch(self):
+        self.assertEqual(self.perform_batch(None).status_code, 400)
+        action = {"plugin": "randomness", "action": "random-int"}
+        self.assertEqual(self.perform_batch([action] * 3).status_code, 400)
+
+
+class ActionJobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        lookups.lookup_cache.clear()
+        self.community = MetagovApp().create_community(slug="jobs")
+        self.community.enable_plugin("randomness", {"default_low": 2, "default_high": 200})
+        self.headers = {"HTTP_X_METAGOV_COMMUNITY": "jobs"}
+
+    def perform_action(self, slug, data):
+        return self.client.post(
+            f"/api/internal/action/randomness.{slug}", data=data, content_type="application/json", **self.headers
+        )
+
+    def test_async_action(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.perform_action("random-int", {"parameters": {"low": 1, "high": 2}, "async": True})
+        self.assertEqual(response.status_code, 202)
+        job = ActionJob.objects.get()
+        self.assertEqual(response.json()["id"], str(job.pk))
+        self.assertEqual(response["Location"], f"/api/internal/action/jobs/{job.pk}")
+
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "completed")
+        self.assertEqual(response.json()["result"], {"value": 1})
+
+        # synchronous requests aren't queued
+        response = self.perform_action("random-int", {"parameters": {"low": 1, "high": 2}})
+        self.assertEqual(response.json(), {"value": 1})
+        self.assertEqual(ActionJob.objects.count(), 1)
+
+        self.assertEqual(self.client.get(f"/api/internal/action/jobs/{uuid.uuid4()}").status_code, 404)
+
+    def test_invalid_async_action(self):
+        # only actions that allow it can be performed asynchronously
+        response = self.perform_action("set-lucky-number", {"parameters": {"lucky_number": 3}, "async": True})
+        self.assertEqual(response.status_code, 400)
+        # parameters are validated before the job is queued
+        response = self.perform_action("random-int", {"parameters": {"low": "one"}, "async": True})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ActionJob.objects.exists())
+        with self.assertRaises(ValueError):
+            self.community.perform_action("randomness", "set-lucky-number", {"lucky_number": 3}, run_async=True)
+
+    def test_failed_job(self):
+        with mock.patch.object(Randomness, "rand_int", side_effect=PluginErrorInternal("Platform is down")):
+            with self.captureOnCommitCallbacks(execute=True):
+                job = self.community.perform_action("randomness", "random-int", run_async=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.error, {"status": 500, "detail": "Platform is down"})
+        self.assertIsNotNone(job.finished_at)
+
+    def test_rate_limited_job(self):
+        job = self.community.perform_action("randomness", "random-int", run_async=True)
+        with mock.patch.object(Randomness, "rand_int", side_effect=RateLimitExceeded(retry_after=5)):
+            with mock.patch.object(run_action_job, "apply_async") as apply_async:
+                run_action_job(str(job.pk))
+        job.refresh_from_db()
+        self.assertEqual(job.status, "pending")
+        apply_async.assert_called_once_with(args=(str(job.pk),), countdown=5)
+
+    @override_settings(ACTION_JOB_MAX_ATTEMPTS=2)
+    def test_rate_limit_retries_are_capped(self):
+        job = self.community.perform_action("randomness", "random-int", run_async=True)
+        with mock.patch.object(Randomness, "rand_int", side_effect=RateLimitExceeded(retry_after=5)):
+            with mock.patch.object(run_action_job, "apply_async") as apply_async:
+                run_action_job(str(job.pk))
+                run_action_job(str(job.pk))
+        apply_async.assert_called_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.error["status"], 429)
+
+    def test_sweep(self):
+        stale = self.community.perform_action("randomness", "random-int", run_async=True)
+        ActionJob.objects.filter(pk=stale.pk).update(next_attempt_at=timezone.now() - timedelta(minutes=5))
+        stuck = self.community.perform_action("randomness", "random-int", run_async=True)
+        ActionJob.objects.filter(pk=stuck.pk).update(
+            status="running", started_at=timezone.now() - timedelta(hours=1)
+        )
+        # queued just now, so its own task is still on the way
+        fresh = self.community.perform_action("randomness", "random-int", run_async=True)
+
+        with mock.patch.object(run_action_job, "delay") as delay:
+            sweep_action_jobs()
+        delay.assert_called_once_with(str(stale.pk))
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, "failed")
+        self.assertEqual(stuck.error["status"], 504)
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, "pending")
+
+        # a worker that finishes after the job timed out doesn't overwrite the error
+        self.assertFalse(stuck.finish("completed", result={"value": 1}))
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, "failed")
+
+    def test_callback(self):
+        with requests_mock.Mocker() as m:
+            m.post("http://driver.example/callback")
+            with self.captureOnCommitCallbacks(execute=True):
+                job = self.community.perform_action(
+                    "randomness",
+                    "random-int",
+                    {"low": 4, "high": 5},
+                    run_async=True,
+                    callback_url="http://driver.example/callback",
+                )
+            self.assertEqual(m.call_count, 1)
+            body = m.last_request.json()
+            self.assertEqual(body["id"], str(job.pk))
+            self.assertEqual(body["status"], "completed")
+            self.assertEqual(body["result"], {"value": 4})
@@ -1,9 +1,20 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
 import jsonschema
 from django.db import IntegrityError
-from django.test import TestCase
+from celery.exceptions import Retry
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from metagov.core.app import MetagovApp
+from metagov.core import lookups
 from metagov.core.handlers import MetagovRequestHandler
+from metagov.core.models import Community, DataStore, GovernanceProcess, Plugin
 from metagov.core.signals import governance_process_updated, platform_event_created
+from metagov.core.tasks import _acquire_plugin_task_slot, execute_plugin_tasks, run_plugin_tasks
+from metagov.plugins.example.models import Randomness, StochasticVote
 from .plugin_test_utils import catch_signal
 
 TEST_SLUG = "xyz"
@@ -91,3 +102,320 @@ class MetagovRequestHandlerTests(TestCase):
 
         handler = self.handler._get_plugin_request_handler("sourcecred")
         self.assertIsNone(handler)
+
+
+class ExecutePluginTasksTests(TestCase):
+    def setUp(self):
+        community = MetagovApp().create_community(slug="xyz")
+        community.enable_plugin("randomness", {"default_low": 10, "default_high": 100})
+        self.plugin = community.get_plugin("randomness")
+
+    def test_only_due_processes_are_updated(self):
+        process = self.plugin.start_process("delayed-stochastic-vote", options=["one", "two"], delay=1)
+        not_due = self.plugin.start_process("delayed-stochastic-vote", options=["one", "two"], delay=10)
+        GovernanceProcess.objects.filter(pk=not_due.pk).update(next_run_at=timezone.now() + timedelta(minutes=1))
+
+        with mock.patch.object(StochasticVote, "update", autospec=True) as update:
+            execute_plugin_tasks()
+            self.assertEqual([call.args[0].pk for call in update.call_args_list], [process.pk])
+
+            # the next update is scheduled for the closing time, which is sooner than the default interval
+            process.refresh_from_db()
+            self.assertEqual(process.next_run_at, process.state.get("closing_at"))
+
+            # nothing is due anymore
+            execute_plugin_tasks()
+            self.assertEqual(update.call_count, 1)
+
+    def test_plugin_task_is_scheduled(self):
+        with mock.patch.object(Randomness, "my_task_function", autospec=True) as task:
+            execute_plugin_tasks()
+            execute_plugin_tasks()
+            task.assert_called_once()
+
+        self.plugin.refresh_from_db()
+        self.assertGreater(self.plugin.next_run_at, timezone.now())
+
+    @override_settings(PLUGIN_TASK_CHUNK_SIZE=2)
+    def test_fans_out_in_chunks(self):
+        process_ids = [
+            self.plugin.start_process("delayed-stochastic-vote", options=["one", "two"], delay=10).pk for i in range(3)
+        ]
+        with mock.patch.object(run_plugin_tasks, "apply_async") as apply_async:
+            execute_plugin_tasks()
+        self.assertEqual(
+            [call.kwargs["args"][:4] for call in apply_async.call_args_list],
+            [
+                ("randomness", self.plugin.pk, process_ids[:2], True),
+                ("randomness", self.plugin.pk, process_ids[2:], False),
+            ],
+        )
+
+    @override_settings(PLUGIN_TASK_TIME_LIMIT=0.1)
+    def test_slow_update_does_not_hold_up_chunk(self):
+        processes = [
+            self.plugin.start_process("delayed-stochastic-vote", options=["one", "two"], delay=10) for i in range(2)
+        ]
+        GovernanceProcess.objects.update(next_run_at=timezone.now())
+        updated = []
+
+        def update(process):
+            if process.pk == processes[0].pk:
+                time.sleep(5)
+            updated.append(process.pk)
+
+        with mock.patch.object(StochasticVote, "update", autospec=True, side_effect=update):
+            start = time.monotonic()
+            execute_plugin_tasks()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual(updated, [processes[1].pk])
+
+    @override_settings(PLUGIN_TASK_CONCURRENCY={"randomness": 1})
+    def test_waits_for_concurrency_slot(self):
+        self.plugin.start_process("delayed-stochastic-vote", options=["one", "two"], delay=10)
+        slot = _acquire_plugin_task_slot("randomness", timeout=60)
+        self.addCleanup(cache.delete, slot)
+
+        with mock.patch.object(StochasticVote, "update") as update, mock.patch.object(
+            run_plugin_tasks, "retry", side_effect=Retry()
+        ) as retry:
+            execute_plugin_tasks()
+            update.assert_not_called()
+            retry.assert_called_once()
+
+    def test_leased_processes_are_not_handed_out_twice(self):
+        process = self.plugin.start_process("delayed-stochastic-vote", options=["one", "two"], delay=10)
+        with mock.patch.object(run_plugin_tasks, "apply_async") as apply_async:
+            execute_plugin_tasks()
+            (args,) = [call.kwargs["args"] for call in apply_async.call_args_list if call.kwargs["args"][2]]
+
+            # an overlapping run finds the process due, but can't claim it while the lease is held
+            GovernanceProcess.objects.filter(pk=process.pk).update(next_run_at=timezone.now())
+            apply_async.reset_mock()
+            execute_plugin_tasks()
+            self.assertFalse(any(call.kwargs["args"][2] for call in apply_async.call_args_list))
+
+        with mock.patch.object(StochasticVote, "update") as update:
+            run_plugin_tasks(*args)
+            update.assert_called_once()
+
+            # the lease is released after the update, so running the same work again does nothing
+            run_plugin_tasks(*args)
+            update.assert_called_once()
+
+        process.refresh_from_db()
+        self.assertIsNone(process.lease_token)
+
+    def test_polling_backs_off_while_process_is_unchanged(self):
+        process = self.plugin.start_process("delayed-stochastic-vote", options=["one", "two"], delay=60 * 24)
+
+        def run_update():
+            GovernanceProcess.objects.filter(pk=process.pk).update(next_run_at=timezone.now())
+            execute_plugin_tasks()
+            process.refresh_from_db()
+            return process.poll_interval
+
+        with mock.patch.object(StochasticVote, "update", autospec=True) as update:
+            self.assertEqual(run_update(), 60 * 3 * 2)
+            self.assertEqual(run_update(), 60 * 3 * 4)
+
+            # an update that changes the outcome resets the interval
+            def change_outcome(process):
+                process.outcome = {"votes": len(process.outcome.get("votes", [])) + 1}
+                process.save()
+
+            update.side_effect = change_outcome
+            self.assertEqual(run_update(), 60 * 3)
+
+            # including an update that changes the outcome in place
+            update.side_effect = None
+            self.assertEqual(run_update(), 60 * 3 * 2)
+
+            def change_outcome_in_place(process):
+                process.outcome["votes"] += 1
+                process.save()
+
+            update.side_effect = change_outcome_in_place
+            self.assertEqual(run_update(), 60 * 3)
+
+        # so does any other change to the process, for example from a webhook
+        GovernanceProcess.objects.filter(pk=process.pk).update(
+            poll_interval=60 * 60, next_run_at=timezone.now() + timedelta(hours=1)
+        )
+        process.outcome = {"votes": 10}
+        process.save()
+        process.refresh_from_db()
+        self.assertEqual(process.poll_interval, 60 * 3)
+        self.assertLess(process.next_run_at, timezone.now() + timedelta(minutes=4))
+
+    def test_saving_process_keeps_lease(self):
+        process = self.plugin.start_process("delayed-stochastic-vote", options=["one", "two"], delay=10)
+        plugin = Plugin.objects.get(pk=self.plugin.pk)
+        with mock.patch.object(run_plugin_tasks, "apply_async"):
+            GovernanceProcess.objects.filter(pk=process.pk).update(next_run_at=timezone.now())
+            execute_plugin_tasks()
+
+        # copies loaded before the scheduler claimed the rows, for example by a webhook, don't release the lease
+        process.state.set("foo", "bar")
+        process.save()
+        plugin.config = {"default_low": 1, "default_high": 2}
+        plugin.save()
+        process.refresh_from_db()
+        plugin.refresh_from_db()
+        self.assertIsNotNone(process.lease_token)
+        self.assertIsNotNone(plugin.lease_token)
+        self.assertEqual(plugin.config, {"default_low": 1, "default_high": 2})
+
+
+class VoteLedgerTests(TestCase):
+    def setUp(self):
+        community = MetagovApp().create_community(slug="xyz")
+        community.enable_plugin("randomness", {"default_low": 10, "default_high": 100})
+        plugin = community.get_plugin("randomness")
+        self.process = plugin.start_process("delayed-stochastic-vote", options=["one", "two"], delay=10)
+
+    def test_record_vote(self):
+        self.assertTrue(self.process.record_vote("alice", "one"))
+        self.assertTrue(self.process.record_vote("bob", "one"))
+        # voting for the same option again doesn't change anything
+        self.assertFalse(self.process.record_vote("alice", "one"))
+        # voting for another option replaces the previous vote
+        self.assertTrue(self.process.record_vote("alice", "two"))
+
+        self.assertEqual(
+            self.process.get_vote_tally(["one", "two"]),
+            {"one": {"users": ["bob"], "count": 1}, "two": {"users": ["alice"], "count": 1}},
+        )
+        self.assertEqual(self.process.votes.count(), 2)
+
+    def test_record_vote_updates_tally(self):
+        self.process.outcome = {"votes": {"one": {"users": ["carol"], "count": 1}, "two": {"users": [], "count": 0}}}
+        self.process.save()
+        self.process.record_vote("alice", "one")
+        self.process.record_vote("alice", "two")
+        self.process.record_vote("bob", "one")
+
+        self.process.refresh_from_db()
+        self.assertEqual(
+            self.process.outcome["votes"],
+            {"one": {"users": ["carol", "bob"], "count": 2}, "two": {"users": ["alice"], "count": 1}},
+        )
+
+    def test_save_vote_tally(self):
+        self.process.record_vote("alice", "two")
+        with catch_signal(governance_process_updated) as handler:
+            self.process.save_vote_tally(["one", "two"])
+            handler.assert_called_once()
+
+        self.process.refresh_from_db()
+        self.assertEqual(self.process.outcome["votes"]["two"], {"users": ["alice"], "count": 1})
+
+
+class DataStoreTests(TestCase):
+    def setUp(self):
+        self.datastore = DataStore.objects.create()
+
+    def test_get_and_set(self):
+        self.datastore.set("numbers", {1, 2})
+        self.datastore.set_many({"a": {"b": [1, 2]}, "c": None})
+        self.assertEqual(self.datastore.get("numbers"), {1, 2})
+
+        datastore = DataStore.objects.get(pk=self.datastore.pk)
+        self.assertEqual(
+            datastore.get_many(["numbers", "a", "c", "d"]),
+            {"numbers": {1, 2}, "a": {"b": [1, 2]}, "c": None, "d": None},
+        )
+        # values are loaded once
+        with self.assertNumQueries(0):
+            datastore.get("a")
+
+        self.assertTrue(datastore.remove("a"))
+        self.assertFalse(datastore.remove("a"))
+        self.assertIsNone(DataStore.objects.get(pk=self.datastore.pk).get("a"))
+
+    def test_values_are_copied(self):
+        self.datastore.set("a", [1])
+        self.datastore.get("a").append(2)
+        self.assertEqual(self.datastore.get("a"), [1])
+
+        value = {"b": 1}
+        self.datastore.set("b", value)
+        value["b"] = 99
+        self.assertEqual(self.datastore.get("b"), {"b": 1})
+
+    def test_set_writes_one_entry(self):
+        self.datastore.set_many({"a": 1, "b": 2})
+        self.datastore.set("a", 3)
+        self.assertEqual(self.datastore.entries.get(key="a").value, 3)
+        self.assertEqual(self.datastore.entries.get(key="b").value, 2)
+
+
+@override_settings(LOOKUP_CACHE_ENABLED=True)
+class LookupCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        lookups.lookup_cache.clear()
+        self.app = MetagovApp()
+        community = self.app.create_community(slug=TEST_SLUG)
+        community.enable_plugin("randomness", {"default_low": 10, "default_high": 100})
+
+    def test_repeated_lookups_are_cached(self):
+        self.app.get_community(TEST_SLUG).get_plugin("randomness").state.get("lucky_number")
+        with self.assertNumQueries(1):
+            plugin = self.app.get_community(TEST_SLUG).get_plugin("randomness")
+            self.assertIsInstance(plugin, Randomness)
+            self.assertEqual(plugin.config["default_low"], 10)
+            self.assertEqual(plugin.community.slug, TEST_SLUG)
+            # only the state entry is read from the database
+            plugin.state.get("lucky_number")
+
+        # the in-process cache is backed by the shared cache
+        lookups.lookup_cache.clear()
+        with self.assertNumQueries(0):
+            self.app.get_community(TEST_SLUG).get_plugin("randomness")
+
+    def test_changes_invalidate_lookups(self):
+        community = self.app.get_community(TEST_SLUG)
+        plugin = community.get_plugin("randomness")
+        plugin.config["default_low"] = 20
+        plugin.save()
+        self.assertEqual(community.get_plugin("randomness").config["default_low"], 20)
+
+        Community.objects.filter(slug=TEST_SLUG).update(readable_name="stale")
+        self.assertEqual(self.app.get_community(TEST_SLUG).readable_name, "")
+        community.readable_name = "new name"
+        community.save()
+        self.assertEqual(self.app.get_community(TEST_SLUG).readable_name, "new name")
+
+        plugin.delete()
+        with self.assertRaises(Plugin.DoesNotExist):
+            community.get_plugin("randomness")
+        community.delete()
+        with self.assertRaises(Community.DoesNotExist):
+            self.app.get_community(TEST_SLUG)
+
+    def test_instances_do_not_share_values(self):
+        first = self.app.get_community(TEST_SLUG).get_plugin("randomness")
+        first.config["default_low"] = 20
+        second = self.app.get_community(TEST_SLUG).get_plugin("randomness")
+        self.assertEqual(second.config["default_low"], 10)
+
+    def test_renaming_invalidates_old_slug(self):
+        community = self.app.get_community(TEST_SLUG)
+        community.slug = "renamed"
+        community.save()
+        with self.assertRaises(Community.DoesNotExist):
+            self.app.get_community(TEST_SLUG)
+        self.assertEqual(self.app.get_community("renamed").pk, community.pk)
+
+    def test_scheduler_fields_are_not_cached(self):
+        self.app.get_community(TEST_SLUG).get_plugin("randomness")
+        next_run_at = timezone.now() + timedelta(hours=1)
+        Plugin.objects.filter(community__slug=TEST_SLUG).update(next_run_at=next_run_at)
+        self.assertEqual(self.app.get_community(TEST_SLUG).get_plugin("randomness").next_run_at, next_run_at)
+
+    @override_settings(LOOKUP_CACHE_ENABLED=False)
+    def test_lookups_are_not_cached_without_shared_cache(self):
+        self.app.get_community(TEST_SLUG)
+        Community.objects.filter(slug=TEST_SLUG).update(readable_name="changed")
+        self.assertEqual(self.app.get_community(TEST_SLUG).readable_name, "changed")
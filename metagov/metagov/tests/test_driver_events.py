@@ -0,0 +1,309 @@
+import gzip
+import json
+from datetime import timedelta
+from unittest import mock
+
+import requests_mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from metagov.core.app import MetagovApp
+from metagov.core.models import Community, DriverEvent, DriverEventStatus
+from metagov.core.tasks import deliver_driver_events, prune_driver_events
+
+RECEIVER_URL = "http://driver.test/events"
+
+
+@override_settings(DRIVER_EVENT_RECEIVER_URL=RECEIVER_URL, DRIVER_EVENT_MAX_ATTEMPTS=2)
+class DriverEventOutboxTests(TestCase):
+    def setUp(self):
+        community = MetagovApp().create_community(slug="xyz")
+        community.enable_plugin("randomness", {"default_low": 10, "default_high": 100})
+        self.plugin = community.get_plugin("randomness")
+
+    def send_event(self):
+        self.plugin.send_event_to_driver(event_type="test", data={"foo": "bar"}, initiator={"user": "abc"})
+        return DriverEvent.objects.last()
+
+    def test_event_is_written_to_outbox(self):
+        with requests_mock.Mocker() as m:
+            event = self.send_event()
+            # nothing is sent inline
+            self.assertEqual(m.call_count, 0)
+        self.assertEqual(event.status, DriverEventStatus.PENDING.value)
+        self.assertEqual(event.data, {"foo": "bar"})
+
+    def test_delivery(self):
+        event = self.send_event()
+        with requests_mock.Mocker() as m:
+            m.post(RECEIVER_URL)
+            deliver_driver_events()
+            self.assertEqual(m.call_count, 1)
+            body = json.loads(m.last_request.body)
+            self.assertEqual(body["event_type"], "test")
+            self.assertEqual(body["community"], "xyz")
+
+        event.refresh_from_db()
+        self.assertEqual(event.status, DriverEventStatus.DELIVERED.value)
+
+    def test_failed_delivery_is_retried_then_dead_lettered(self):
+        event = self.send_event()
+        with requests_mock.Mocker() as m:
+            m.post(RECEIVER_URL, status_code=503)
+            deliver_driver_events()
+            event.refresh_from_db()
+            self.assertEqual(event.status, DriverEventStatus.PENDING.value)
+            self.assertEqual(event.attempts, 1)
+            self.assertGreater(event.next_attempt_at, timezone.now())
+
+            # not due yet, so it isn't retried
+            deliver_driver_events()
+            self.assertEqual(m.call_count, 1)
+
+            DriverEvent.objects.filter(pk=event.pk).update(next_attempt_at=timezone.now())
+            deliver_driver_events()
+            event.refresh_from_db()
+            self.assertEqual(event.status, DriverEventStatus.DEAD.value)
+            self.assertIn("503", event.last_error)
+
+        # dead events can be replayed
+        event.replay()
+        with requests_mock.Mocker() as m:
+            m.post(RECEIVER_URL)
+            deliver_driver_events()
+        event.refresh_from_db()
+        self.assertEqual(event.status, DriverEventStatus.DELIVERED.value)
+
+    def test_events_are_numbered_per_community(self):
+        first, second = self.send_event(), self.send_event()
+        self.assertEqual((first.sequence, second.sequence), (1, 2))
+
+        other = MetagovApp().create_community(slug="abc")
+        other.enable_plugin("randomness", {"default_low": 10, "default_high": 100})
+        other.get_plugin("randomness").send_event_to_driver(event_type="test", data={}, initiator={})
+        self.assertEqual(DriverEvent.objects.get(community=other).sequence, 1)
+
+    def test_saving_community_keeps_sequence(self):
+        community = Community.objects.get(slug="xyz")
+        self.send_event()
+        # saving a copy of the community that was loaded before the event doesn't rewind the counter
+        community.readable_name = "XYZ"
+        community.save()
+        self.assertEqual(self.send_event().sequence, 2)
+
+    def test_failed_event_holds_back_later_events(self):
+        first, second = self.send_event(), self.send_event()
+        with requests_mock.Mocker() as m:
+            m.post(RECEIVER_URL, status_code=503)
+            deliver_driver_events()
+            self.assertEqual(m.call_count, 1)
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, DriverEventStatus.PENDING.value)
+        self.assertEqual(second.attempts, 0)
+
+        DriverEvent.objects.filter(pk=first.pk).update(next_attempt_at=timezone.now())
+        with requests_mock.Mocker() as m:
+            m.post(RECEIVER_URL)
+            deliver_driver_events()
+            self.assertEqual([r.json()["sequence"] for r in m.request_history], [1, 2])
+
+    @override_settings(DRIVER_EVENT_DELIVERY_LIMIT=2)
+    def test_delivery_runs_are_capped(self):
+        for i in range(3):
+            self.send_event()
+        with requests_mock.Mocker() as m, mock.patch.object(DriverEvent, "schedule_delivery") as schedule:
+            m.post(RECEIVER_URL)
+            deliver_driver_events()
+            self.assertEqual(m.call_count, 2)
+            # another run is queued for the rest
+            schedule.assert_called_once()
+
+        events = DriverEvent.deliverable(DriverEvent.objects.first().community_id, limit=10)
+        with self.assertNumQueries(0):
+            self.assertEqual([event.serialize()["community"] for event in events], ["xyz"])
+
+    def test_delivery_stops_when_lock_is_lost(self):
+        first, second = self.send_event(), self.send_event()
+        self.addCleanup(cache.delete, f"metagov:driver-event-delivery:{first.community_id}")
+
+        def take_lock(request, context):
+            # the lock expired during the post, and another worker took it
+            cache.set(f"metagov:driver-event-delivery:{first.community_id}", "other")
+
+        with requests_mock.Mocker() as m:
+            m.post(RECEIVER_URL, text=take_lock)
+            deliver_driver_events()
+            self.assertEqual(m.call_count, 1)
+        second.refresh_from_db()
+        self.assertEqual(second.status, DriverEventStatus.PENDING.value)
+        # the other worker's lock is left alone
+        self.assertEqual(cache.get(f"metagov:driver-event-delivery:{first.community_id}"), "other")
+
+    def test_delivered_events_are_pruned(self):
+        delivered, pending = self.send_event(), self.send_event()
+        DriverEvent.objects.filter(pk=delivered.pk).update(
+            status=DriverEventStatus.DELIVERED.value, delivered_at=timezone.now() - timedelta(minutes=10)
+        )
+        prune_driver_events()
+        self.assertEqual(DriverEvent.objects.count(), 2)
+
+        # without a retention period, delivered events are deleted after the grace period
+        with override_settings(DRIVER_EVENT_DELIVERED_GRACE=60):
+            prune_driver_events()
+        self.assertEqual(list(DriverEvent.objects.values_list("pk", flat=True)), [pending.pk])
+
+    @override_settings(DRIVER_EVENT_RECEIVER_URL="")
+    def test_no_outbox_without_receiver(self):
+        self.send_event()
+        self.assertEqual(DriverEvent.objects.count(), 0)
+
+
+@override_settings(
+    DRIVER_EVENT_RECEIVER_URL=RECEIVER_URL,
+    DRIVER_EVENT_BATCH_MODE=True,
+    DRIVER_EVENT_BATCH_SIZE=2,
+    DRIVER_EVENT_BATCH_WINDOW=0,
+)
+class DriverEventBatchTests(TestCase):
+    def setUp(self):
+        community = MetagovApp().create_community(slug="xyz")
+        community.enable_plugin("randomness", {"default_low": 10, "default_high": 100})
+        self.plugin = community.get_plugin("randomness")
+        for i in range(3):
+            self.plugin.send_event_to_driver(event_type="test", data={"i": i}, initiator={})
+
+    def test_batches_are_gzipped_arrays(self):
+        with requests_mock.Mocker() as m:
+            m.post(RECEIVER_URL)
+            deliver_driver_events()
+            self.assertEqual(m.call_count, 2)
+            first, second = m.request_history
+            self.assertEqual(first.headers["Content-Encoding"], "gzip")
+            batch = json.loads(gzip.decompress(first.body))
+            self.assertEqual([e["data"]["i"] for e in batch], [0, 1])
+            self.assertEqual(len(json.loads(gzip.decompress(second.body))), 1)
+
+        self.assertEqual(DriverEvent.objects.filter(status=DriverEventStatus.DELIVERED.value).count(), 3)
+
+    def test_partial_acknowledgement(self):
+        ids = list(DriverEvent.objects.order_by("pk").values_list("pk", flat=True))
+        with requests_mock.Mocker() as m:
+            m.post(RECEIVER_URL, json={"acknowledged": [ids[0]]})
+            deliver_driver_events()
+            # the next batch is held back until the unacknowledged event has been delivered
+            self.assertEqual(m.call_count, 1)
+
+        not_acknowledged = DriverEvent.objects.get(pk=ids[1])
+        self.assertEqual(not_acknowledged.status, DriverEventStatus.PENDING.value)
+        self.assertEqual(not_acknowledged.attempts, 1)
+        self.assertEqual(DriverEvent.objects.get(pk=ids[2]).attempts, 0)
+        self.assertEqual(DriverEvent.objects.filter(status=DriverEventStatus.DELIVERED.value).count(), 1)
+
+    @override_settings(DRIVER_EVENT_BATCH_SIZE=10, DRIVER_EVENT_BATCH_WINDOW=60)
+    def test_waits_for_flush_window(self):
+        with requests_mock.Mocker() as m, mock.patch.object(DriverEvent, "schedule_delivery") as schedule:
+            m.post(RECEIVER_URL)
+            deliver_driver_events()
+            self.assertEqual(m.call_count, 0)
+            schedule.assert_called_once()
+
+    @override_settings(DRIVER_EVENT_BATCH_SIZE=10, DRIVER_EVENT_BATCH_WINDOW=0.25)
+    def test_flush_is_scheduled_for_whole_seconds(self):
+        with mock.patch("metagov.core.tasks.cache.add", return_value=True) as add, mock.patch.object(
+            DriverEvent, "schedule_delivery"
+        ):
+            deliver_driver_events()
+        # the timeout is rounded up to whole seconds
+        self.assertEqual(add.call_args.kwargs["timeout"], 1)
+
+
+@override_settings(DRIVER_EVENT_RECEIVER_URL="", DRIVER_EVENT_RETENTION_DAYS=7, DRIVER_EVENT_STREAM_LAG=0)
+class DriverEventStreamTests(TestCase):
+    url = "/api/internal/events/stream"
+
+    def setUp(self):
+        for slug in ["xyz", "abc"]:
+            community = MetagovApp().create_community(slug=slug)
+            community.enable_plugin("randomness", {"default_low": 10, "default_high": 100})
+            plugin = community.get_plugin("randomness")
+            plugin.send_event_to_driver(event_type="created", data={"slug": slug}, initiator={})
+            plugin.send_event_to_driver(event_type="updated", data={"slug": slug}, initiator={})
+
+    def test_pull_with_cursor(self):
+        response = self.client.get(self.url, {"limit": 3})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body["events"]), 3)
+        self.assertEqual(body["cursor"], body["events"][-1]["id"])
+
+        body = self.client.get(self.url, {"cursor": body["cursor"]}).json()
+        self.assertEqual([e["data"]["slug"] for e in body["events"]], ["abc"])
+
+        # nothing new, the cursor stays where it was
+        next_body = self.client.get(self.url, {"cursor": body["cursor"]}).json()
+        self.assertEqual(next_body, {"events": [], "cursor": body["cursor"]})
+
+    def test_community_cursor_is_sequence(self):
+        body = self.client.get(self.url, {"community": "abc", "limit": 1}).json()
+        self.assertEqual(body["cursor"], 1)
+        body = self.client.get(self.url, {"community": "abc", "cursor": body["cursor"]}).json()
+        self.assertEqual([e["event_type"] for e in body["events"]], ["updated"])
+        self.assertEqual(body["cursor"], 2)
+
+    @override_settings(DRIVER_EVENT_STREAM_LAG=60)
+    def test_recent_events_are_held_back(self):
+        self.assertEqual(self.client.get(self.url).json()["events"], [])
+        DriverEvent.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(len(self.client.get(self.url).json()["events"]), 4)
+        # streams of a single community aren't held back
+        self.assertEqual(len(self.client.get(self.url, {"community": "xyz"}).json()["events"]), 2)
+
+    def test_warns_about_late_commits(self):
+        community = Community.objects.get(slug="xyz")
+        plugin = community.get_plugin("randomness")
+        # with no lag, any event that isn't committed the instant it's created may have been skipped
+        with self.assertLogs("metagov.core.models", "WARNING") as logs, self.captureOnCommitCallbacks(execute=True):
+            plugin.send_event_to_driver(event_type="slow", data={}, initiator={})
+        self.assertIn("may have skipped it", logs.output[0])
+
+    def test_filters(self):
+        events = self.client.get(self.url, {"community": "xyz", "event_type": "updated"}).json()["events"]
+        self.assertEqual(len(events), 1)
+        self.assertEqual((events[0]["community"], events[0]["event_type"]), ("xyz", "updated"))
+
+        events = self.client.get(self.url, {"event_type": "created,updated", "source": "randomness"}).json()["events"]
+        self.assertEqual(len(events), 4)
+
+    def test_partitions(self):
+        first = self.client.get(self.url, {"partitions": 2, "partition": 0}).json()["events"]
+        second = self.client.get(self.url, {"partitions": 2, "partition": 1}).json()["events"]
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 2)
+        self.assertNotEqual(first[0]["community"], second[0]["community"])
+
+        response = self.client.get(self.url, {"partitions": 2, "partition": 2})
+        self.assertEqual(response.status_code, 400)
+
+    def test_server_sent_events(self):
+        first_id = DriverEvent.objects.order_by("pk").first().pk
+        response = self.client.get(
+            self.url, {"timeout": 0}, HTTP_ACCEPT="text/event-stream", HTTP_LAST_EVENT_ID=str(first_id)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        messages = b"".join(response.streaming_content).decode().strip().split("\n\n")
+        self.assertEqual(len(messages), 3)
+        event_id, data = messages[0].split("\n")
+        self.assertEqual(event_id, f"id: {first_id + 1}")
+        self.assertEqual(json.loads(data[len("data: ") :])["event_type"], "updated")
+
+    def test_prune(self):
+        DriverEvent.objects.filter(community__slug="xyz").update(created_at=timezone.now() - timedelta(days=8))
+        prune_driver_events()
+        self.assertFalse(DriverEvent.objects.filter(community__slug="xyz").exists())
+        self.assertEqual(DriverEvent.objects.count(), 2)
+
+    @override_settings(DRIVER_EVENT_RETENTION_DAYS=0)
+    def test_disabled(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
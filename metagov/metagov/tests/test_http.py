@@ -0,0 +1,124 @@
+from unittest import mock
+
+import requests_mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from metagov.core.http import HttpClient, RateLimitExceeded, rate_limiter
+
+
+class HttpClientTests(SimpleTestCase):
+    def setUp(self):
+        self.http = HttpClient()
+
+    def tearDown(self):
+        self.http.close()
+
+    def test_sessions_are_pooled_per_host(self):
+        session = self.http._get_session("slack.com")
+        self.assertIs(self.http._get_session("slack.com"), session)
+        self.assertIsNot(self.http._get_session("api.github.com"), session)
+
+    @override_settings(HTTP_CLIENT_TIMEOUT=5)
+    def test_default_timeout(self):
+        with requests_mock.Mocker() as m:
+            m.get("https://slack.com/api/a")
+            self.http.get("https://slack.com/api/a")
+            self.assertEqual(m.last_request.timeout, 5)
+            self.http.get("https://slack.com/api/a", timeout=1)
+            self.assertEqual(m.last_request.timeout, 1)
+
+    def test_metrics(self):
+        with requests_mock.Mocker() as m:
+            m.get("https://slack.com/api/a")
+            m.post("https://slack.com/api/b", status_code=503)
+            self.http.get("https://slack.com/api/a")
+            self.http.post("https://slack.com/api/b", json={})
+        metrics = self.http.metrics()["slack.com"]
+        self.assertEqual((metrics["requests"], metrics["errors"]), (2, 1))
+
+
+@override_settings(HTTP_RATE_LIMIT_MAX_WAIT=10, HTTP_RATE_LIMIT_RETRIES=2)
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        rate_limiter._buckets.clear()
+        self.http = HttpClient()
+
+    def tearDown(self):
+        self.http.close()
+
+    @mock.patch("metagov.core.http.time.sleep")
+    def test_retries_after_429(self, sleep):
+        with requests_mock.Mocker() as m:
+            m.post(
+                "https://slack.com/api/chat.postMessage",
+                [{"status_code": 429, "headers": {"Retry-After": "3"}}, {"json": {"ok": True}}],
+            )
+            response = self.http.post("https://slack.com/api/chat.postMessage", rate_limit=("slack", "xoxb-1"))
+        self.assertEqual(response.json(), {"ok": True})
+        self.assertEqual(m.call_count, 2)
+        self.assertAlmostEqual(sleep.call_args[0][0], 3, places=0)
+
+    @mock.patch("metagov.core.http.time.sleep")
+    def test_retries_after_github_403(self, sleep):
+        url = "https://api.github.com/a"
+        with requests_mock.Mocker() as m:
+            # primary rate limit
+            headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "2"}
+            m.get(url, [{"status_code": 403, "headers": headers}, {}])
+            self.http.get(url, rate_limit=("github", "1"))
+            self.assertEqual(m.call_count, 2)
+            self.assertAlmostEqual(sleep.call_args[0][0], 2, places=0)
+
+            # secondary rate limit
+            m.get(url, [{"status_code": 403, "headers": {"Retry-After": "5"}}, {}])
+            self.http.get(url, rate_limit=("github", "2"))
+            self.assertEqual(m.call_count, 4)
+            self.assertAlmostEqual(sleep.call_args[0][0], 5, places=0)
+
+            # other 403 responses aren't retried
+            m.get(url, status_code=403, headers={"X-RateLimit-Remaining": "10"})
+            self.assertEqual(self.http.get(url, rate_limit=("github", "3")).status_code, 403)
+            self.assertEqual(m.call_count, 5)
+
+    @mock.patch("metagov.core.http.time.sleep")
+    def test_gives_up_after_retries(self, sleep):
+        with requests_mock.Mocker() as m:
+            m.get("https://api.github.com/a", status_code=429, headers={"Retry-After": "1"})
+            with self.assertRaises(RateLimitExceeded) as cm:
+                self.http.get("https://api.github.com/a", rate_limit=("github", "app"))
+        self.assertEqual(m.call_count, 3)
+        self.assertEqual(cm.exception.wait, 1)
+
+    @mock.patch("metagov.core.http.time.sleep")
+    def test_exhausted_budget_is_shared(self, sleep):
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://api.github.com/a",
+                headers={"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "3600"},
+            )
+            self.http.get("https://api.github.com/a", rate_limit=("github", "app"))
+            self.assertEqual(rate_limiter.budget("github", "app")["remaining"], 0)
+
+            # another client, such as one in a different worker, sees the budget through the cache
+            with self.assertRaises(RateLimitExceeded) as cm:
+                HttpClient().get("https://api.github.com/a", rate_limit=("github", "app"))
+            self.assertGreater(cm.exception.retry_after, 3500)
+            self.assertEqual(m.call_count, 1)
+
+            # other credentials have their own budget
+            self.http.get("https://api.github.com/a", rate_limit=("github", "1234"))
+            self.assertEqual(m.call_count, 2)
+        sleep.assert_not_called()
+
+    @override_settings(HTTP_RATE_LIMITS={"slack": 2})
+    @mock.patch("metagov.core.http.time.sleep")
+    def test_token_bucket(self, sleep):
+        with requests_mock.Mocker() as m:
+            m.post("https://slack.com/api/chat.postMessage", json={"ok": True})
+            for _ in range(3):
+                self.http.post("https://slack.com/api/chat.postMessage", rate_limit=("slack", "xoxb-1"))
+        # the first two requests use the burst, and the third waits for a token
+        self.assertEqual(sleep.call_count, 1)
+        self.assertAlmostEqual(sleep.call_args[0][0], 0.5, places=1)
+        self.assertLess(rate_limiter.budget("slack", "xoxb-1")["tokens"], 0.1)
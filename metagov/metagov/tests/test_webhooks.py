@@ -0,0 +1,193 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from metagov.core.app import MetagovApp
+from metagov.core import webhooks
+from metagov.core.errors import PluginErrorInternal
+from metagov.core.models import InboundWebhook, InboundWebhookStatus
+from metagov.core.webhooks import WebhookEnvelope
+from metagov.plugins.example.models import Randomness, StochasticVote
+from metagov.plugins.slack.handlers import SlackRequestHandler
+
+SLACK_WEBHOOK_URL = "/api/hooks/slack"
+
+
+def slack_event(event_type="event_callback", **kwargs):
+    return json.dumps({"type": event_type, "team_id": "T123", "event": {"type": "message"}, **kwargs})
+
+
+@override_settings(WEBHOOK_ASYNC_PROCESSING=True)
+class AsyncWebhookTests(TestCase):
+    def post_slack_event(self, body, **headers):
+        return self.client.post(
+            SLACK_WEBHOOK_URL,
+            data=body,
+            content_type="application/json",
+            HTTP_X_SLACK_REQUEST_TIMESTAMP="1",
+            HTTP_X_SLACK_SIGNATURE="v0=abc",
+            **headers,
+        )
+
+    def test_webhook_is_queued_and_processed(self):
+        with mock.patch.object(SlackRequestHandler, "handle_incoming_webhook") as handle:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.post_slack_event(slack_event())
+            self.assertEqual(response.status_code, 200)
+            handle.assert_not_called()
+
+            webhook = InboundWebhook.objects.get()
+            self.assertEqual(webhook.plugin_name, "slack")
+            self.assertEqual(webhook.meta["HTTP_X_SLACK_SIGNATURE"], "v0=abc")
+
+            # the worker rebuilds the original request
+            for callback in callbacks:
+                callback()
+            handle.assert_called_once()
+            request = handle.call_args.args[0]
+            self.assertEqual(json.loads(request.body)["team_id"], "T123")
+            self.assertEqual(request.headers["X-Slack-Signature"], "v0=abc")
+
+        self.assertFalse(InboundWebhook.objects.exists())
+
+    def test_failed_webhook_is_kept(self):
+        with mock.patch.object(SlackRequestHandler, "handle_incoming_webhook", side_effect=Exception("boom")):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.post_slack_event(slack_event())
+
+        webhook = InboundWebhook.objects.get()
+        self.assertEqual(webhook.status, InboundWebhookStatus.FAILED.value)
+        self.assertIn("boom", webhook.error)
+
+    def test_unverified_webhook_is_rejected(self):
+        response = self.client.post(SLACK_WEBHOOK_URL, data=slack_event(), content_type="application/json")
+        self.assertNotEqual(response.status_code, 200)
+        self.assertFalse(InboundWebhook.objects.exists())
+
+    def test_unverified_community_webhook_is_rejected(self):
+        cache.clear()
+        community = MetagovApp().create_community(slug="xyz")
+        community.enable_plugin("randomness", {"default_low": 10, "default_high": 100})
+        url = "/api/hooks/xyz/randomness"
+        with mock.patch.object(Randomness, "verify_webhook", side_effect=PluginErrorInternal("Invalid signature")):
+            response = self.client.post(url, data="{}", content_type="application/json", HTTP_X_GITHUB_DELIVERY="abc")
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(InboundWebhook.objects.exists())
+
+        # the rejected request doesn't block the real delivery
+        response = self.client.post(url, data="{}", content_type="application/json", HTTP_X_GITHUB_DELIVERY="abc")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(InboundWebhook.objects.exists())
+
+    def test_inline_response(self):
+        response = self.post_slack_event(slack_event("url_verification", challenge="abc123"))
+        self.assertContains(response, "abc123")
+        self.assertFalse(InboundWebhook.objects.exists())
+
+    def test_unknown_community(self):
+        response = self.client.post("/api/hooks/nope/discourse", data="{}", content_type="application/json")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(InboundWebhook.objects.exists())
+
+
+class WebhookDeduplicationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def post_slack_event(self, event_id):
+        return self.client.post(
+            SLACK_WEBHOOK_URL,
+            data=slack_event(event_id=event_id),
+            content_type="application/json",
+            HTTP_X_SLACK_REQUEST_TIMESTAMP="1",
+            HTTP_X_SLACK_SIGNATURE="v0=abc",
+        )
+
+    def test_duplicate_deliveries_are_dropped(self):
+        with mock.patch.object(SlackRequestHandler, "handle_incoming_webhook", return_value=HttpResponse()) as handle:
+            self.post_slack_event("Ev1")
+            response = self.post_slack_event("Ev1")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(handle.call_count, 1)
+
+            self.post_slack_event("Ev2")
+            self.assertEqual(handle.call_count, 2)
+
+    def test_delivery_header(self):
+        community = MetagovApp().create_community(slug="xyz")
+        community.enable_plugin("randomness", {"default_low": 10, "default_high": 100})
+        url = "/api/hooks/xyz/randomness"
+        with mock.patch("metagov.core.handlers.MetagovRequestHandler.process_webhook") as process_webhook:
+            process_webhook.return_value = HttpResponse()
+            for delivery in ["abc", "abc", "def"]:
+                self.client.post(url, data="{}", content_type="application/json", HTTP_X_GITHUB_DELIVERY=delivery)
+            self.assertEqual(process_webhook.call_count, 2)
+
+    def test_failed_delivery_can_be_retried(self):
+        with mock.patch.object(SlackRequestHandler, "handle_incoming_webhook", side_effect=Exception("boom")):
+            self.assertEqual(self.post_slack_event("Ev1").status_code, 500)
+
+        with mock.patch.object(SlackRequestHandler, "handle_incoming_webhook", return_value=HttpResponse()) as handle:
+            self.post_slack_event("Ev1")
+            handle.assert_called_once()
+
+
+class ProcessRoutingTests(TestCase):
+    url = "/api/hooks/xyz/randomness"
+
+    def setUp(self):
+        cache.clear()
+        community = MetagovApp().create_community(slug="xyz")
+        community.enable_plugin("randomness", {"default_low": 10, "default_high": 100})
+        plugin = community.get_plugin("randomness")
+        self.first, self.second, self.legacy = [
+            plugin.start_process("delayed-stochastic-vote", options=["one", "two"], delay=10) for _ in range(3)
+        ]
+        self.first.add_routing_key("a")
+        self.second.add_routing_key("b")
+
+    def received_by(self, routing_key):
+        with mock.patch.object(StochasticVote, "get_webhook_routing_key", return_value=routing_key), mock.patch.object(
+            StochasticVote, "receive_webhook", autospec=True
+        ) as receive_webhook:
+            self.client.post(self.url, data="{}", content_type="application/json")
+        return {call.args[0].pk for call in receive_webhook.call_args_list}
+
+    def test_webhook_is_routed_to_process(self):
+        # processes without routing keys still get every webhook
+        self.assertEqual(self.received_by("a"), {self.first.pk, self.legacy.pk})
+        self.assertEqual(self.received_by("unknown"), {self.legacy.pk})
+
+    def test_webhook_without_routing_key_is_broadcast(self):
+        self.assertEqual(self.received_by(None), {self.first.pk, self.second.pk, self.legacy.pk})
+
+
+class WebhookEnvelopeTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_json_payload_is_parsed_once(self):
+        request = self.factory.post("/", data=slack_event(), content_type="application/json", HTTP_X_GITHUB_EVENT="push")
+        envelope = WebhookEnvelope.wrap(request)
+        self.assertIs(WebhookEnvelope.wrap(envelope), envelope)
+
+        with mock.patch.object(webhooks, "json_loads", wraps=webhooks.json_loads) as json_loads:
+            self.assertEqual(envelope.payload["team_id"], "T123")
+            self.assertEqual(envelope.payload["event"], {"type": "message"})
+            self.assertEqual(json_loads.call_count, 1)
+
+        # the wrapped request's attributes are still available
+        self.assertEqual(envelope.method, "POST")
+        self.assertEqual(envelope.delivery_headers, {"X-GitHub-Event": "push"})
+        self.assertFalse(envelope.signature_verified)
+
+    def test_form_payload(self):
+        request = self.factory.post("/", data={"payload": json.dumps({"type": "block_actions"})})
+        self.assertEqual(WebhookEnvelope(request).payload, {"type": "block_actions"})
+
+    def test_without_orjson(self):
+        request = self.factory.post("/", data=slack_event(), content_type="application/json")
+        with mock.patch.object(webhooks, "orjson", None):
+            self.assertEqual(WebhookEnvelope(request).payload["team_id"], "T123")